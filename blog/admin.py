@@ -1,11 +1,13 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Tag, Series, Post, Comment, Link
+from django.utils import timezone
+from . import counts, pagecache
+from .models import Category, Tag, Series, Post, Comment, Link, Job
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'post_count', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
 
@@ -16,10 +18,6 @@ class TagAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
 
-    def post_count(self, obj):
-        return obj.posts.count()
-    post_count.short_description = '文章数量'
-
 
 @admin.register(Series)
 class SeriesAdmin(admin.ModelAdmin):
@@ -28,11 +26,8 @@ class SeriesAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     ordering = ['order']
 
-    def post_count(self, obj):
-        return obj.posts.count()
-    post_count.short_description = '文章数量'
-
 
+@admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     """文章管理后台"""
     list_display = ['title', 'author', 'category', 'status', 'featured', 'views', 'published_at', 'created_at']
@@ -45,7 +40,7 @@ class PostAdmin(admin.ModelAdmin):
 
     fieldsets = (
         ('基本信息', {
-            'fields': ('title', 'slug', 'author', 'status')
+            'fields': ('title', 'slug', 'author', 'status', 'published_at')
         }),
         ('分类与标签', {
             'fields': ('category', 'tags', 'series', 'series_order')
@@ -63,6 +58,9 @@ class PostAdmin(admin.ModelAdmin):
         }),
     )
 
+    class Media:
+        js = ('js/admin_preview.js',)
+
     def save_model(self, request, obj, form, change):
         if obj.status == 'published' and not obj.published_at:
             from django.utils import timezone
@@ -70,6 +68,7 @@ class PostAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     """评论管理后台"""
     list_display = ['author_name', 'post', 'content_preview', 'is_approved', 'is_spam', 'created_at']
@@ -85,13 +84,20 @@ class CommentAdmin(admin.ModelAdmin):
     content_preview.short_description = '评论内容'
 
     def approve_comments(self, request, queryset):
-        queryset.update(is_approved=True)
+        self._update_and_recount(queryset, is_approved=True)
     approve_comments.short_description = '批准选中的评论'
 
     def mark_as_spam(self, request, queryset):
-        queryset.update(is_spam=True, is_approved=False)
+        self._update_and_recount(queryset, is_spam=True, is_approved=False)
     mark_as_spam.short_description = '标记为垃圾评论'
 
+    def _update_and_recount(self, queryset, **fields):
+        # 批量 UPDATE 不触发信号，按涉及的文章重新计算评论数与回复数
+        post_ids = set(queryset.values_list('post_id', flat=True))
+        queryset.update(**fields)
+        counts.reconcile_comments(post_ids)
+        pagecache.invalidate(*(f'post:{post_id}' for post_id in post_ids))
+
     def delete_spam(self, request, queryset):
         queryset.delete()
     delete_spam.short_description = '删除垃圾评论'
@@ -103,3 +109,21 @@ class LinkAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'description']
     ordering = ['order', '-created_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['attempts', 'locked_by', 'locked_until', 'last_error', 'created_at', 'finished_at']
+    ordering = ['-created_at']
+
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), last_error='', finished_at=None
+        )
+        self.message_user(request, f'已重新排队 {count} 个失败的任务。')
+    retry_jobs.short_description = '重新执行选中的失败任务'
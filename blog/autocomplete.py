@@ -0,0 +1,248 @@
+"""
+搜索框自动补全
+
+进程内的前缀索引：把文章标题、标签、分类、系列名称归一化后放进一个有序数组，
+查询时二分查找前缀的起点，扫描出全部匹配项后再按浏览量排序，不访问数据库。
+
+- 除整个名称外，名称中每个单词和每个汉字开始的后缀也会作为键，输入中间的词同样能匹配
+- 文章权重为浏览量，标签、分类、系列为其下已发布文章的浏览量之和
+- 短前缀（不超过 ``SHORT_PREFIX_LENGTH`` 个字）匹配项很多，排好序的前 ``TOP_K`` 项按前缀缓存，
+  条目变化时只丢弃受影响前缀的缓存
+- 保存、删除时由 ``blog.signals`` 增量更新本进程的索引，并把这次变更以递增序号写入
+  共享缓存；其他进程按序号取回期间的变更逐条应用，变更已过期或积压过多时才整体重建，
+  索引存在超过 ``AUTOCOMPLETE_MAX_AGE`` 秒也会重建。序号由数据库中的 ``Sequence`` 行
+  原子递增（文件缓存的 ``incr`` 跨进程不是原子操作，两个进程可能取到同一序号）
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.urls import reverse
+
+from .bigram import TERM_RE, normalize
+
+SEQUENCE_NAME = 'autocomplete'
+CHANGE_KEY = 'autocomplete:change:{}'
+MAX_KEYS_PER_ENTRY = 32
+SHORT_PREFIX_LENGTH = 2
+TOP_K = 32
+# 其他进程积压的变更超过该条数时整体重建
+MAX_REPLAY = 500
+KIND_LABELS = {'post': '文章', 'tag': '标签', 'category': '分类', 'series': '系列'}
+GROUP_URL_NAMES = {'tag': 'blog:tag', 'category': 'blog:category', 'series': 'blog:series'}
+
+
+def entry_keys(label):
+    """名称本身及从每个单词、每个汉字开始的后缀"""
+    text = ' '.join(normalize(label).split())
+    if not text:
+        return []
+    starts = []
+    for match in TERM_RE.finditer(text):
+        if match.group()[0].isascii():
+            starts.append(match.start())
+        else:
+            starts.extend(range(match.start(), match.end()))
+    keys = dict.fromkeys([text] + [text[start:] for start in starts if start])
+    return list(keys)[:MAX_KEYS_PER_ENTRY]
+
+
+class PrefixIndex:
+    """有序键数组 + 条目表"""
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+        self._entry_keys = {}
+        self._top = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, entries):
+        """一次性载入 ``{(类型, ID): (名称, 链接, 权重)}``"""
+        keys = []
+        entry_keys_map = {}
+        for entry_id, (label, _, _) in entries.items():
+            entry_keys_map[entry_id] = entry_keys(label)
+            keys.extend((key, entry_id) for key in entry_keys_map[entry_id])
+        keys.sort()
+        with self._lock:
+            self._keys, self._entries, self._entry_keys = keys, dict(entries), entry_keys_map
+            self._top = {}
+
+    def put(self, entry_id, label, url, weight):
+        with self._lock:
+            self._discard(entry_id)
+            self._entries[entry_id] = (label, url, weight)
+            self._entry_keys[entry_id] = entry_keys(label)
+            for key in self._entry_keys[entry_id]:
+                insort(self._keys, (key, entry_id))
+            self._forget_top(self._entry_keys[entry_id])
+
+    def get(self, entry_id):
+        return self._entries.get(entry_id)
+
+    def remove(self, entry_id):
+        with self._lock:
+            self._discard(entry_id)
+
+    def _discard(self, entry_id):
+        keys = self._entry_keys.pop(entry_id, ())
+        for key in keys:
+            index = bisect_left(self._keys, (key, entry_id))
+            if index < len(self._keys) and self._keys[index] == (key, entry_id):
+                del self._keys[index]
+        self._entries.pop(entry_id, None)
+        self._forget_top(keys)
+
+    def _forget_top(self, keys):
+        for key in keys:
+            for length in range(1, min(len(key), SHORT_PREFIX_LENGTH) + 1):
+                self._top.pop(key[:length], None)
+
+    def _rank(self, prefix):
+        """全部匹配项按（名称开头匹配、权重、名称）排序后的条目 ID"""
+        best = {}
+        index = bisect_left(self._keys, (prefix,))
+        while index < len(self._keys):
+            key, entry_id = self._keys[index]
+            if not key.startswith(prefix):
+                break
+            best[entry_id] = best.get(entry_id, False) or key == self._entry_keys[entry_id][0]
+            index += 1
+        return sorted(
+            best,
+            key=lambda entry_id: (not best[entry_id], -self._entries[entry_id][2], self._entries[entry_id][0]),
+        )
+
+    def search(self, prefix, limit=8):
+        """前缀匹配，名称开头即匹配的排在前面，其次按权重"""
+        prefix = ' '.join(normalize(prefix).split())
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX_LENGTH and limit <= TOP_K:
+                ranked = self._top.get(prefix)
+                if ranked is None:
+                    ranked = self._top[prefix] = self._rank(prefix)[:TOP_K]
+            else:
+                ranked = self._rank(prefix)
+            results = [(entry_id, self._entries[entry_id]) for entry_id in ranked[:limit]]
+        return [
+            {'type': kind, 'type_label': KIND_LABELS[kind], 'label': label, 'url': url}
+            for (kind, _), (label, url, _) in results
+        ]
+
+
+def post_entry(post):
+    return post.title, reverse('blog:post_detail', args=[post.slug]), post.views
+
+
+def load_entries():
+    from .models import Category, Post, Series, Tag
+
+    entries = {}
+    for post in Post.objects.filter(status='published').only('id', 'title', 'slug', 'views'):
+        entries[('post', post.pk)] = post_entry(post)
+    published_views = Sum('posts__views', filter=Q(posts__status='published'))
+    for kind, model, url_name in (
+        ('tag', Tag, 'blog:tag'),
+        ('category', Category, 'blog:category'),
+        ('series', Series, 'blog:series'),
+    ):
+        rows = model.objects.filter(post_count__gt=0).annotate(weight=published_views).values_list(
+            'pk', 'name', 'slug', 'weight'
+        )
+        for pk, name, slug, weight in rows:
+            entries[(kind, pk)] = (name, reverse(url_name, args=[slug]), weight or 0)
+    return entries
+
+
+class Autocomplete:
+    """进程内索引及其与其他进程的同步"""
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self.version = None
+        self.built_at = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_index(self):
+        from .models import Sequence
+
+        now = time.monotonic()
+        check_interval = getattr(settings, 'AUTOCOMPLETE_CHECK_INTERVAL', 5)
+        max_age = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 600)
+        if self.built_at is not None and now - self.checked_at < check_interval:
+            return self.index
+        with self._lock:
+            if self.built_at is not None and now - self.checked_at < check_interval:
+                return self.index
+            version = Sequence.objects.current_value(SEQUENCE_NAME)
+            if self.built_at is None or now - self.built_at >= max_age or not self._replay(version):
+                # 先记下版本再读数据库，期间的变更会在下次检查时重放
+                self.index.load(load_entries())
+                self.version, self.built_at = version, now
+            self.checked_at = now
+        return self.index
+
+    def _replay(self, version):
+        """应用其他进程在 ``self.version`` 之后的变更，无法完整取回时返回 False"""
+        if version == self.version:
+            return True
+        if self.version is None or version < self.version or version - self.version > MAX_REPLAY:
+            return False
+        sequence = range(self.version + 1, version + 1)
+        changes = cache.get_many([CHANGE_KEY.format(number) for number in sequence])
+        if len(changes) != len(sequence):
+            return False
+        for number in sequence:
+            kind, pk, entry = changes[CHANGE_KEY.format(number)]
+            self._apply(kind, pk, entry)
+        self.version = version
+        return True
+
+    def _apply(self, kind, pk, entry):
+        if entry is None:
+            self.index.remove((kind, pk))
+        else:
+            self.index.put((kind, pk), *entry)
+
+    def search(self, prefix, limit=8):
+        return self.get_index().search(prefix, limit)
+
+    def changed(self, kind, pk, entry=None):
+        """条目变更：已建索引时就地更新，并记入共享缓存供其他进程重放"""
+        from .models import Sequence
+
+        if self.built_at is not None:
+            self._apply(kind, pk, entry)
+        number = Sequence.objects.next_value(SEQUENCE_NAME)
+        timeout = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 600) * 2
+        cache.set(CHANGE_KEY.format(number), (kind, pk, tuple(entry) if entry else None), timeout)
+
+
+suggestions = Autocomplete()
+
+
+def post_changed(post):
+    suggestions.changed('post', post.pk, post_entry(post) if post.status == 'published' else None)
+
+
+def group_changed(kind, instance, deleted=False):
+    """标签、分类、系列变更；权重沿用索引中已有的值，整体重建时再重新统计"""
+    entry = None
+    if not deleted:
+        # 文章数以 F() 更新，内存中的实例可能是旧值
+        instance.refresh_from_db(fields=['post_count'])
+    if not deleted and instance.post_count > 0:
+        current = suggestions.index.get((kind, instance.pk))
+        weight = current[2] if current else 0
+        entry = (instance.name, reverse(GROUP_URL_NAMES[kind], args=[instance.slug]), weight)
+    suggestions.changed(kind, instance.pk, entry)
@@ -0,0 +1,232 @@
+"""
+中文二元分词倒排索引
+
+中文没有空格分词，FTS5 的 trigram 分词器又匹配不了两个字的词（「缓存」「部署」）。
+这里把连续的汉字切成相互重叠的二元组（「分布式」→「分布」「布式」），
+拉丁字母和数字按单词切分并转成小写，为每个词项保存一份倒排列表：
+
+- 倒排列表是升序的文章 ID 数组，按差值编码后以 ``array('I')`` 的字节存储
+- 每篇文章已索引的词项记录在 ``SearchDocument`` 中，保存文章时只改动
+  新增或消失的词项对应的倒排列表
+- 查询时从最短的倒排列表开始依次求交集，用二分查找跳过不可能匹配的 ID
+"""
+import re
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from django.db import transaction
+
+# 汉字（含扩展 A 区和兼容汉字）连续成段，拉丁字母与数字按单词
+TERM_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+
+
+def normalize(text):
+    """全角转半角并统一大小写"""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+
+def _is_cjk(run):
+    return not run[0].isascii()
+
+
+def tokenize(text):
+    """切分文本，返回词项列表（可能重复）"""
+    terms = []
+    for run in TERM_RE.findall(normalize(text)):
+        if _is_cjk(run):
+            if len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run[:MAX_TERM_LENGTH])
+    return terms
+
+
+def query_terms(query):
+    """
+    查询词项；无法用索引回答时返回 ``None``。
+
+    单独的一个汉字在文档中只会作为二元组的一部分出现，索引里查不到，交给调用方回退。
+    """
+    runs = TERM_RE.findall(normalize(query))
+    if not runs or any(_is_cjk(run) and len(run) == 1 for run in runs):
+        return None
+    return sorted(set(tokenize(query)))
+
+
+def encode_postings(ids):
+    """升序 ID 列表 → 差值编码的字节串"""
+    deltas = array('I', (b - a for a, b in zip([0] + ids[:-1], ids)))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def decode_postings(data):
+    deltas = array('I')
+    deltas.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return list(accumulate(deltas))
+
+
+def intersect(postings):
+    """多个升序 ID 列表的交集，从最短的列表开始"""
+    postings = sorted(postings, key=len)
+    if not postings:
+        return []
+    result = postings[0]
+    for other in postings[1:]:
+        if not result:
+            break
+        matched = []
+        lo = 0
+        for pk in result:
+            lo = bisect_left(other, pk, lo)
+            if lo == len(other):
+                break
+            if other[lo] == pk:
+                matched.append(pk)
+        result = matched
+    return result
+
+
+def document_terms(post):
+    from .search import plain_text
+
+    if post.status != 'published':
+        return set()
+    return set(tokenize(' '.join([post.title, post.excerpt, plain_text(post)])))
+
+
+def _apply(changes):
+    """``changes``：{文章ID: (旧词项集合, 新词项集合)}，改写受影响的倒排列表"""
+    from .models import SearchTerm
+
+    added, removed = {}, {}
+    for pk, (old, new) in changes.items():
+        for term in new - old:
+            added.setdefault(term, set()).add(pk)
+        for term in old - new:
+            removed.setdefault(term, set()).add(pk)
+    affected = set(added) | set(removed)
+    if not affected:
+        return
+
+    existing = {}
+    affected_list = list(affected)
+    for start in range(0, len(affected_list), 500):
+        batch = affected_list[start:start + 500]
+        existing.update((row.term, row) for row in SearchTerm.objects.filter(term__in=batch))
+
+    to_create, to_update, to_delete = [], [], []
+    for term in affected:
+        row = existing.get(term)
+        ids = set(decode_postings(row.postings)) if row else set()
+        ids |= added.get(term, set())
+        ids -= removed.get(term, set())
+        if not ids:
+            if row:
+                to_delete.append(row.pk)
+            continue
+        ids = sorted(ids)
+        if row:
+            row.postings, row.doc_count = encode_postings(ids), len(ids)
+            to_update.append(row)
+        else:
+            to_create.append(SearchTerm(term=term, postings=encode_postings(ids), doc_count=len(ids)))
+
+    SearchTerm.objects.bulk_create(to_create, batch_size=500)
+    SearchTerm.objects.bulk_update(to_update, ['postings', 'doc_count'], batch_size=500)
+    for start in range(0, len(to_delete), 500):
+        SearchTerm.objects.filter(pk__in=to_delete[start:start + 500]).delete()
+
+
+def index_posts(posts):
+    """增量更新文章的索引；未发布的文章从索引中移除"""
+    from .models import SearchDocument
+
+    posts = list(posts)
+    if not posts:
+        return
+    with transaction.atomic():
+        documents = SearchDocument.objects.in_bulk([post.pk for post in posts])
+        changes = {}
+        for post in posts:
+            document = documents.get(post.pk)
+            old = set(document.terms.split()) if document else set()
+            changes[post.pk] = (old, document_terms(post))
+        _apply(changes)
+
+        to_create, to_update, to_delete = [], [], []
+        for post in posts:
+            terms = ' '.join(sorted(changes[post.pk][1]))
+            document = documents.get(post.pk)
+            if not terms:
+                if document:
+                    to_delete.append(post.pk)
+            elif document is None:
+                to_create.append(SearchDocument(post_id=post.pk, terms=terms))
+            elif document.terms != terms:
+                document.terms = terms
+                to_update.append(document)
+        SearchDocument.objects.bulk_create(to_create)
+        SearchDocument.objects.bulk_update(to_update, ['terms'])
+        SearchDocument.objects.filter(pk__in=to_delete).delete()
+
+
+def remove_posts(post_ids):
+    from .models import SearchDocument
+
+    with transaction.atomic():
+        documents = SearchDocument.objects.filter(pk__in=list(post_ids))
+        _apply({document.pk: (set(document.terms.split()), set()) for document in documents})
+        documents.delete()
+
+
+def rebuild(posts):
+    """按给定的文章（只含已发布）在内存中重建全部倒排列表，返回文章数"""
+    from .models import SearchDocument, SearchTerm
+
+    postings = {}
+    documents = []
+    for post in posts:
+        terms = document_terms(post)
+        if not terms:
+            continue
+        for term in terms:
+            postings.setdefault(term, []).append(post.pk)
+        documents.append(SearchDocument(post_id=post.pk, terms=' '.join(sorted(terms))))
+
+    with transaction.atomic():
+        SearchTerm.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        SearchDocument.objects.bulk_create(documents, batch_size=500)
+        SearchTerm.objects.bulk_create(
+            [
+                SearchTerm(term=term, postings=encode_postings(sorted(ids)), doc_count=len(ids))
+                for term, ids in postings.items()
+            ],
+            batch_size=500,
+        )
+    return len(documents)
+
+
+def lookup(query):
+    """
+    返回同时包含全部查询词项的文章 ID（ID 倒序，新文章在前）；无法用索引回答时返回 ``None``。
+    """
+    from .models import SearchTerm
+
+    terms = query_terms(query)
+    if terms is None:
+        return None
+    rows = dict(SearchTerm.objects.filter(term__in=terms).values_list('term', 'postings'))
+    if len(rows) < len(terms):
+        return []
+    return intersect([decode_postings(data) for data in rows.values()])[::-1]
@@ -0,0 +1,158 @@
+"""
+进程内写缓冲
+
+高频的计数类写入（文章浏览量、邮件打开）先在进程内合并，达到阈值或定时器到期后
+再批量写入数据库。子类实现 ``merge``（把一条记录并入缓冲）和 ``write``（写入一批）。
+
+- 达到阈值时默认在当前线程写入；``background = True`` 时交给后台线程，记录方不等待数据库。
+  同时只有一个后台刷新线程，刷新期间新到的记录留在缓冲中，由下一次刷新或定时器写入
+- 写入失败时整批放回缓冲等待下次刷新；数据库持续不可用时缓冲最多保留
+  ``WRITE_BUFFER_MAX_PENDING`` 条，超出时丢弃最早的记录
+- 进程退出时刷新所有缓冲
+"""
+import atexit
+import logging
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_buffers = weakref.WeakSet()
+
+
+class WriteBuffer:
+    """合并写入的缓冲基类"""
+
+    interval_setting = None
+    default_interval = 30
+    threshold_setting = None
+    default_threshold = 100
+    background = False
+
+    def __init__(self, interval=None, threshold=None, max_pending=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_pending = max_pending
+        # 关闭后不再记录（如静态导出时渲染页面）
+        self.enabled = True
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._flushing = False
+        self._last_flush = time.monotonic()
+        _buffers.add(self)
+
+    def get_interval(self):
+        if self.interval is not None:
+            return self.interval
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    def get_threshold(self):
+        if self.threshold is not None:
+            return self.threshold
+        return getattr(settings, self.threshold_setting, self.default_threshold)
+
+    def get_max_pending(self):
+        if self.max_pending is not None:
+            return self.max_pending
+        return getattr(settings, 'WRITE_BUFFER_MAX_PENDING', 100_000)
+
+    def merge(self, pending, key, value):
+        """把一条记录并入 ``pending``"""
+        raise NotImplementedError
+
+    def size(self, pending):
+        """与阈值比较的缓冲大小"""
+        return len(pending)
+
+    def write(self, batch):
+        """把一批记录写入数据库，返回写入的数量"""
+        raise NotImplementedError
+
+    def add(self, key, value):
+        """记录一条，必要时触发刷新"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.merge(self._pending, key, value)
+            should_flush = (
+                self.size(self._pending) >= self.get_threshold()
+                or time.monotonic() - self._last_flush >= self.get_interval()
+            )
+            if should_flush and self.background:
+                # 已有后台线程在刷新时不再启动新的，本条留给之后的刷新
+                should_flush = not self._flushing
+                self._flushing = True
+            if not should_flush and self._timer is None:
+                self._start_timer()
+
+        if should_flush:
+            if self.background:
+                threading.Thread(target=self._flush_once_in_background, daemon=True).start()
+            else:
+                self.flush()
+
+    def flush(self):
+        """把缓冲写入数据库，返回写入的数量"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not batch:
+            return 0
+        try:
+            return self.write(batch)
+        except Exception:
+            # 写入失败时放回缓冲，等待下次刷新
+            with self._lock:
+                self._requeue(batch)
+            raise
+
+    def _requeue(self, batch):
+        # 失败的一批早于刷新期间新记录的，放在前面，超出上限时先丢弃
+        pending = dict(batch)
+        for key, value in self._pending.items():
+            self.merge(pending, key, value)
+        overflow = len(pending) - self.get_max_pending()
+        if overflow > 0:
+            for key in list(pending)[:overflow]:
+                del pending[key]
+            logger.warning('%s 写入持续失败，丢弃最早的 %s 条记录', type(self).__name__, overflow)
+        self._pending = pending
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.get_interval(), self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_once_in_background(self):
+        try:
+            self._flush_in_background()
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('%s 刷新失败', type(self).__name__)
+        finally:
+            # 定时线程、后台线程使用独立的数据库连接，用完即关
+            connections.close_all()
+
+
+@atexit.register
+def _flush_on_exit():
+    for buffer in list(_buffers):
+        try:
+            buffer.flush()
+        except Exception:
+            pass
@@ -0,0 +1,72 @@
+"""
+浏览量写回缓冲
+
+文章详情页每次访问只在进程内累加计数，达到阈值或定时器到期后，
+再以 F() 表达式批量合并到数据库。F() 更新是增量式的，多个 worker
+各自缓冲、各自刷新也不会互相覆盖。
+
+定时刷新与失败重试见 ``blog.buffers``。缓冲按 (主键, 浏览发生的小时) 计数，
+``on_flush(batch)`` 在同一事务中接收本次写入的 ``{(主键, 小时): 次数}``，
+文章浏览量借此同时累加到每小时的桶中（见 ``blog.trending``）；跨过整点才刷新的浏览仍计入发生时的小时。
+"""
+from django.db import transaction
+from django.db.models import F
+
+from . import trending
+from .buffers import WriteBuffer
+
+
+class ViewCounter(WriteBuffer):
+    """进程内浏览量缓冲"""
+
+    interval_setting = 'VIEW_COUNT_FLUSH_INTERVAL'
+    default_interval = 30
+    threshold_setting = 'VIEW_COUNT_FLUSH_THRESHOLD'
+    default_threshold = 100
+
+    def __init__(self, model_label, field='views', interval=None, threshold=None, on_flush=None):
+        super().__init__(interval=interval, threshold=threshold)
+        self.model_label = model_label
+        self.field = field
+        self.on_flush = on_flush
+
+    def get_model(self):
+        from django.apps import apps
+        return apps.get_model(self.model_label)
+
+    def incr(self, pk, amount=1):
+        """记录一次浏览，必要时触发刷新"""
+        self.add((pk, trending.bucket_hour()), amount)
+
+    def pending(self, pk):
+        """尚未写入数据库的增量"""
+        with self._lock:
+            return sum(amount for (key, _), amount in self._pending.items() if key == pk)
+
+    def merge(self, pending, key, value):
+        pending[key] = pending.get(key, 0) + value
+
+    def size(self, pending):
+        return sum(pending.values())
+
+    def write(self, batch):
+        model = self.get_model()
+        totals = {}
+        for (pk, _), amount in batch.items():
+            totals[pk] = totals.get(pk, 0) + amount
+        # 相同增量的文章合并成一条 UPDATE
+        by_amount = {}
+        for pk, amount in totals.items():
+            by_amount.setdefault(amount, []).append(pk)
+
+        with transaction.atomic():
+            for amount, pks in by_amount.items():
+                model.objects.filter(pk__in=pks).update(
+                    **{self.field: F(self.field) + amount}
+                )
+            if self.on_flush is not None:
+                self.on_flush(batch)
+        return sum(batch.values())
+
+
+post_views = ViewCounter('blog.Post', on_flush=trending.record_views)
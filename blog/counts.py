@@ -0,0 +1,157 @@
+"""
+分类、标签、系列上的已发布文章数，以及归档页的每月文章数（``ArchiveMonth``）
+
+计数以 F() 增量维护（见 ``blog.signals``），侧栏和后台列表直接读取字段，
+不再做 GROUP BY 聚合。绕过信号的批量修改可能造成偏差，用 ``reconcile()``
+（或 ``manage.py reconcile_post_counts``）按实际数据修正。
+
+文章的评论数由信号增量维护；评论的回复数只计页面上可见的回复，审核状态变化或删除评论时
+由信号按文章重新计算（``recount_replies()``）。``reconcile_comments()`` 修正两者。
+"""
+from collections import Counter
+
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest, TruncMonth
+from django.utils import timezone
+
+from . import autocomplete
+from .models import ArchiveMonth, Category, Comment, Post, Series, Tag
+
+
+GROUP_KINDS = {Category: 'category', Series: 'series', Tag: 'tag'}
+
+
+def adjust(model, pks, delta):
+    """把 pks 中每个对象的计数加上 delta（同一 pk 出现多次则累加）"""
+    by_delta = {}
+    for pk, times in Counter(pk for pk in pks if pk).items():
+        by_delta.setdefault(delta * times, []).append(pk)
+    for amount, ids in by_delta.items():
+        model.objects.filter(pk__in=ids).update(
+            post_count=Greatest(F('post_count') + amount, Value(0))
+        )
+    if model in GROUP_KINDS and by_delta:
+        # 计数从 0 变为正数或降为 0 时，分类、标签、系列在搜索框补全中出现或消失
+        amounts = {pk: amount for amount, ids in by_delta.items() for pk in ids}
+        for obj in model.objects.filter(pk__in=list(amounts)):
+            if obj.post_count == (amounts[obj.pk] if delta > 0 else 0):
+                autocomplete.group_changed(GROUP_KINDS[model], obj)
+
+
+def archive_month(published_at):
+    """发布时间所在的 (年, 月)，按站点时区"""
+    if published_at is None:
+        return None
+    local = timezone.localtime(published_at) if timezone.is_aware(published_at) else published_at
+    return local.year, local.month
+
+
+def adjust_archive(published_at, delta):
+    key = archive_month(published_at)
+    if key is None:
+        return
+    if delta > 0:
+        month, _ = ArchiveMonth.objects.get_or_create(year=key[0], month=key[1])
+        pk = month.pk
+    else:
+        pk = ArchiveMonth.objects.filter(year=key[0], month=key[1]).values_list('pk', flat=True).first()
+    adjust(ArchiveMonth, [pk], delta)
+
+
+def adjust_for_post(post_state, tag_ids, delta):
+    """按一篇文章的分类、系列、标签和发布月份调整计数"""
+    adjust(Category, [post_state.get('category_id')], delta)
+    adjust(Series, [post_state.get('series_id')], delta)
+    adjust(Tag, tag_ids, delta)
+    adjust_archive(post_state.get('published_at'), delta)
+
+
+def reconcile():
+    """按实际已发布文章重新计算计数，返回 {模型名: 修正的对象数}"""
+    published = Q(posts__status='published')
+    fixed = {}
+    for model in (Category, Tag, Series):
+        stale = []
+        for obj in model.objects.annotate(actual=Count('posts', filter=published)).only('pk', 'post_count'):
+            if obj.post_count != obj.actual:
+                obj.post_count = obj.actual
+                stale.append(obj)
+        model.objects.bulk_update(stale, ['post_count'], batch_size=500)
+        fixed[model._meta.verbose_name] = len(stale)
+    fixed[ArchiveMonth._meta.verbose_name] = reconcile_archive()
+    return fixed
+
+
+def reconcile_archive():
+    actual = {}
+    rows = Post.objects.filter(status='published', published_at__isnull=False).annotate(
+        month=TruncMonth('published_at')
+    ).values('month').annotate(count=Count('pk')).values_list('month', 'count')
+    for month, count in rows:
+        key = archive_month(month)
+        actual[key] = actual.get(key, 0) + count
+    stale = 0
+    existing = {(row.year, row.month): row for row in ArchiveMonth.objects.all()}
+    for key in set(existing) | set(actual):
+        row = existing.get(key)
+        count = actual.get(key, 0)
+        if row is None:
+            ArchiveMonth.objects.create(year=key[0], month=key[1], post_count=count)
+        elif row.post_count != count:
+            ArchiveMonth.objects.filter(pk=row.pk).update(post_count=count)
+        else:
+            continue
+        stale += 1
+    return stale
+
+
+def recount_replies(post_ids=None):
+    """
+    重新计算评论的回复数，返回修正的评论数。
+
+    回复数只计页面上会显示的后代：回复本身以及它与该评论之间的各级评论都已通过审核
+    （父评论未通过审核时整棵子树都不显示）。``post_ids`` 为空时处理全部文章。
+    """
+    comments = Comment.objects.all()
+    if post_ids is not None:
+        comments = comments.filter(post_id__in=post_ids)
+
+    rows = list(comments.values_list('pk', 'path', 'is_approved', 'reply_count'))
+    approved = {pk for pk, _, is_approved, _ in rows if is_approved}
+    actual = Counter()
+    for pk, path, is_approved, _ in rows:
+        if not is_approved:
+            continue
+        # 自近而远计入各级祖先，越过未审核的祖先后不再向上计数
+        for ancestor in reversed([int(segment) for segment in path.split('/')[:-1] if segment]):
+            actual[ancestor] += 1
+            if ancestor not in approved:
+                break
+
+    stale = [Comment(pk=pk, reply_count=actual[pk]) for pk, _, _, reply_count in rows if reply_count != actual[pk]]
+    Comment.objects.bulk_update(stale, ['reply_count'], batch_size=500)
+    return len(stale)
+
+
+def reconcile_comments(post_ids=None):
+    """
+    按已审核评论重新计算文章的评论数，并重新计算评论的回复数（见 ``recount_replies``），
+    ``post_ids`` 为空时处理全部文章，返回修正的对象数
+    """
+    comments = Comment.objects.filter(is_approved=True)
+    posts = Post.objects.all()
+    if post_ids is not None:
+        comments = comments.filter(post_id__in=post_ids)
+        posts = posts.filter(pk__in=post_ids)
+
+    post_actual = Counter(comments.values_list('post_id', flat=True))
+    stale_posts = [
+        Post(pk=pk, comment_count=post_actual[pk])
+        for pk, comment_count in posts.values_list('pk', 'comment_count') if comment_count != post_actual[pk]
+    ]
+    Post.objects.bulk_update(stale_posts, ['comment_count'], batch_size=500)
+    return recount_replies(post_ids) + len(stale_posts)
+
+
+def is_published(state):
+    return bool(state) and state.get('status') == 'published'
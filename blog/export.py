@@ -0,0 +1,354 @@
+"""
+静态站点导出
+
+``manage.py export_static`` 用真实的视图和模板把整站渲染到 ``public/``（Vercel 从这里部署）：
+首页、文章列表、每篇文章详情、分类/标签/系列/归档页、关于页，以及归档页按年加载的 JSON。
+
+- 页面按 ``/path/`` → ``path/index.html`` 的目录形式保存，静态托管直接按目录提供
+- 列表页的键集分页链接（``?after=…&page=N``）在静态托管中无法工作：导出时沿分页链接
+  逐页抓取，保存到 ``<列表>/page/N/``，并把页面中的分页链接改写成这些路径
+- 渲染在进程池中进行，页面内容的 SHA-256 记录在输出目录的 ``.export-manifest.json``，
+  内容没有变化的文件不重写；写入先写临时文件再 ``os.replace``，部署时不会读到半个文件
+- 上次导出过而本次没有生成的文件（如已删除的文章）会被清理；输出目录中不是导出生成的文件
+  （如旧的手写页面）会遮住导出的页面和跳转，有这样的文件时拒绝导出，``--clean`` 时一并删除
+- 导出前先运行 ``collectstatic``，页面按清单引用带哈希的静态文件，只复制这些文件及其
+  .gz/.br，``_headers`` 中只为这些带哈希的文件设置长期缓存
+- 评论、搜索、点赞、订阅等动态接口无法静态化；设置了 ``STATIC_EXPORT_DYNAMIC_ORIGIN``
+  时在 ``_redirects`` 中把它们代理到 Django 服务
+- ``_redirects``/``_headers`` 只对 Netlify、Cloudflare Pages 生效；Vercel 不读这两个文件，
+  同样的跳转、改写和缓存头写入 ``STATIC_EXPORT_VERCEL_CONFIG``（``vercel.json``），
+  其中的 ``version``/``builds`` 等其他配置保持不变
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+from html import unescape
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.urls import reverse
+
+from .pagecache import CSRF_INPUT_RE
+
+MANIFEST_NAME = '.export-manifest.json'
+REDIRECTS_NAME = '_redirects'
+HEADERS_NAME = '_headers'
+PAGE_LINK_RE = re.compile(r'href="\?([^"]*)"')
+ACTIVE_PAGE_RE = re.compile(r'<span class="active">(\d+)</span>')
+SPLAT_RE = re.compile(r':splat|\*')
+
+# 旧的手写页面，保留跳转
+LEGACY_REDIRECTS = (
+    ('/posts.html', '/posts/'),
+    ('/post-detail.html', '/posts/'),
+    ('/archive.html', '/archive/'),
+    ('/about.html', '/about/'),
+    ('/dist/*', '/:splat'),
+)
+
+# 只能由 Django 处理的路径
+DYNAMIC_PATHS = (
+    '/search/*',
+    '/post/:slug/comments/*',
+    '/comments/*',
+    '/like/*',
+    '/newsletter/*',
+    '/admin/*',
+)
+
+
+class ExportError(Exception):
+    """页面渲染失败"""
+
+
+def get_output_dir():
+    return Path(getattr(settings, 'STATIC_EXPORT_DIR', settings.BASE_DIR / 'public'))
+
+
+def collect_routes():
+    """需要导出的路径，返回 ``[(路径, 是否分页), ...]``"""
+    from .models import ArchiveMonth, Category, Post, Series, Tag
+
+    routes = [
+        (reverse('blog:home'), True),
+        (reverse('blog:post_list'), True),
+        (reverse('blog:archive'), False),
+        (reverse('blog:about'), False),
+    ]
+    for model, name in ((Category, 'blog:category'), (Tag, 'blog:tag'), (Series, 'blog:series')):
+        for slug in model.objects.filter(post_count__gt=0).order_by('pk').values_list('slug', flat=True):
+            routes.append((reverse(name, args=[slug]), True))
+
+    years = set()
+    for year, month in ArchiveMonth.objects.filter(post_count__gt=0).order_by('year', 'month').values_list('year', 'month'):
+        if year not in years:
+            years.add(year)
+            routes.append((reverse('blog:archive_year', args=[year]), True))
+            routes.append((reverse('blog:archive_year_posts', args=[year]), False))
+        routes.append((reverse('blog:archive_month', args=[year, month]), True))
+
+    for slug in Post.objects.filter(status='published').order_by('pk').values_list('slug', flat=True):
+        routes.append((reverse('blog:post_detail', args=[slug]), False))
+    return routes
+
+
+def page_path(path, number):
+    return path if number == 1 else f'{path}page/{number}/'
+
+
+def output_name(path, json_response=False):
+    """URL 路径对应的输出文件（相对输出目录）"""
+    directory = path.strip('/')
+    name = 'index.json' if json_response else 'index.html'
+    return f'{directory}/{name}' if directory else name
+
+
+def normalize(html):
+    """去掉每次渲染都不同的 CSRF 令牌，内容不变时摘要才稳定"""
+    return CSRF_INPUT_RE.sub(r'\g<1>\g<2>', html)
+
+
+def rewrite_page_links(html, path, last):
+    """把 ``href="?…"`` 分页链接改写成 ``page/N/`` 路径"""
+    def replace(match):
+        params = parse_qs(unescape(match.group(1)))
+        if 'page' in params:
+            number = int(params['page'][0])
+        elif 'last' in params:
+            number = last
+        else:
+            number = 1
+        return f'href="{page_path(path, number)}"'
+
+    return PAGE_LINK_RE.sub(replace, html)
+
+
+def fetch(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise ExportError(f'{url} 返回 {response.status_code}')
+    return response
+
+
+def render_route(client, path, paginated):
+    """渲染一个路径，返回 ``[(输出文件, 内容字节), ...]``"""
+    response = fetch(client, path)
+    if response.get('Content-Type', '').startswith('application/json'):
+        return [(output_name(path, json_response=True), response.content)]
+    html = normalize(response.content.decode(response.charset))
+    if not paginated:
+        return [(output_name(path), html.encode('utf-8'))]
+
+    # 从第一页开始沿分页链接抓取，每个页码只渲染一次
+    pages = {1: html}
+    queue = PAGE_LINK_RE.findall(html)
+    seen = {''}
+    while queue:
+        query = unescape(queue.pop())
+        if query in seen:
+            continue
+        seen.add(query)
+        params = parse_qs(query)
+        if 'page' in params and int(params['page'][0]) in pages:
+            continue
+        response = fetch(client, f'{path}?{query}')
+        html = normalize(response.content.decode(response.charset))
+        match = ACTIVE_PAGE_RE.search(html)
+        number = int(match.group(1)) if match else 1
+        if number not in pages:
+            pages[number] = html
+            queue.extend(PAGE_LINK_RE.findall(html))
+
+    last = max(pages)
+    return [
+        (output_name(page_path(path, number)), rewrite_page_links(html, path, last).encode('utf-8'))
+        for number, html in sorted(pages.items())
+    ]
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_atomic(target, data):
+    """先写同目录下的临时文件，再原子地替换目标文件"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=target.parent, prefix='.export-')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def save(output_dir, name, data, previous):
+    """内容与上次导出相同且文件仍在时跳过，返回 ``(文件, 摘要, 是否写入)``"""
+    value = digest(data)
+    target = output_dir / name
+    if previous.get(name) == value and target.exists():
+        return name, value, False
+    write_atomic(target, data)
+    return name, value, True
+
+
+def load_manifest(output_dir):
+    try:
+        with open(output_dir / MANIFEST_NAME, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    data = json.dumps(manifest, ensure_ascii=False, indent=0, sort_keys=True).encode('utf-8')
+    write_atomic(output_dir / MANIFEST_NAME, data)
+
+
+def iter_hashed_static():
+    """清单中带哈希的静态文件及其 .gz/.br，没有清单时为空"""
+    from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+
+    if not isinstance(staticfiles_storage, ManifestStaticFilesStorage):
+        return
+    prefix = settings.STATIC_URL.strip('/')
+    for name in sorted(set(staticfiles_storage.hashed_files.values())):
+        for suffix in ('', '.gz', '.br'):
+            if suffix == '' or staticfiles_storage.exists(name + suffix):
+                yield f'{prefix}/{name}{suffix}', staticfiles_storage.path(name + suffix)
+
+
+def iter_static(hashed=True):
+    """
+    静态文件：``hashed`` 且 ``collectstatic`` 生成了清单时只导出带哈希的文件及其 .gz/.br，
+    否则直接从各个查找器复制原文件
+    """
+    from django.contrib.staticfiles.finders import get_finders
+    from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+
+    prefix = settings.STATIC_URL.strip('/')
+    if hashed and isinstance(staticfiles_storage, ManifestStaticFilesStorage) and staticfiles_storage.hashed_files:
+        yield from iter_hashed_static()
+        return
+
+    seen = set()
+    for finder in get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            name = f'{prefix}/{path}'.replace(os.sep, '/')
+            if name not in seen:
+                seen.add(name)
+                yield name, storage.path(path)
+
+
+def iter_assets(hashed=True):
+    """静态文件与上传的媒体文件，返回 ``(输出文件, 源文件路径)``"""
+    yield from iter_static(hashed)
+
+    media_root = Path(settings.MEDIA_ROOT)
+    if media_root.is_dir():
+        media_prefix = settings.MEDIA_URL.strip('/')
+        for source in sorted(media_root.rglob('*')):
+            if source.is_file():
+                yield f'{media_prefix}/{source.relative_to(media_root).as_posix()}', source
+
+
+def build_headers(hashed_paths):
+    """
+    带哈希的静态文件长期缓存。只列出清单中的文件：未运行 ``collectstatic`` 时
+    导出的是原文件名，内容变化后 URL 不变，不能长期缓存
+    """
+    from .staticfiles import IMMUTABLE
+
+    lines = ['# 由 manage.py export_static 生成，请勿手工修改']
+    for path in sorted(hashed_paths):
+        lines.extend([path, f'  Cache-Control: {IMMUTABLE}'])
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def build_redirects(json_paths):
+    lines = ['# 由 manage.py export_static 生成，请勿手工修改']
+    lines.extend(f'{source} {target} 301' for source, target in LEGACY_REDIRECTS)
+    # 归档页按年加载的 JSON 保存为 index.json，需要显式改写
+    lines.extend(f'{path} /{output_name(path, json_response=True)} 200' for path in json_paths)
+    origin = getattr(settings, 'STATIC_EXPORT_DYNAMIC_ORIGIN', '').rstrip('/')
+    if origin:
+        lines.extend(
+            f'{path} {origin}{path.replace("*", ":splat")} 200' for path in DYNAMIC_PATHS
+        )
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def find_untracked(output_dir, exported):
+    """输出目录中不在上次导出清单里的文件（相对输出目录）"""
+    return sorted(
+        name for name in (path.relative_to(output_dir).as_posix() for path in output_dir.rglob('*') if path.is_file())
+        if name != MANIFEST_NAME and name not in exported
+    )
+
+
+def vercel_pattern(path):
+    """``_redirects`` 的 ``*``/``:splat`` 写成 Vercel 的 ``:path*``"""
+    return SPLAT_RE.sub(':path*', path)
+
+
+def build_vercel_config(config, json_paths, hashed_paths):
+    """在已有的 vercel.json 配置上替换跳转、改写和缓存头，与 ``_redirects``/``_headers`` 一致"""
+    from .staticfiles import IMMUTABLE
+
+    config = dict(config)
+    config['redirects'] = [
+        {'source': vercel_pattern(source), 'destination': vercel_pattern(target), 'permanent': True}
+        for source, target in LEGACY_REDIRECTS
+    ]
+    rewrites = [
+        {'source': path, 'destination': f'/{output_name(path, json_response=True)}'} for path in json_paths
+    ]
+    origin = getattr(settings, 'STATIC_EXPORT_DYNAMIC_ORIGIN', '').rstrip('/')
+    if origin:
+        rewrites.extend(
+            {'source': vercel_pattern(path), 'destination': f'{origin}{vercel_pattern(path)}'} for path in DYNAMIC_PATHS
+        )
+    config['rewrites'] = rewrites
+    config['headers'] = [
+        {'source': path, 'headers': [{'key': 'Cache-Control', 'value': IMMUTABLE}]} for path in sorted(hashed_paths)
+    ]
+    return (json.dumps(config, ensure_ascii=False, indent=2) + '\n').encode('utf-8')
+
+
+def save_vercel_config(json_paths, hashed_paths):
+    """更新 ``STATIC_EXPORT_VERCEL_CONFIG``，未设置时跳过；返回是否写入"""
+    path = getattr(settings, 'STATIC_EXPORT_VERCEL_CONFIG', '')
+    if not path:
+        return False
+    path = Path(path)
+    try:
+        current = path.read_bytes()
+        config = json.loads(current)
+    except FileNotFoundError:
+        current, config = b'', {'version': 2}
+    data = build_vercel_config(config, json_paths, hashed_paths)
+    if data == current:
+        return False
+    write_atomic(path, data)
+    return True
+
+
+def remove_stale(output_dir, previous, current):
+    """删除上次导出过、本次没有生成的文件及随之变空的目录"""
+    removed = 0
+    for name in set(previous) - set(current):
+        target = output_dir / name
+        if target.is_file():
+            target.unlink()
+            removed += 1
+        parent = target.parent
+        while parent != output_dir and parent.is_dir() and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+    return removed
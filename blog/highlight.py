@@ -0,0 +1,115 @@
+"""
+代码块高亮缓存
+
+codehilite 和 fenced_code 最终都通过 ``markdown.extensions.codehilite.highlight``
+调用 Pygments。这里把它替换为带缓存的版本：以（语言、代码文本、高亮选项）
+为键，命中时直接返回 HTML，不再进行词法分析。
+
+内存中为有界 LRU；配置 ``MARKDOWN_HIGHLIGHT_CACHE_ALIAS`` 后还会写入对应的
+Django 缓存（如文件缓存），供多个进程共享。
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from markdown.extensions import codehilite
+
+
+class HighlightCache:
+    """代码块高亮结果的 LRU 缓存"""
+
+    def __init__(self, maxsize=2048, alias=None):
+        self.maxsize = maxsize
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(code, lexer, formatter):
+        payload = json.dumps(
+            [
+                type(lexer).__name__,
+                lexer.options,
+                type(formatter).__name__,
+                formatter.options,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        h = hashlib.sha256(payload.encode('utf-8'))
+        h.update(b'\0')
+        h.update(code.encode('utf-8'))
+        return h.hexdigest()
+
+    def get_store(self):
+        if self.alias:
+            return caches[self.alias]
+        return None
+
+    def get(self, key):
+        with self._lock:
+            html = self._data.get(key)
+            if html is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return html
+
+        store = self.get_store()
+        if store is not None:
+            html = store.get(f'hl:{key}')
+            if html is not None:
+                self._remember(key, html)
+                self.hits += 1
+                return html
+
+        self.misses += 1
+        return None
+
+    def set(self, key, html):
+        self._remember(key, html)
+        store = self.get_store()
+        if store is not None:
+            store.set(f'hl:{key}', html)
+
+    def _remember(self, key, html):
+        with self._lock:
+            self._data[key] = html
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+highlight_cache = HighlightCache(
+    maxsize=getattr(settings, 'MARKDOWN_HIGHLIGHT_CACHE_SIZE', 2048),
+    alias=getattr(settings, 'MARKDOWN_HIGHLIGHT_CACHE_ALIAS', None),
+)
+
+_pygments_highlight = getattr(codehilite, 'highlight', None)
+
+
+def cached_highlight(code, lexer, formatter, outfile=None):
+    """与 ``pygments.highlight`` 签名一致的带缓存版本"""
+    if outfile is not None:
+        return _pygments_highlight(code, lexer, formatter, outfile)
+    key = highlight_cache.make_key(code, lexer, formatter)
+    html = highlight_cache.get(key)
+    if html is None:
+        html = _pygments_highlight(code, lexer, formatter)
+        highlight_cache.set(key, html)
+    return html
+
+
+def install():
+    """让 codehilite 使用带缓存的高亮函数（可重复调用）"""
+    if _pygments_highlight is not None and codehilite.highlight is not cached_highlight:
+        codehilite.highlight = cached_highlight
@@ -0,0 +1,266 @@
+"""
+分块增量渲染
+
+把正文按顶层块切分，每块以「扩展签名 + 全文定义 + 块文本」的哈希缓存渲染结果，
+修改一处只需重新渲染变化的块。需要全文信息的部分在拼接后统一处理：
+
+- 链接引用、脚注定义、缩写定义从正文中提取出来，附加到每个块之后一起渲染，
+  因此块内的引用编号与整篇渲染一致（定义变化时所有块随之失效）
+- 标题 id 按文档顺序重新去重，脚注引用的 ``fnref`` 序号按全文重新编号
+- 脚注列表和 ``[TOC]`` 目录在拼接后按全文生成一次
+"""
+import hashlib
+import html as html_lib
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from markdown.extensions.toc import nest_toc_tokens, unique
+
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+LIST_ITEM_RE = re.compile(r'^ {0,3}(?:[*+-]|\d+[.)])\s')
+FOOTNOTE_DEF_RE = re.compile(r'^ {0,3}\[\^[^\]]+\]:')
+LINK_DEF_RE = re.compile(r'^ {0,3}\[[^\]^][^\]]*\]:\s*\S')
+ABBR_DEF_RE = re.compile(r'^\*\[[^\]]+\]:')
+RAW_HTML_RE = re.compile(r'^<(?:[a-zA-Z][\w-]*|/[a-zA-Z][\w-]*)[\s>/]')
+DEFINITION_RE = re.compile(r'^ {0,3}:[ \t]')
+BLOCKQUOTE_RE = re.compile(r'^ {0,3}>')
+TOC_MARKER = '[TOC]'
+
+HEADING_RE = re.compile(r'<h([1-6])([^>]*?) id="([^"]*)"([^>]*)>(.*?)</h\1>', re.S)
+FNREF_RE = re.compile(r'<sup id="fnref\d*:([^"]+)">')
+FOOTNOTE_DIV_RE = re.compile(r'\n?<div class="footnote">.*</div>\s*$', re.S)
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+def split_blocks(text):
+    """
+    切分正文，返回 ``(blocks, context)``。
+
+    ``blocks`` 为顶层块源文本列表；``context`` 为提取出的定义行。
+    正文含有原始 HTML 块或定义列表时不切分，整篇作为一个块：定义列表的
+    「术语」可能在前一个块中，相邻的定义列表还会合并成一个 ``<dl>``。
+    """
+    blocks = []
+    context = []
+    current = []
+    fence = None
+    in_footnote = False
+    after_blank = False
+
+    def close():
+        if current:
+            blocks.append('\n'.join(current).strip('\n'))
+            current.clear()
+
+    for line in (text or '').replace('\r\n', '\n').split('\n'):
+        if fence:
+            current.append(line)
+            if line.strip().startswith(fence) and not line.strip().strip(fence[0]):
+                fence = None
+            continue
+
+        if in_footnote:
+            if not line.strip() or line.startswith(('    ', '\t')):
+                context.append(line)
+                continue
+            in_footnote = False
+            after_blank = True
+
+        if FOOTNOTE_DEF_RE.match(line):
+            context.append(line)
+            in_footnote = True
+            continue
+        if LINK_DEF_RE.match(line) or ABBR_DEF_RE.match(line):
+            context.append(line)
+            continue
+
+        if not line.strip():
+            if current:
+                current.append(line)
+            after_blank = True
+            continue
+
+        if RAW_HTML_RE.match(line) or DEFINITION_RE.match(line):
+            return [text or ''], []
+
+        if after_blank and current and not line.startswith((' ', '\t')):
+            # 空行分隔的列表项属于同一个列表、空行分隔的引用段落属于同一个引用，不能拆开
+            same_list = LIST_ITEM_RE.match(line) and LIST_ITEM_RE.match(current[0])
+            same_quote = BLOCKQUOTE_RE.match(line) and BLOCKQUOTE_RE.match(current[0])
+            if not (same_list or same_quote):
+                close()
+        after_blank = False
+
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+        current.append(line)
+
+    close()
+    return blocks, context
+
+
+def block_key(signature, context, block):
+    h = hashlib.sha256()
+    for part in (signature, context, block):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class BlockCache:
+    """进程内的块渲染结果 LRU"""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                html = self._data.get(key)
+                if html is not None:
+                    self._data.move_to_end(key)
+                    found[key] = html
+        return found
+
+    def set_many(self, items):
+        with self._lock:
+            for key, html in items.items():
+                self._data[key] = html
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class IncrementalRenderer:
+    """
+    按块缓存的 Markdown 渲染器
+
+    块结果先查进程内 LRU；传入 ``key`` 时，还会把该文档上一次渲染的全部块
+    作为一条记录存入共享缓存（``mdblocks:<key>``），其他进程修改同一篇文章时
+    只需读这一条记录即可复用未变化的块。
+    """
+
+    def __init__(self, pool, signature, cache=None, local=None):
+        self.pool = pool
+        self.signature = signature
+        self.cache = cache
+        self.local = local if local is not None else block_cache
+        self.rendered_blocks = 0
+
+    def render(self, text, use_cache=True, key=None):
+        blocks, context_lines = split_blocks(text)
+        context = '\n'.join(context_lines)
+        if len(blocks) == 1 and not context_lines:
+            # 无法切分（或只有一块），直接整篇渲染
+            return self._convert(blocks[0]) if blocks else ''
+
+        keys = [block_key(self.signature, context, block) for block in blocks]
+        cached = {}
+        if use_cache:
+            cached = self.local.get_many(keys)
+            if key and self.cache is not None and len(cached) < len(set(keys)):
+                cached = {**(self.cache.get(f'mdblocks:{key}') or {}), **cached}
+
+        fresh = {}
+        parts = []
+        for block_hash, block in zip(keys, blocks):
+            if block.strip() == TOC_MARKER:
+                parts.append(None)
+                continue
+            part = cached.get(block_hash)
+            if part is None:
+                part = fresh.get(block_hash)
+            if part is None:
+                part = self._render_block(block, context)
+                fresh[block_hash] = part
+            parts.append(part)
+
+        self.local.set_many(fresh)
+        self.rendered_blocks += len(fresh)
+        if key and self.cache is not None and (fresh or not use_cache):
+            current = {h: p for h, p in zip(keys, parts) if p is not None}
+            self.cache.set(f'mdblocks:{key}', current)
+
+        return self._assemble(parts, context_lines)
+
+    def _convert(self, source):
+        with self.pool.acquire() as md:
+            return md.convert(source)
+
+    def _render_block(self, block, context):
+        source = f'{block}\n\n{context}' if context else block
+        return FOOTNOTE_DIV_RE.sub('', self._convert(source))
+
+    def _assemble(self, parts, context_lines):
+        # 标题 id 按全文去重，同时收集目录项
+        used_ids = set()
+        toc_tokens = []
+
+        def fix_heading(match):
+            level, before, old_id, after, inner = match.groups()
+            new_id = unique(old_id, used_ids)
+            name = html_lib.unescape(TAG_RE.sub('', inner)).strip()
+            toc_tokens.append({'level': int(level), 'id': new_id, 'name': name})
+            return f'<h{level}{before} id="{new_id}"{after}>{inner}</h{level}>'
+
+        # 脚注引用按出现顺序编号：第一次为 fnref:x，之后为 fnref2:x、fnref3:x……
+        ref_counts = Counter()
+
+        def fix_fnref(match):
+            label = match.group(1)
+            ref_counts[label] += 1
+            n = ref_counts[label]
+            prefix = 'fnref' if n == 1 else f'fnref{n}'
+            return f'<sup id="{prefix}:{label}">'
+
+        pieces = []
+        toc_positions = []
+        for part in parts:
+            if part is None:
+                toc_positions.append(len(pieces))
+                pieces.append('')
+                continue
+            part = HEADING_RE.sub(fix_heading, part)
+            part = FNREF_RE.sub(fix_fnref, part)
+            pieces.append(part)
+
+        if toc_positions:
+            toc_html = self._render_toc(toc_tokens).strip()
+            for index in toc_positions:
+                pieces[index] = toc_html
+
+        body = '\n'.join(pieces)
+        footnotes = self._render_footnotes(ref_counts, context_lines)
+        if footnotes:
+            body = f'{body}\n{footnotes}'
+        return body
+
+    def _render_toc(self, tokens):
+        with self.pool.acquire() as md:
+            processor = md.treeprocessors['toc'] if 'toc' in md.treeprocessors else None
+            if processor is None:
+                return html_lib.escape(TOC_MARKER)
+            div = processor.build_toc_div(nest_toc_tokens(tokens))
+            return md.serializer(div)
+
+    def _render_footnotes(self, ref_counts, context_lines):
+        if not any(FOOTNOTE_DEF_RE.match(line) for line in context_lines):
+            return ''
+        # 用同样次数的引用配合全部定义渲染一次，得到带正确回链的脚注列表
+        refs = ''.join(f'[^{label}]' * count for label, count in ref_counts.items())
+        source = '\n'.join([refs or '&#8203;', ''] + list(context_lines))
+        match = re.search(r'<div class="footnote">.*</div>', self._convert(source), re.S)
+        return match.group(0) if match else ''
+
+
+block_cache = BlockCache(getattr(settings, 'MARKDOWN_BLOCK_CACHE_SIZE', 4096))
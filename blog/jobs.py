@@ -0,0 +1,273 @@
+"""
+后台任务队列
+
+发送邮件、批量发送新闻通讯等耗时的副作用不在请求中执行：视图只调用 ``enqueue``
+向 ``Job`` 表插入一行，由 ``manage.py run_worker`` 的多个工作线程取出执行。
+
+- 任务函数用 ``@task`` 注册，参数以 JSON 保存，只能是可序列化的简单值（如主键）
+- 认领：条件 UPDATE 把状态从「等待」改为「执行中」并写入执行者与租约到期时间，
+  只有更新成功的线程拿到任务，不依赖 ``SELECT … FOR UPDATE``，SQLite 上同样适用
+- 租约：执行期间心跳线程定期延长租约；进程崩溃后租约过期，任务会被其他工作线程重新认领
+- 失败的任务按指数退避（带随机抖动）重新排队，超过 ``max_attempts`` 次后标记为失败
+- 工作进程每隔 ``JOB_PRUNE_INTERVAL`` 秒删除完成超过 ``JOB_RETENTION_DAYS`` 天的任务
+
+任务可能因租约过期或进程崩溃被执行不止一次，任务函数应当可以重复执行。
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def get_options():
+    return {
+        'concurrency': getattr(settings, 'JOB_WORKER_CONCURRENCY', 4),
+        'poll_interval': getattr(settings, 'JOB_POLL_INTERVAL', 1.0),
+        'lease': getattr(settings, 'JOB_LEASE_SECONDS', 300),
+        'max_attempts': getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+        'retry_base': getattr(settings, 'JOB_RETRY_BASE', 10),
+        'retry_max': getattr(settings, 'JOB_RETRY_MAX', 3600),
+        'retention_days': getattr(settings, 'JOB_RETENTION_DAYS', 7),
+        'prune_interval': getattr(settings, 'JOB_PRUNE_INTERVAL', 3600),
+    }
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """注册任务函数，任务名默认为 ``模块.函数名``"""
+    def decorator(func):
+        func.job_name = name or f'{func.__module__}.{func.__name__}'
+        func.job_max_attempts = max_attempts
+        _registry[func.job_name] = func
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def enqueue(func, delay=None, run_at=None, **payload):
+    """把任务加入队列（一次 INSERT），返回 ``Job``"""
+    from .models import Job
+
+    name = func if isinstance(func, str) else func.job_name
+    handler = _registry.get(name)
+    max_attempts = getattr(handler, 'job_max_attempts', None) or get_options()['max_attempts']
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay) if delay else timezone.now()
+    return Job.objects.create(name=name, payload=payload, run_at=run_at, max_attempts=max_attempts)
+
+
+def enqueue_many(func, payloads):
+    """把同一任务的多组参数一次加入队列（一条 ``bulk_create``），返回加入的任务数"""
+    from .models import Job
+
+    name = func if isinstance(func, str) else func.job_name
+    handler = _registry.get(name)
+    max_attempts = getattr(handler, 'job_max_attempts', None) or get_options()['max_attempts']
+    now = timezone.now()
+    created = Job.objects.bulk_create(
+        [Job(name=name, payload=payload, run_at=now, max_attempts=max_attempts) for payload in payloads]
+    )
+    return len(created)
+
+
+def backoff(attempts, base=None, cap=None):
+    """第 ``attempts`` 次失败后的等待秒数：指数增长，取上限后在 [50%, 100%] 内随机"""
+    options = get_options()
+    base = options['retry_base'] if base is None else base
+    cap = options['retry_max'] if cap is None else cap
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _claimable(now):
+    return Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def claim(worker_id, lease=None, candidates=10):
+    """认领一个到期的任务，没有时返回 ``None``"""
+    from .models import Job
+
+    lease = lease or get_options()['lease']
+    now = timezone.now()
+    pks = list(Job.objects.filter(_claimable(now)).order_by('run_at', 'pk').values_list('pk', flat=True)[:candidates])
+    for pk in pks:
+        claimed = Job.objects.filter(_claimable(now), pk=pk).update(
+            status='running',
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease),
+            attempts=F('attempts') + 1,
+        )
+        if not claimed:
+            continue
+        job = Job.objects.get(pk=pk)
+        if job.attempts > job.max_attempts:
+            # 租约多次过期（执行者反复崩溃）
+            _finish(job, worker_id, 'failed', '超过最多尝试次数（租约过期）')
+            continue
+        return job
+    return None
+
+
+def _finish(job, worker_id, status, error='', run_at=None):
+    """只有仍持有租约时才更新，租约已被他人接管的结果丢弃"""
+    from .models import Job
+
+    fields = {'status': status, 'locked_by': '', 'locked_until': None, 'last_error': error}
+    if status in ('done', 'failed'):
+        fields['finished_at'] = timezone.now()
+    if run_at is not None:
+        fields['run_at'] = run_at
+    return Job.objects.filter(pk=job.pk, locked_by=worker_id).update(**fields)
+
+
+def execute(job, worker_id):
+    """执行已认领的任务并记录结果，返回最终状态"""
+    handler = _registry.get(job.name)
+    if handler is None:
+        _finish(job, worker_id, 'failed', f'未注册的任务：{job.name}')
+        return 'failed'
+    try:
+        handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()[-4000:]
+        if job.attempts >= job.max_attempts:
+            logger.error('任务 %s #%s 失败，不再重试', job.name, job.pk)
+            _finish(job, worker_id, 'failed', error)
+            return 'failed'
+        run_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+        logger.warning('任务 %s #%s 第 %s 次失败，%s 后重试', job.name, job.pk, job.attempts, run_at)
+        _finish(job, worker_id, 'queued', error, run_at=run_at)
+        return 'queued'
+    _finish(job, worker_id, 'done')
+    return 'done'
+
+
+def extend_leases(worker_ids, lease=None):
+    from .models import Job
+
+    lease = lease or get_options()['lease']
+    if not worker_ids:
+        return 0
+    return Job.objects.filter(status='running', locked_by__in=list(worker_ids)).update(
+        locked_until=timezone.now() + timedelta(seconds=lease)
+    )
+
+
+def run_pending(worker_id='inline', limit=None):
+    """在当前线程中依次执行到期的任务（测试与调试用），返回执行的任务数"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        execute(job, worker_id)
+        count += 1
+    return count
+
+
+def prune(days=None):
+    """删除超过保留期的已完成任务，返回删除的行数"""
+    from .models import Job
+
+    days = days or get_options()['retention_days']
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
+
+
+class Worker:
+    """多线程执行队列中的任务，``stop()`` 后各线程做完手头的任务再退出"""
+
+    def __init__(self, concurrency=None, poll_interval=None, lease=None):
+        options = get_options()
+        self.concurrency = concurrency or options['concurrency']
+        self.poll_interval = poll_interval or options['poll_interval']
+        self.lease = lease or options['lease']
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.finished = threading.Event()
+        self.processed = 0
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, args=(f'{self.name}-{index}',), name=f'job-worker-{index}')
+            for index in range(self.concurrency)
+        ]
+        heartbeat = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        finally:
+            self.finished.set()
+
+    def _loop(self, worker_id):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    job = claim(worker_id, self.lease)
+                except Exception:
+                    logger.exception('认领任务失败')
+                    job = None
+                if job is None:
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                with self._lock:
+                    self._busy.add(worker_id)
+                try:
+                    execute(job, worker_id)
+                except Exception:
+                    # 记录结果失败（如数据库暂时被锁）：租约到期后任务会被重新认领
+                    logger.exception('任务 %s #%s 的结果未能保存', job.name, job.pk)
+                finally:
+                    with self._lock:
+                        self._busy.discard(worker_id)
+                        self.processed += 1
+        finally:
+            connections.close_all()
+
+    def _heartbeat(self):
+        interval = max(1.0, self.lease / 3)
+        prune_interval = get_options()['prune_interval']
+        # 启动时先清理一次
+        next_prune = time.monotonic()
+        try:
+            while True:
+                if prune_interval and time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + prune_interval
+                    try:
+                        deleted = prune()
+                        if deleted:
+                            logger.info('已删除 %s 个过期的已完成任务', deleted)
+                    except Exception:
+                        logger.exception('清理过期任务失败')
+                if self.finished.wait(interval):
+                    break
+                with self._lock:
+                    busy = set(self._busy)
+                try:
+                    extend_leases(busy, self.lease)
+                except Exception:
+                    logger.exception('延长任务租约失败')
+        finally:
+            connections.close_all()
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import related
+
+
+class Command(BaseCommand):
+    help = '根据正文 TF-IDF、标签与系列计算每篇文章的相关文章'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--post', type=int, action='append', dest='posts', help='只重新计算这些文章（可多次指定）')
+        parser.add_argument('-k', type=int, default=None, help='每篇文章保留的相关文章数')
+
+    def handle(self, *args, **options):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            raise CommandError('计算相关文章需要安装 numpy。')
+
+        overrides = {'k': options['k']} if options['k'] else {}
+        started = time.monotonic()
+        computed, changed = related.rebuild(options['posts'], **overrides)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'已计算 {computed} 篇文章的相关文章，其中 {changed} 篇有变化，耗时 {elapsed:.1f} 秒。'
+        ))
@@ -0,0 +1,133 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from blog import export
+
+_worker = {}
+
+
+def _init_worker(output_dir, previous, collected):
+    import django
+    django.setup()
+
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from blog.counters import post_views
+
+    # 导出不计浏览量，也不读写整页缓存；关闭 DEBUG 使 {% static %} 解析为带哈希的文件名
+    post_views.enabled = False
+    override_settings(
+        DEBUG=not collected,
+        PAGE_CACHE_ENABLED=False,
+        ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+    ).enable()
+    _worker.update(client=Client(raise_request_exception=True), output_dir=Path(output_dir), previous=previous)
+
+
+def _export(routes):
+    results = []
+    for path, paginated in routes:
+        try:
+            rendered = export.render_route(_worker['client'], path, paginated)
+        except export.ExportError:
+            raise
+        except Exception as exc:
+            # 子进程中的异常只带回消息，在这里标明是哪个页面
+            raise export.ExportError(f'渲染 {path} 失败：{exc.__class__.__name__}: {exc}') from exc
+        for name, data in rendered:
+            results.append(export.save(_worker['output_dir'], name, data, _worker['previous']))
+    return results
+
+
+def _batches(routes, batch_size):
+    """分页路由各自一批（需要逐页抓取），其余按 batch_size 分批"""
+    single = [route for route in routes if not route[1]]
+    for route in routes:
+        if route[1]:
+            yield [route]
+    for start in range(0, len(single), batch_size):
+        yield single[start:start + batch_size]
+
+
+class Command(BaseCommand):
+    help = '使用进程池把整站渲染为静态文件（默认输出到 public/），内容未变的页面不重写'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='输出目录，默认为 STATIC_EXPORT_DIR')
+        parser.add_argument('--workers', type=int, default=None, help='渲染进程数，默认为 CPU 核数')
+        parser.add_argument('--batch-size', type=int, default=50, help='每个任务渲染的页面数')
+        parser.add_argument('--force', action='store_true', help='忽略上次导出的摘要，全部重写')
+        parser.add_argument('--clean', action='store_true', help='删除输出目录中不是由导出生成的文件')
+        parser.add_argument(
+            '--skip-collectstatic', action='store_true', help='不运行 collectstatic，直接复制静态文件原文件'
+        )
+
+    def handle(self, *args, **options):
+        output_dir = Path(options['output']) if options['output'] else export.get_output_dir()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        exported = export.load_manifest(output_dir)
+        # 手写的旧页面会遮住导出的页面和跳转，不确认就不导出
+        untracked = export.find_untracked(output_dir, exported)
+        if untracked and not options['clean']:
+            listed = '、'.join(untracked[:5]) + ('等' if len(untracked) > 5 else '')
+            raise CommandError(
+                f'{output_dir} 中有 {len(untracked)} 个不是由导出生成的文件（{listed}），'
+                f'它们会遮住导出的页面和跳转；确认可以删除后使用 --clean 重新运行。'
+            )
+        previous = {} if options['force'] else exported
+        started = time.monotonic()
+        collected = not options['skip_collectstatic']
+        if collected:
+            call_command('collectstatic', interactive=False, verbosity=0)
+        routes = export.collect_routes()
+
+        manifest = {}
+        written = 0
+
+        def record(results):
+            nonlocal written
+            for name, value, changed in results:
+                manifest[name] = value
+                written += changed
+
+        # fork 之前关闭连接，避免子进程继承同一个 SQLite 句柄
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=_init_worker, initargs=(str(output_dir), previous, collected)
+        ) as pool:
+            try:
+                for results in pool.map(_export, _batches(routes, max(1, options['batch_size']))):
+                    record(results)
+            except export.ExportError as exc:
+                raise CommandError(str(exc))
+
+        pages = len(manifest)
+        record(
+            export.save(output_dir, name, Path(source).read_bytes(), previous)
+            for name, source in export.iter_assets(hashed=collected)
+        )
+        hashed_paths = [f'/{name}' for name, _ in export.iter_hashed_static()] if collected else []
+        json_paths = [path for path, _ in routes if export.output_name(path, json_response=True) in manifest]
+        record([
+            export.save(output_dir, export.REDIRECTS_NAME, export.build_redirects(json_paths), previous),
+            export.save(output_dir, export.HEADERS_NAME, export.build_headers(hashed_paths), previous),
+        ])
+
+        vercel_written = export.save_vercel_config(json_paths, hashed_paths)
+
+        removed = export.remove_stale(output_dir, list(exported) + untracked, manifest)
+        export.save_manifest(output_dir, manifest)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'已导出 {pages} 个页面、{len(manifest) - pages} 个其他文件到 {output_dir}：'
+            f'写入 {written} 个，未变化 {len(manifest) - written} 个，删除 {removed} 个，耗时 {elapsed:.1f} 秒。'
+            + ('已更新 vercel.json。' if vercel_written else '')
+        ))
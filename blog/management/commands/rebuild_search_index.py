@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog import pagecache, search
+
+
+class Command(BaseCommand):
+    help = '重建文章搜索索引（二元分词倒排索引，SQLite 下还有 FTS5 全文索引）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='每批读取的文章数')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                # 分词器配置变化后需要重新建表
+                cursor.execute(f'DROP TABLE IF EXISTS {search.FTS_TABLE}')
+                cursor.execute(search.create_table_sql())
+        total = search.rebuild(chunk_size=max(1, options['chunk_size']))
+        pagecache.invalidate('posts')
+        self.stdout.write(self.style.SUCCESS(f'搜索索引已重建，共 {total} 篇文章。'))
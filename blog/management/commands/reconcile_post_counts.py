@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog import counts, pagecache
+
+
+class Command(BaseCommand):
+    help = '按实际数据修正分类、标签、系列上的文章数，以及文章的评论数和评论的回复数'
+
+    def handle(self, *args, **options):
+        fixed = counts.reconcile()
+        for name, number in fixed.items():
+            self.stdout.write(f'{name}：修正 {number} 条')
+        if any(fixed.values()):
+            pagecache.invalidate('sidebar')
+        comments = counts.reconcile_comments()
+        self.stdout.write(f'评论数与回复数：修正 {comments} 条')
+        if comments:
+            pagecache.invalidate('posts', 'sidebar')
+        self.stdout.write(self.style.SUCCESS('计数已与实际数据一致。'))
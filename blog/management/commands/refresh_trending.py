@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blog import trending
+from blog.counters import post_views
+
+
+class Command(BaseCommand):
+    help = '重新计算近期热门和总榜（可定时运行），并可清理过期的每小时浏览量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='同时删除超过保留期的每小时浏览量')
+
+    def handle(self, *args, **options):
+        post_views.flush()
+        trending_ids, popular_ids = trending.refresh()
+        self.stdout.write(f'近期热门 {len(trending_ids)} 篇，总榜 {len(popular_ids)} 篇。')
+        if options['prune']:
+            deleted = trending.prune()
+            self.stdout.write(f'已删除 {deleted} 条过期的每小时浏览量。')
+        self.stdout.write(self.style.SUCCESS('热门榜单已刷新。'))
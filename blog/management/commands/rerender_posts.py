@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from blog import pagecache, rendering, search
+from blog.models import Post
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _render(item):
+    pk, content, digest, force = item
+    html, digest = rendering.render(content, digest, use_cache=not force, key=f'post:{pk}')
+    return pk, html, digest
+
+
+def _parse_date(value, end=False):
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'日期格式应为 YYYY-MM-DD：{value}')
+    return timezone.make_aware(datetime.combine(day, dt_time.max if end else dt_time.min))
+
+
+class Command(BaseCommand):
+    help = '使用进程池重新渲染文章的 Markdown 内容（可中断后继续）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', help='只渲染该分类（slug）下的文章')
+        parser.add_argument('--since', help='发布时间起始日期 YYYY-MM-DD')
+        parser.add_argument('--until', help='发布时间截止日期 YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, default=None, help='渲染进程数，默认为 CPU 核数')
+        parser.add_argument('--chunk-size', type=int, default=200, help='每批渲染并写回的文章数')
+        parser.add_argument('--force', action='store_true', help='忽略内容摘要，全部重新渲染')
+        parser.add_argument('--start-id', type=int, default=0, help='从该 ID 之后继续（配合 --force 断点续跑）')
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__slug=options['category'])
+        if options['since']:
+            queryset = queryset.filter(published_at__gte=_parse_date(options['since']))
+        if options['until']:
+            queryset = queryset.filter(published_at__lte=_parse_date(options['until'], end=True))
+        if options['start_id']:
+            queryset = queryset.filter(pk__gt=options['start_id'])
+        queryset = queryset.only('id', 'title', 'excerpt', 'status', 'content', 'content_hash').order_by('pk')
+
+        force = options['force']
+        chunk_size = max(1, options['chunk_size'])
+        signature = rendering.extension_signature()
+
+        rendered = skipped = 0
+        total_bytes = 0
+        # last_id 为已取出的最后一篇，done_id 为已提交的最后一篇
+        last_id = done_id = options['start_id']
+        started = time.monotonic()
+
+        # fork 之前关闭连接，避免子进程继承同一个 SQLite 句柄
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            try:
+                while True:
+                    chunk = list(queryset.filter(pk__gt=last_id)[:chunk_size])
+                    if not chunk:
+                        break
+                    last_id = chunk[-1].pk
+
+                    items = []
+                    for post in chunk:
+                        digest = rendering.content_digest(post.content, signature)
+                        if not force and digest == post.content_hash:
+                            skipped += 1
+                            continue
+                        items.append((post.pk, post.content, digest, force))
+                        total_bytes += len(post.content.encode('utf-8'))
+                    if not items:
+                        done_id = last_id
+                        continue
+
+                    results = list(pool.map(_render, items))
+                    posts = {post.pk: post for post in chunk}
+                    updates = []
+                    for pk, html, digest in results:
+                        post = posts[pk]
+                        post.content_html, post.content_hash = html, digest
+                        updates.append(post)
+                    # 每批单独提交，缩短 SQLite 写锁的持有时间
+                    with transaction.atomic():
+                        Post.objects.bulk_update(updates, ['content_html', 'content_hash'])
+                        # bulk_update 不触发信号，搜索索引在这里同步
+                        search.index_posts(updates)
+                    done_id = last_id
+                    rendered += len(updates)
+                    # 保存文章时由信号让缓存页失效，bulk_update 不会触发，在这里补上
+                    pagecache.invalidate(*(f'post:{post.pk}' for post in updates))
+
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f'已渲染 {rendered} 篇，跳过 {skipped} 篇，最后 ID {done_id}，'
+                        f'{rendered / elapsed:.1f} 篇/秒'
+                    )
+            except KeyboardInterrupt:
+                self.stderr.write(self.style.WARNING(
+                    f'已中断，最后完成的 ID 为 {done_id}。'
+                    f'再次运行即可继续（--force 时加上 --start-id {done_id}）。'
+                ))
+                raise
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'完成：渲染 {rendered} 篇，跳过 {skipped} 篇，耗时 {elapsed:.1f} 秒，'
+            f'{rendered / elapsed:.1f} 篇/秒，{total_bytes / elapsed / 1024:.1f} KB/秒'
+        ))
@@ -0,0 +1,36 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from blog import scheduler
+
+
+class Command(BaseCommand):
+    help = '运行定时调度进程（到期时发布定时文章、把定时新闻通讯加入发送队列）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='处理完当前到期的定时项后退出')
+
+    def handle(self, *args, **options):
+        runner = scheduler.Scheduler()
+
+        def report(results):
+            for name, count in results.items():
+                if count:
+                    self.stdout.write(f'{name}：已处理 {count} 项')
+
+        if options['once']:
+            report(runner.run_once())
+            return
+
+        def stop(signum, frame):
+            self.stdout.write('正在停止定时调度……')
+            runner.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(
+            f'定时调度已启动：装载未来 {runner.horizon} 秒内的定时项，每 {runner.reload_interval} 秒重新装载。'
+        )
+        runner.run(on_dispatch=report)
+        self.stdout.write(self.style.SUCCESS('定时调度已停止。'))
@@ -0,0 +1,39 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog import jobs
+
+
+class Command(BaseCommand):
+    help = '运行后台任务工作进程（多线程认领并执行队列中的任务，失败按指数退避重试，定期清理过期任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None, help='工作线程数')
+        parser.add_argument('--poll-interval', type=float, default=None, help='队列为空时的轮询间隔秒数')
+        parser.add_argument('--burst', action='store_true', help='执行完当前到期的任务后退出')
+        parser.add_argument('--prune', action='store_true', help='与 --burst 一起使用时，同时删除超过保留期的已完成任务')
+
+    def handle(self, *args, **options):
+        if options['burst']:
+            started = time.monotonic()
+            count = jobs.run_pending()
+            if options['prune']:
+                self.stdout.write(f'已删除 {jobs.prune()} 个过期的已完成任务。')
+            self.stdout.write(self.style.SUCCESS(
+                f'已执行 {count} 个任务，耗时 {time.monotonic() - started:.1f} 秒。'
+            ))
+            return
+
+        worker = jobs.Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+
+        def stop(signum, frame):
+            self.stdout.write('正在停止：等待正在执行的任务完成……')
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(f'工作进程 {worker.name} 已启动，{worker.concurrency} 个线程。')
+        worker.run()
+        self.stdout.write(self.style.SUCCESS(f'工作进程已停止，共执行 {worker.processed} 个任务。'))
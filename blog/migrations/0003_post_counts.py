@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:20
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_post_counts(apps, schema_editor):
+    for name in ('Category', 'Tag', 'Series'):
+        model = apps.get_model('blog', name)
+        counted = model.objects.annotate(actual=Count('posts', filter=Q(posts__status='published')))
+        for obj in counted:
+            model.objects.filter(pk=obj.pk).update(post_count=obj.actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_post_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量'),
+        ),
+        migrations.RunPython(fill_post_counts, migrations.RunPython.noop),
+    ]
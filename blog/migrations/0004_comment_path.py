@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+def fill_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('blog', 'Comment')
+    paths = {}
+    pending = list(Comment.objects.order_by('pk').values_list('pk', 'parent_id'))
+    # 父评论可能晚于子评论插入，循环到所有路径都能算出为止
+    while pending:
+        remaining = []
+        for pk, parent_id in pending:
+            segment = str(pk).zfill(10)
+            if parent_id is None:
+                paths[pk] = (segment, 0)
+            elif parent_id in paths:
+                parent_path, parent_depth = paths[parent_id]
+                paths[pk] = (f'{parent_path}/{segment}', parent_depth + 1)
+            else:
+                remaining.append((pk, parent_id))
+        if len(remaining) == len(pending):
+            break
+        pending = remaining
+    for pk, (path, depth) in paths.items():
+        Comment.objects.filter(pk=pk).update(path=path, depth=depth)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='层级'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=1000, verbose_name='评论路径'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='blog_commen_post_id_34d25d_idx'),
+        ),
+        migrations.RunPython(fill_comment_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:23
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def fill_comment_counts(apps, schema_editor):
+    Comment = apps.get_model('blog', 'Comment')
+    Post = apps.get_model('blog', 'Post')
+    post_counts = Counter()
+    reply_counts = Counter()
+    for post_id, path in Comment.objects.filter(is_approved=True).values_list('post_id', 'path'):
+        post_counts[post_id] += 1
+        # 路径中除自身外的每一段都是祖先
+        for segment in path.split('/')[:-1]:
+            reply_counts[int(segment)] += 1
+    for pk, count in post_counts.items():
+        Post.objects.filter(pk=pk).update(comment_count=count)
+    for pk, count in reply_counts.items():
+        Comment.objects.filter(pk=pk).update(reply_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_comment_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='已审核回复数'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='已审核评论数'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', 'created_at'], name='blog_commen_post_id_83c732_idx'),
+        ),
+        migrations.RunPython(fill_comment_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+import html
+
+from django.conf import settings
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# 建表语句与纯文本提取照搬 blog.search 当时的实现，之后修改 blog.search 不影响本迁移
+FTS_TABLE = 'blog_post_fts'
+
+
+def plain_text(post):
+    return html.unescape(strip_tags(post.content_html or ''))
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 虚拟表只在 SQLite 上创建，其他数据库搜索时回退到 icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    tokenizer = getattr(settings, 'SEARCH_FTS_TOKENIZER', 'trigram')
+
+    Post = apps.get_model('blog', 'Post')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, excerpt, body, tokenize='{tokenizer}')"
+    )
+    rows = [
+        (post.pk, post.title, post.excerpt, plain_text(post))
+        for post in Post.objects.filter(status='published').only('id', 'title', 'excerpt', 'content_html')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_comment_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:29
+
+import html
+import re
+import sys
+import unicodedata
+from array import array
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+import django.db.models.deletion
+
+# 分词、倒排列表编码与纯文本提取照搬 blog.bigram / blog.search 当时的实现，
+# 之后修改这两个模块不影响本迁移
+TERM_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    terms = []
+    for run in TERM_RE.findall(unicodedata.normalize('NFKC', text or '').casefold()):
+        if not run[0].isascii():
+            if len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run[:MAX_TERM_LENGTH])
+    return terms
+
+
+def encode_postings(ids):
+    deltas = array('I', (b - a for a, b in zip([0] + ids[:-1], ids)))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def plain_text(post):
+    return html.unescape(strip_tags(post.content_html or ''))
+
+
+def build_search_terms(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    SearchDocument = apps.get_model('blog', 'SearchDocument')
+    SearchTerm = apps.get_model('blog', 'SearchTerm')
+    postings = {}
+    documents = []
+    posts = Post.objects.filter(status='published').only('id', 'title', 'excerpt', 'content_html').order_by('pk')
+    for post in posts.iterator():
+        terms = set(tokenize(' '.join([post.title, post.excerpt, plain_text(post)])))
+        for term in terms:
+            postings.setdefault(term, []).append(post.pk)
+        documents.append(SearchDocument(post_id=post.pk, terms=' '.join(sorted(terms))))
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+    SearchTerm.objects.bulk_create(
+        [SearchTerm(term=term, postings=encode_postings(ids), doc_count=len(ids)) for term, ids in postings.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='blog.post', verbose_name='文章')),
+                ('terms', models.TextField(blank=True, verbose_name='词项')),
+            ],
+            options={
+                'verbose_name': '搜索文档',
+                'verbose_name_plural': '搜索文档',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True, verbose_name='词项')),
+                ('doc_count', models.PositiveIntegerField(default=0, verbose_name='文档数')),
+                ('postings', models.BinaryField(verbose_name='倒排列表')),
+            ],
+            options={
+                'verbose_name': '搜索词项',
+                'verbose_name_plural': '搜索词项',
+            },
+        ),
+        migrations.RunPython(build_search_terms, migrations.RunPython.noop),
+    ]
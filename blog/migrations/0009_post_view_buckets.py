@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_related_posts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='小时')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='浏览量')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='blog.post', verbose_name='文章')),
+            ],
+            options={
+                'verbose_name': '每小时浏览量',
+                'verbose_name_plural': '每小时浏览量',
+                'indexes': [models.Index(fields=['hour'], name='blog_postvi_hour_2cb678_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postviewbucket',
+            constraint=models.UniqueConstraint(fields=('post', 'hour'), name='blog_postviewbucket_post_hour'),
+        ),
+    ]
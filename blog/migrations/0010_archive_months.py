@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:35
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_archive_months(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    ArchiveMonth = apps.get_model('blog', 'ArchiveMonth')
+    counts = {}
+    for published_at in Post.objects.filter(status='published', published_at__isnull=False).values_list('published_at', flat=True).iterator():
+        local = timezone.localtime(published_at) if timezone.is_aware(published_at) else published_at
+        counts[(local.year, local.month)] = counts.get((local.year, local.month), 0) + 1
+    ArchiveMonth.objects.bulk_create(
+        [ArchiveMonth(year=year, month=month, post_count=count) for (year, month), count in counts.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_post_view_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='年份')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='月份')),
+                ('post_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量')),
+            ],
+            options={
+                'verbose_name': '归档月份',
+                'verbose_name_plural': '归档月份',
+                'ordering': ['-year', '-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='archivemonth',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='blog_archivemonth_year_month'),
+        ),
+        migrations.RunPython(fill_archive_months, migrations.RunPython.noop),
+    ]
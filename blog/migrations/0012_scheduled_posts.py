@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='status',
+            field=models.CharField(choices=[('draft', '草稿'), ('scheduled', '定时发布'), ('published', '已发布')], default='draft', max_length=10, verbose_name='发布状态'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', 'published_at'], name='blog_post_status_5b2843_idx'),
+        ),
+    ]
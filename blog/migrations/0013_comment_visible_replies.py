@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:22
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def recount_visible_replies(apps, schema_editor):
+    """回复数改为只计可见的后代（与该评论之间的各级评论均已审核）"""
+    Comment = apps.get_model('blog', 'Comment')
+    rows = list(Comment.objects.values_list('pk', 'path', 'is_approved', 'reply_count'))
+    approved = {pk for pk, _, is_approved, _ in rows if is_approved}
+    actual = Counter()
+    for pk, path, is_approved, _ in rows:
+        if not is_approved:
+            continue
+        for ancestor in reversed([int(segment) for segment in path.split('/')[:-1] if segment]):
+            actual[ancestor] += 1
+            if ancestor not in approved:
+                break
+    stale = [Comment(pk=pk, reply_count=actual[pk]) for pk, _, _, reply_count in rows if reply_count != actual[pk]]
+    Comment.objects.bulk_update(stale, ['reply_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_scheduled_posts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='可见回复数'),
+        ),
+        migrations.RunPython(recount_visible_replies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_comment_visible_replies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='名称')),
+                ('value', models.PositiveBigIntegerField(default=0, verbose_name='当前值')),
+            ],
+            options={
+                'verbose_name': '序号',
+                'verbose_name_plural': '序号',
+            },
+        ),
+    ]
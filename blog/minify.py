@@ -0,0 +1,183 @@
+"""
+CSS / JS 压缩
+
+不依赖第三方库的保守压缩，供静态文件收集（见 ``blog.staticfiles``）使用：
+
+- CSS：去掉注释（保留 ``/*! … */``），合并空白，去掉 ``{ } ; , >`` 两侧与 ``:`` 之后的空格
+- JS：去掉注释，合并空白，去掉标点两侧的空格；换行保留（只去掉 ``{ ; , ( [`` 之后的），
+  不改变自动分号插入的结果。字符串、模板字符串（含 ``${…}``）与正则字面量原样保留
+"""
+import re
+
+CSS_TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/', re.S)
+CSS_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+CSS_SPACE_RE = re.compile(r'\s*([{};,>])\s*|(:)\s+')
+
+
+def _css_comment(match):
+    text = match.group()
+    if text.startswith('/*!'):
+        return text
+    return ' ' if text.startswith('/*') else text
+
+
+def _css_code(code):
+    code = re.sub(r'\s+', ' ', code)
+    return CSS_SPACE_RE.sub(lambda m: m.group(1) or m.group(2), code)
+
+
+def css(source):
+    source = CSS_TOKEN_RE.sub(_css_comment, source)
+    parts = []
+    position = 0
+    for match in CSS_STRING_RE.finditer(source):
+        parts.append(_css_code(source[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(_css_code(source[position:]))
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+JS_PUNCTUATION = set('{}()[];,=:<>+-*/%&|!?~^.')
+JS_NEWLINE_AFTER = set('{;,([')
+# 这些字符或关键字之后的 / 是正则字面量的开始
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'yield', 'await'}
+JS_WORD_RE = re.compile(r'[A-Za-z_$][\w$]*$')
+
+
+class _JSWriter:
+    def __init__(self):
+        self.out = []
+        self.pending_space = False
+        self.pending_newline = False
+
+    def last(self):
+        return self.out[-1][-1] if self.out else ''
+
+    def emit(self, text):
+        if self.out:
+            previous = self.last()
+            first = text[0]
+            if self.pending_newline and previous not in JS_NEWLINE_AFTER and previous != '\n':
+                self.out.append('\n')
+            elif (self.pending_space or self.pending_newline) and previous != '\n':
+                both_signs = previous in '+-' and first in '+-'
+                both_slashes = previous == '/' and first == '/'
+                if both_signs or both_slashes or not (previous in JS_PUNCTUATION or first in JS_PUNCTUATION):
+                    self.out.append(' ')
+        self.pending_space = self.pending_newline = False
+        self.out.append(text)
+
+    def regex_allowed(self):
+        previous = self.last()
+        if not previous:
+            return True
+        if previous in JS_REGEX_AFTER:
+            return True
+        match = JS_WORD_RE.search(''.join(self.out[-3:]))
+        return bool(match) and match.group() in JS_REGEX_KEYWORDS
+
+
+def _scan_quoted(source, start, quote):
+    index = start + 1
+    while index < len(source):
+        char = source[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == quote or char == '\n':
+            return index + 1
+        index += 1
+    return index
+
+
+def _scan_regex(source, start):
+    index, in_class = start + 1, False
+    while index < len(source):
+        char = source[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '\n':
+            break
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            index += 1
+            while index < len(source) and (source[index].isalnum() or source[index] == '_'):
+                index += 1
+            return index
+        index += 1
+    return index
+
+
+def js(source):
+    writer = _JSWriter()
+    # 模板字符串中 ${…} 的花括号深度栈
+    templates = []
+    index = 0
+    length = len(source)
+    while index < length:
+        char = source[index]
+        pair = source[index:index + 2]
+
+        if char == '`' or (char == '}' and templates and templates[-1] == 0):
+            # 模板字符串的一段：到下一个 ` 或 ${ 为止
+            if char == '}':
+                templates.pop()
+            end = index + 1
+            while end < length:
+                if source[end] == '\\':
+                    end += 2
+                    continue
+                if source[end] == '`':
+                    end += 1
+                    break
+                if source.startswith('${', end):
+                    end += 2
+                    templates.append(0)
+                    break
+                end += 1
+            writer.emit(source[index:end])
+            index = end
+        elif pair == '//':
+            end = source.find('\n', index)
+            index = length if end < 0 else end
+        elif pair == '/*':
+            end = source.find('*/', index + 2)
+            end = length if end < 0 else end + 2
+            if '\n' in source[index:end]:
+                writer.pending_newline = True
+            else:
+                writer.pending_space = True
+            index = end
+        elif char in '"\'':
+            end = _scan_quoted(source, index, char)
+            writer.emit(source[index:end])
+            index = end
+        elif char == '/' and writer.regex_allowed():
+            end = _scan_regex(source, index)
+            writer.emit(source[index:end])
+            index = end
+        elif char == '\n':
+            writer.pending_newline = True
+            index += 1
+        elif char.isspace():
+            writer.pending_space = True
+            index += 1
+        else:
+            if templates:
+                if char == '{':
+                    templates[-1] += 1
+                elif char == '}':
+                    templates[-1] -= 1
+            end = index + 1
+            if char.isalnum() or char in '_$':
+                while end < length and (source[end].isalnum() or source[end] in '_$'):
+                    end += 1
+            writer.emit(source[index:end])
+            index = end
+    return ''.join(writer.out).strip() + '\n'
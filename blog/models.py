@@ -1,10 +1,10 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
-import markdown
-from markdown.extensions import extra, codehilite, toc, footnotes
+from . import rendering
 
 
 class Category(models.Model):
@@ -12,6 +12,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name='分类名称')
     slug = models.SlugField(max_length=100, unique=True, verbose_name='URL别名')
     description = models.TextField(blank=True, verbose_name='分类描述')
+    post_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
 
     class Meta:
@@ -28,6 +29,7 @@ class Tag(models.Model):
     name = models.CharField(max_length=50, verbose_name='标签名称')
     slug = models.SlugField(max_length=50, unique=True, verbose_name='URL别名')
     color = models.CharField(max_length=20, default='#C5A059', verbose_name='标签颜色')
+    post_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量')
 
     class Meta:
         verbose_name = '标签'
@@ -45,6 +47,7 @@ class Series(models.Model):
     description = models.TextField(blank=True, verbose_name='系列描述')
     cover_image = models.ImageField(upload_to='series/covers/', blank=True, verbose_name='封面图片')
     order = models.PositiveIntegerField(default=0, verbose_name='排序')
+    post_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
 
     class Meta:
@@ -56,12 +59,39 @@ class Series(models.Model):
         return self.name
 
 
+class ArchiveMonth(models.Model):
+    """每月已发布文章数（按站点时区），归档页直接读取"""
+    year = models.PositiveSmallIntegerField(verbose_name='年份')
+    month = models.PositiveSmallIntegerField(verbose_name='月份')
+    post_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量')
+
+    class Meta:
+        verbose_name = '归档月份'
+        verbose_name_plural = '归档月份'
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='blog_archivemonth_year_month'),
+        ]
+
+    def __str__(self):
+        return f'{self.year}-{self.month:02d}'
+
+
+class PostQuerySet(models.QuerySet):
+    def summaries(self):
+        """列表页使用的文章摘要：不读取正文、渲染后的 HTML 等大字段"""
+        return self.defer(*Post.BODY_FIELDS)
+
+
 class Post(models.Model):
     """博客文章"""
     STATUS_CHOICES = [
         ('draft', '草稿'),
+        ('scheduled', '定时发布'),
         ('published', '已发布'),
     ]
+    # 列表页不需要的大字段，见 PostQuerySet.summaries()
+    BODY_FIELDS = ('content', 'content_html', 'gallery_images')
 
     title = models.CharField(max_length=200, verbose_name='标题')
     slug = models.SlugField(max_length=200, unique=True, verbose_name='URL别名')
@@ -74,6 +104,7 @@ class Post(models.Model):
     excerpt = models.TextField(max_length=500, blank=True, verbose_name='摘要')
     content = models.TextField(verbose_name='正文内容')
     content_html = models.TextField(blank=True, verbose_name='渲染后的HTML')
+    content_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name='渲染内容摘要')
 
     featured = models.BooleanField(default=False, verbose_name='设为特色文章')
     featured_order = models.PositiveIntegerField(default=0, verbose_name='特色文章排序')
@@ -83,11 +114,14 @@ class Post(models.Model):
 
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft', verbose_name='发布状态')
     views = models.PositiveIntegerField(default=0, verbose_name='浏览量')
+    comment_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='已审核评论数')
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
     published_at = models.DateTimeField(null=True, blank=True, verbose_name='发布时间')
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         verbose_name = '文章'
         verbose_name_plural = '文章'
@@ -95,6 +129,8 @@ class Post(models.Model):
         indexes = [
             models.Index(fields=['-published_at']),
             models.Index(fields=['status']),
+            # 调度器按发布时间取出到期的定时发布文章
+            models.Index(fields=['status', 'published_at']),
         ]
 
     def __str__(self):
@@ -105,22 +141,104 @@ class Post(models.Model):
         if not self.slug:
             self.slug = slugify(self.title)
 
-        # 渲染Markdown内容
-        md = markdown.Markdown(extensions=['extra', 'codehilite', 'toc', 'footnotes'])
-        self.content_html = md.convert(self.content)
-
-        # 设置发布时间
-        if self.status == 'published' and not self.published_at:
+        # 渲染Markdown内容（只更新浏览量等字段时跳过）
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'content_html', 'content_hash'}
+
+        # 设置发布时间；发布时间在未来的改为定时发布，到时由 run_scheduler 发布。
+        # 没有发布时间的定时文章取当前时间，由调度器下一轮发布
+        changed = set()
+        if self.status in ('published', 'scheduled') and not self.published_at:
             self.published_at = timezone.now()
+            changed.add('published_at')
+        if self.status == 'published' and self.published_at > timezone.now():
+            self.status = 'scheduled'
+            changed.add('status')
+        # 只保存部分字段时一并写入上面改动的字段，避免实例与数据库不一致
+        if changed and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | changed
 
         super().save(*args, **kwargs)
 
+    def clean(self):
+        super().clean()
+        if self.status == 'scheduled' and not self.published_at:
+            raise ValidationError({'published_at': '定时发布的文章需要设置发布时间'})
+
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
 
+    def render_content(self, force=False):
+        """渲染正文，源文本和扩展配置都未变化时跳过，返回是否重新渲染"""
+        digest = rendering.content_digest(self.content)
+        if not force and digest == self.content_hash and self.content_html:
+            return False
+        key = f'post:{self.pk}' if self.pk else None
+        self.content_html, self.content_hash = rendering.render(self.content, digest, key=key)
+        return True
+
+
+class CommentManager(models.Manager):
+    """评论管理器"""
+
+    @staticmethod
+    def assemble(comments, root_ids=None):
+        """
+        把按 path 排序的评论组装成树，返回顶层节点列表。
+
+        ``root_ids`` 为空时 parent 为空的评论作为顶层；否则 parent 在
+        ``root_ids`` 中的评论作为顶层（用于组装某条评论下的子树）。
+        每条评论的 ``children`` 直接读取组装好的子评论，不再查询数据库。
+        """
+        by_id = {}
+        roots = []
+        for comment in comments:
+            comment._tree_children = []
+            by_id[comment.pk] = comment
+            if root_ids is None:
+                is_root = comment.parent_id is None
+            else:
+                is_root = comment.parent_id in root_ids
+            if is_root:
+                roots.append(comment)
+            elif comment.parent_id in by_id:
+                by_id[comment.parent_id]._tree_children.append(comment)
+            # 父评论未通过审核时，整棵子树都不显示
+        return roots
+
+    def threads(self, post, after=None, limit=20):
+        """
+        按 (created_at, id) 键集分页取已审核的顶级评论（不含回复），
+        返回 ``(评论列表, 下一页的排序键或 None)``。
+        """
+        queryset = self.filter(post=post, parent__isnull=True, is_approved=True).order_by('created_at', 'pk')
+        if after is not None:
+            created_at, pk = after
+            queryset = queryset.filter(
+                models.Q(created_at__gt=created_at) | models.Q(created_at=created_at, pk__gt=pk)
+            )
+        comments = list(queryset[:limit + 1])
+        if len(comments) > limit:
+            comments = comments[:limit]
+            return comments, (comments[-1].created_at, comments[-1].pk)
+        return comments, None
+
+    def subtree(self, comment):
+        """一次查询取出某条评论下全部已审核回复，返回组装好的直接回复列表"""
+        descendants = self.filter(
+            post_id=comment.post_id,
+            path__startswith=f'{comment.path}/',
+            is_approved=True,
+        ).order_by('path')
+        return self.assemble(list(descendants), root_ids={comment.pk})
+
 
 class Comment(models.Model):
     """文章评论"""
+    PATH_STEP = 10
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', verbose_name='文章')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies', verbose_name='父评论')
     author_name = models.CharField(max_length=50, verbose_name='评论者昵称')
@@ -131,20 +249,51 @@ class Comment(models.Model):
     is_spam = models.BooleanField(default=False, verbose_name='是否垃圾评论')
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='IP地址')
 
+    # 物化路径：祖先到自身的 ID（定长补零）以 / 连接，按 path 排序即为树的先序遍历
+    path = models.CharField(max_length=1000, blank=True, editable=False, verbose_name='评论路径')
+    depth = models.PositiveIntegerField(default=0, editable=False, verbose_name='层级')
+    reply_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='可见回复数')
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='评论时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
+    objects = CommentManager()
+
     class Meta:
         verbose_name = '评论'
         verbose_name_plural = '评论'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['post', 'path']),
+            models.Index(fields=['post', 'parent', 'created_at']),
+        ]
 
     def __str__(self):
         return f'{self.author_name} 的评论: {self.content[:50]}...'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.store_path()
+
+    def store_path(self):
+        """写入物化路径；路径包含自身 ID，只能在插入之后计算（``post_save`` 信号中可能先于此处调用）"""
+        path, depth = self.build_path()
+        if (path, depth) != (self.path, self.depth):
+            self.path, self.depth = path, depth
+            Comment.objects.filter(pk=self.pk).update(path=path, depth=depth)
+
+    def build_path(self):
+        segment = str(self.pk).zfill(self.PATH_STEP)
+        if self.parent_id is None:
+            return segment, 0
+        parent = self.parent
+        return f'{parent.path}/{segment}', parent.depth + 1
+
     @property
     def children(self):
-        """获取子评论"""
+        """获取子评论（经 ``CommentManager.assemble()`` 组装时不再查询）"""
+        if hasattr(self, '_tree_children'):
+            return self._tree_children
         return Comment.objects.filter(parent=self, is_approved=True).order_by('created_at')
 
 
@@ -165,3 +314,129 @@ class Link(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class PostViewBucket(models.Model):
+    """文章每小时的浏览量，用于计算近期热门"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_buckets', verbose_name='文章')
+    hour = models.DateTimeField(verbose_name='小时')
+    views = models.PositiveIntegerField(default=0, verbose_name='浏览量')
+
+    class Meta:
+        verbose_name = '每小时浏览量'
+        verbose_name_plural = '每小时浏览量'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hour'], name='blog_postviewbucket_post_hour'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} @ {self.hour:%Y-%m-%d %H}:00'
+
+
+class SearchTerm(models.Model):
+    """二元分词倒排索引的词项，倒排列表为差值编码的文章 ID 数组"""
+    term = models.CharField(max_length=64, unique=True, verbose_name='词项')
+    doc_count = models.PositiveIntegerField(default=0, verbose_name='文档数')
+    postings = models.BinaryField(verbose_name='倒排列表')
+
+    class Meta:
+        verbose_name = '搜索词项'
+        verbose_name_plural = '搜索词项'
+
+    def __str__(self):
+        return self.term
+
+
+class SearchDocument(models.Model):
+    """文章当前已写入索引的词项，用于增量更新时计算差异"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='search_document', verbose_name='文章')
+    terms = models.TextField(blank=True, verbose_name='词项')
+
+    class Meta:
+        verbose_name = '搜索文档'
+        verbose_name_plural = '搜索文档'
+
+    def __str__(self):
+        return str(self.post_id)
+
+
+class RelatedPost(models.Model):
+    """预先计算的相关文章（按相似度排名），由 ``build_related_posts`` 命令生成"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries', verbose_name='文章')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+', verbose_name='相关文章')
+    score = models.FloatField(verbose_name='相似度')
+    rank = models.PositiveSmallIntegerField(verbose_name='排名')
+
+    class Meta:
+        verbose_name = '相关文章'
+        verbose_name_plural = '相关文章'
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_relatedpost_post_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} → {self.related_id}'
+
+
+class Job(models.Model):
+    """后台任务队列（见 ``blog.jobs``），由 ``manage.py run_worker`` 执行"""
+    STATUS_CHOICES = [
+        ('queued', '等待执行'),
+        ('running', '执行中'),
+        ('done', '已完成'),
+        ('failed', '失败'),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name='任务')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='参数')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name='状态')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='计划执行时间')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='已尝试次数')
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name='最多尝试次数')
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name='执行者')
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name='租约到期时间')
+    last_error = models.TextField(blank=True, verbose_name='最近错误')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
+
+    class Meta:
+        verbose_name = '后台任务'
+        verbose_name_plural = '后台任务'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class SequenceManager(models.Manager):
+    def next_value(self, name):
+        """把名为 ``name`` 的序号加一并返回新值；UPDATE 在事务内持有行锁，并发调用不会取到相同的值"""
+        with transaction.atomic():
+            self.get_or_create(name=name)
+            self.filter(name=name).update(value=models.F('value') + 1)
+            return self.filter(name=name).values_list('value', flat=True).get()
+
+    def current_value(self, name):
+        return self.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+class Sequence(models.Model):
+    """跨进程共享的递增序号（如搜索框自动补全的变更序号）"""
+    name = models.CharField(max_length=100, unique=True, verbose_name='名称')
+    value = models.PositiveBigIntegerField(default=0, verbose_name='当前值')
+
+    objects = SequenceManager()
+
+    class Meta:
+        verbose_name = '序号'
+        verbose_name_plural = '序号'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
@@ -0,0 +1,164 @@
+"""
+整页缓存与标签失效
+
+匿名读者（没有 session / messages Cookie）的 GET 请求直接返回缓存的整页 HTML，
+命中时不访问数据库。视图渲染时通过 ``tag_page()`` 为页面登记依赖标签，
+如 ``post:1``、``category:2``、``tag:3``、``series:4``、``posts``、``sidebar``；
+模型变更时 ``invalidate()`` 对应标签即可让相关页面失效。
+
+失效通过标签版本号实现：每个标签在缓存中有一个版本值，缓存页记录生成时
+各标签的版本，读取时任一版本不一致即视为过期，无需枚举页面。
+
+浏览量不会让页面失效：缓存的文章详情页显示的阅读数最多滞后 ``PAGE_CACHE_TIMEOUT`` 秒，
+这是有意的取舍，每次阅读都失效会让详情页几乎无法命中缓存。
+"""
+import hashlib
+import re
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = '__PAGE_CACHE_CSRF_TOKEN__'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def _tag_key(tag):
+    return f'pagetag:{tag}'
+
+
+def tag_page(request, *tags):
+    """为当前请求的页面登记依赖标签"""
+    if not hasattr(request, 'page_cache_tags'):
+        request.page_cache_tags = set()
+    request.page_cache_tags.update(str(tag) for tag in tags if tag)
+
+
+def tag_posts(request, posts):
+    """登记页面上展示的文章及其分类、系列、（已预取的）标签"""
+    tags = []
+    for post in posts:
+        tags.append(f'post:{post.pk}')
+        if post.category_id:
+            tags.append(f'category:{post.category_id}')
+        if post.series_id:
+            tags.append(f'series:{post.series_id}')
+        prefetched = getattr(post, '_prefetched_objects_cache', {})
+        if 'tags' in prefetched:
+            tags.extend(f'tag:{tag.pk}' for tag in prefetched['tags'])
+    tag_page(request, *tags)
+
+
+def set_page_meta(request, **meta):
+    """随缓存页保存的附加信息，命中时交给 ``on_hit`` 回调"""
+    if not hasattr(request, 'page_cache_meta'):
+        request.page_cache_meta = {}
+    request.page_cache_meta.update(meta)
+
+
+def invalidate(*tags):
+    """使依赖这些标签的缓存页全部失效"""
+    tags = {str(tag) for tag in tags if tag}
+    if tags:
+        get_cache().set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # 有 session（已登录或曾提交表单）或有待显示的消息时，页面因人而异
+    cookies = request.COOKIES
+    if settings.SESSION_COOKIE_NAME in cookies:
+        return False
+    if getattr(settings, 'MESSAGE_COOKIE_NAME', 'messages') in cookies:
+        return False
+    return True
+
+
+def page_key(request, query_params=()):
+    parts = [request.path]
+    for name in sorted(query_params):
+        parts.append(f'{name}={request.GET.get(name, "")}')
+    digest = hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+    return f'page:{digest}'
+
+
+def _current_versions(cache, tags, create=False):
+    keys = [_tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    if create:
+        missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+        if missing:
+            for key, version in missing.items():
+                cache.add(key, version, None)
+            found.update(cache.get_many(list(missing)))
+    return {tag: found.get(_tag_key(tag)) for tag in tags}
+
+
+def _load(cache, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions = _current_versions(cache, entry['tags'])
+    if versions != entry['tags']:
+        return None
+    return entry
+
+
+def _build_response(request, entry):
+    content = entry['content']
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+    response = HttpResponse(content, content_type=entry['content_type'])
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def cached_page(query_params=(), timeout=None, on_hit=None):
+    """
+    带标签失效的整页缓存装饰器。
+
+    ``query_params`` 列出参与缓存键的查询参数，其余参数被忽略；
+    ``on_hit(request, meta)`` 在命中时调用，用于浏览量统计等副作用。
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not getattr(settings, 'PAGE_CACHE_ENABLED', True) or not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = page_key(request, query_params)
+            entry = _load(cache, key)
+            if entry is not None:
+                if on_hit is not None:
+                    on_hit(request, entry['meta'])
+                return _build_response(request, entry)
+
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            if response.status_code != 200 or response.streaming:
+                return response
+
+            tags = getattr(request, 'page_cache_tags', set())
+            content = CSRF_INPUT_RE.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', response.content.decode(response.charset))
+            entry = {
+                'content': content,
+                'content_type': response['Content-Type'],
+                'tags': _current_versions(cache, tags, create=True),
+                'meta': getattr(request, 'page_cache_meta', {}),
+            }
+            page_timeout = timeout if timeout is not None else getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+            cache.set(key, entry, page_timeout)
+            response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
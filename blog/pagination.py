@@ -0,0 +1,246 @@
+"""
+键集（游标）分页
+
+游标把排序键编码成不透明的字符串放在查询参数里，翻页时用 WHERE 条件
+定位，而不是 OFFSET，深页与首页耗时相同。
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+
+def encode_cursor(*values):
+    """把排序键编码为 URL 安全的游标字符串"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """
+    解码游标，``types`` 依次给出各个值的类型（``datetime`` / ``int`` / ``str``）。
+
+    游标无效时返回 ``None``。
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            return None
+        result = []
+        for value, kind in zip(values, types):
+            if kind is datetime:
+                result.append(datetime.fromisoformat(value) if value is not None else None)
+            else:
+                result.append(kind(value))
+        return tuple(result)
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """一页键集分页结果，提供与模板配合的导航信息"""
+
+    def __init__(self, object_list, number, has_previous, has_next, links, approx_total, num_pages):
+        self.object_list = object_list
+        self.number = number
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.links = links
+        self.approx_total = approx_total
+        self.num_pages = num_pages
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def previous_link(self):
+        return next((link for link in self.links if link and link['number'] == self.number - 1), None)
+
+    @property
+    def next_link(self):
+        return next((link for link in self.links if link and link['number'] == self.number + 1), None)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView 的键集分页。
+
+    默认按 (published_at, id) 倒序；通过 ``after`` / ``before`` 游标前后翻页，
+    ``last=1`` 直接取最后一页（反向查询），``page`` 只用于显示页码。
+    导航条在当前页前后各取 ``pagination_window`` 页的排序键生成游标链接，
+    总数来自缓存的近似值，因此任何深度的页面都只需要常数次有界查询。
+    """
+    keyset_fields = (('published_at', True), ('pk', True))
+    pagination_window = 2
+    cursor_params = ('after', 'before', 'last', 'page')
+
+    def get_keyset_fields(self):
+        return self.keyset_fields
+
+    def get_pagination_params(self):
+        """翻页链接需要保留的其他查询参数"""
+        return {}
+
+    def _order_by(self, reverse=False):
+        return [
+            f'-{field}' if descending != reverse else field
+            for field, descending in self.get_keyset_fields()
+        ]
+
+    def _seek(self, values, forward=True):
+        """排在游标 ``values`` 之后（forward）或之前的行"""
+        (first, first_desc), (second, second_desc) = self.get_keyset_fields()
+        first_op = 'lt' if first_desc == forward else 'gt'
+        second_op = 'lt' if second_desc == forward else 'gt'
+        return Q(**{f'{first}__{first_op}': values[0]}) | Q(
+            **{first: values[0], f'{second}__{second_op}': values[1]}
+        )
+
+    def _key(self, obj):
+        return tuple(getattr(obj, field) for field, _ in self.get_keyset_fields())
+
+    def _cursor_types(self):
+        types = []
+        for field, _ in self.get_keyset_fields():
+            internal = 'pk' if field == 'pk' else self.model._meta.get_field(field).get_internal_type()
+            types.append(datetime if internal == 'DateTimeField' else int)
+        return types
+
+    def _query(self, **params):
+        query = {key: value for key, value in self.get_pagination_params().items() if value}
+        query.update(params)
+        return urlencode(query)
+
+    def get_approx_total(self, queryset):
+        """缓存的近似总数，避免每次请求都 COUNT(*)"""
+        if queryset.query.is_empty():
+            return 0
+        key = 'count:' + hashlib.sha1(str(queryset.query).encode('utf-8')).hexdigest()
+        timeout = getattr(settings, 'PAGINATION_COUNT_TIMEOUT', 600)
+        return cache.get_or_set(key, queryset.count, timeout)
+
+    def paginate_queryset(self, queryset, page_size):
+        params = self.request.GET
+        types = self._cursor_types()
+        after = decode_cursor(params.get('after'), *types)
+        before = decode_cursor(params.get('before'), *types)
+        forward = queryset.order_by(*self._order_by())
+        backward = queryset.order_by(*self._order_by(reverse=True))
+
+        total = self.get_approx_total(queryset)
+        num_pages = max(1, -(-total // page_size))
+        try:
+            number = max(1, int(params.get('page', 1)))
+        except ValueError:
+            number = 1
+
+        if after is not None:
+            rows = list(forward.filter(self._seek(after))[:page_size + 1])
+            has_next, has_previous = len(rows) > page_size, True
+            items = rows[:page_size]
+        elif before is not None:
+            rows = list(backward.filter(self._seek(before, forward=False))[:page_size + 1])
+            has_previous, has_next = len(rows) > page_size, True
+            items = rows[:page_size][::-1]
+            if not has_previous:
+                number = 1
+        elif params.get('last'):
+            # 最后 page_size 行；总数是缓存的近似值，不用它推算末页条数
+            rows = list(backward[:page_size + 1])
+            has_previous, has_next = len(rows) > page_size, False
+            items = rows[:page_size][::-1]
+            number = num_pages if has_previous else 1
+        else:
+            rows = list(forward[:page_size + 1])
+            has_next, has_previous = len(rows) > page_size, False
+            items = rows[:page_size]
+            number = 1
+
+        # 近似总数可能已过时，页码以实际翻到的位置为准
+        num_pages = max(num_pages, number + 1 if has_next else number)
+        links = self._build_links(items, number, num_pages, has_previous, has_next, forward, backward, page_size)
+        page = KeysetPage(items, number, has_previous, has_next, links, total, num_pages)
+        return None, page, items, page.has_other_pages()
+
+    def paginate_sequence(self, sequence, page_size):
+        """
+        按页码对已排好序的有限序列分页（如按相关度排序的搜索结果 ID）。
+
+        序列本身有上限，切片的代价与页码无关；返回当前页的 ``KeysetPage``。
+        """
+        total = len(sequence)
+        num_pages = max(1, -(-total // page_size))
+        try:
+            number = min(max(1, int(self.request.GET.get('page', 1))), num_pages)
+        except ValueError:
+            number = 1
+        items = sequence[(number - 1) * page_size:number * page_size]
+        window = self.pagination_window
+        numbers = {1, num_pages, *range(max(1, number - window), min(num_pages, number + window) + 1)}
+
+        links = []
+        previous = None
+        for page_number in sorted(numbers):
+            if previous is not None and page_number > previous + 1:
+                links.append(None)
+            query = self._query(page=page_number) if page_number > 1 else self._query()
+            links.append({'number': page_number, 'query': query, 'current': page_number == number})
+            previous = page_number
+        return KeysetPage(items, number, number > 1, number < num_pages, links, total, num_pages)
+
+    def _build_links(self, items, number, num_pages, has_previous, has_next, forward, backward, page_size):
+        window = self.pagination_window
+        pages = {number: None}
+
+        if items and has_next:
+            # 当前页之后 window 页：取排序键即可算出每页的起始游标
+            keys = [self._key(items[-1])]
+            fields = [field for field, _ in self.get_keyset_fields()]
+            following = forward.filter(self._seek(keys[0])).values_list(*fields)[:page_size * (window - 1)]
+            keys.extend(tuple(row) for row in following[page_size - 1::page_size])
+            for offset, key in enumerate(keys, start=1):
+                pages[number + offset] = self._query(after=encode_cursor(*key), page=number + offset)
+
+        if items and has_previous:
+            keys = [self._key(items[0])]
+            fields = [field for field, _ in self.get_keyset_fields()]
+            preceding = backward.filter(self._seek(keys[0], forward=False)).values_list(*fields)[:page_size * (window - 1)]
+            keys.extend(tuple(row) for row in preceding[page_size - 1::page_size])
+            for offset, key in enumerate(keys, start=1):
+                if number - offset >= 1:
+                    pages[number - offset] = self._query(before=encode_cursor(*key), page=number - offset)
+
+        if has_previous:
+            pages[1] = self._query()
+        if has_next and num_pages > number:
+            pages.setdefault(num_pages, self._query(last=1))
+
+        links = []
+        previous = None
+        for page_number in sorted(pages):
+            if previous is not None and page_number > previous + 1:
+                links.append(None)
+            links.append({'number': page_number, 'query': pages[page_number], 'current': page_number == number})
+            previous = page_number
+        return links
@@ -0,0 +1,247 @@
+"""
+相关文章计算
+
+离线批量计算每篇已发布文章最相似的 k 篇，写入 ``RelatedPost``，详情页按主键读取。
+
+- 正文特征与搜索索引使用相同的切分（``bigram.tokenize``，中文二元组与英文单词），
+  统计每个词项在文章中的出现次数，词频取对数（``1 + log tf``）后按 IDF 加权，
+  标题中出现的词项额外加权；过于常见或只出现一次的词项不参与计算，
+  每篇文章只保留权重最高的 ``RELATED_MAX_TERMS`` 个词项，再做 L2 归一化（消除篇幅的影响）
+- 标签重合度为标签向量的余弦相似度，同一系列另加固定分值
+- 相似度矩阵按行分块计算：对块内文章的每个词项展开其倒排列表，用 ``np.bincount``
+  一次累加成稠密的「块 × 全部文章」得分矩阵，再用 ``np.argpartition`` 取前 k 名。
+  每块展开的元素数有上限，内存占用与文章总数成线性关系
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from . import bigram, pagecache
+
+
+def get_options():
+    return {
+        'k': getattr(settings, 'RELATED_POSTS_COUNT', 4),
+        'max_terms': getattr(settings, 'RELATED_MAX_TERMS', 64),
+        'max_df': getattr(settings, 'RELATED_MAX_DF', 0.3),
+        'title_boost': getattr(settings, 'RELATED_TITLE_BOOST', 2.0),
+        'tag_weight': getattr(settings, 'RELATED_TAG_WEIGHT', 0.3),
+        'series_bonus': getattr(settings, 'RELATED_SERIES_BONUS', 0.1),
+        'block_budget': getattr(settings, 'RELATED_BLOCK_BUDGET', 8_000_000),
+    }
+
+
+def load_corpus():
+    """读取已发布文章的词项及出现次数、标题词项、标签和系列"""
+    import numpy as np
+
+    from .models import Post
+    from .search import plain_text
+
+    posts = (
+        Post.objects.filter(status='published').order_by('pk')
+        .only('pk', 'title', 'excerpt', 'content_html', 'series_id')
+    )
+    tag_pairs = Post.tags.through.objects.filter(post__status='published').values_list('post_id', 'tag_id')
+
+    vocab = {}
+    ids, series = [], []
+    doc_terms, term_counts, title_terms = [], [], []
+    for post in posts.iterator(chunk_size=500):
+        counts = Counter(bigram.tokenize(' '.join([post.title, post.excerpt, plain_text(post)])))
+        ids.append(post.pk)
+        series.append(post.series_id or 0)
+        doc_terms.append(np.array([vocab.setdefault(term, len(vocab)) for term in counts], dtype=np.int64))
+        term_counts.append(np.array(list(counts.values()), dtype=np.float64))
+        title_ids = [vocab[term] for term in set(bigram.tokenize(post.title)) if term in vocab]
+        title_terms.append(np.array(title_ids, dtype=np.int64))
+
+    return {
+        'ids': np.array(ids, dtype=np.int64),
+        'series': np.array(series, dtype=np.int64),
+        'doc_terms': doc_terms,
+        'term_counts': term_counts,
+        'title_terms': title_terms,
+        'vocab_size': len(vocab),
+        'tag_pairs': list(tag_pairs),
+    }
+
+
+def tfidf_matrix(corpus, max_terms, max_df, title_boost):
+    """返回 CSR 形式 ``(indptr, indices, data)`` 的归一化 TF-IDF 矩阵"""
+    import numpy as np
+
+    n = len(corpus['ids'])
+    all_terms = np.concatenate(corpus['doc_terms']) if n else np.zeros(0, dtype=np.int64)
+    df = np.bincount(all_terms, minlength=corpus['vocab_size'])
+    idf = np.log((1 + n) / (1 + df)) + 1
+    usable = (df >= 2) & (df <= max(2, max_df * n))
+
+    indptr = [0]
+    indices, data = [], []
+    for terms, tf, title in zip(corpus['doc_terms'], corpus['term_counts'], corpus['title_terms']):
+        keep = usable[terms]
+        terms, tf = terms[keep], tf[keep]
+        weights = (1 + np.log(tf)) * idf[terms] * (1 + title_boost * np.isin(terms, title))
+        if len(terms) > max_terms:
+            top = np.argpartition(-weights, max_terms - 1)[:max_terms]
+            terms, weights = terms[top], weights[top]
+        norm = np.sqrt((weights ** 2).sum())
+        if norm > 0:
+            weights = weights / norm
+        indices.append(terms)
+        data.append(weights)
+        indptr.append(indptr[-1] + len(terms))
+    empty = np.zeros(0)
+    return (
+        np.array(indptr, dtype=np.int64),
+        np.concatenate(indices).astype(np.int64) if indices else empty.astype(np.int64),
+        np.concatenate(data) if data else empty,
+    )
+
+
+def tag_matrix(corpus):
+    """每篇文章的标签向量（按标签数归一化），CSR 形式"""
+    import numpy as np
+
+    row_of = {pk: row for row, pk in enumerate(corpus['ids'].tolist())}
+    n = len(row_of)
+    pairs = sorted((row_of[post_id], tag_id) for post_id, tag_id in corpus['tag_pairs'] if post_id in row_of)
+    rows = np.array([row for row, _ in pairs], dtype=np.int64)
+    tags = np.array([tag_id for _, tag_id in pairs], dtype=np.int64)
+    counts = np.bincount(rows, minlength=n)
+    indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    data = 1 / np.sqrt(counts[rows]) if len(rows) else np.zeros(0)
+    return indptr, tags, data
+
+
+def transpose(indptr, indices, data, n_columns):
+    """CSR → 按列的倒排形式 ``(列指针, 行号, 权重)``"""
+    import numpy as np
+
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    counts = np.bincount(indices, minlength=n_columns)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64), rows[order], data[order]
+
+
+def block_products(rows, matrix, inverted, n):
+    """``rows`` 对应的行与全部行的内积，返回 ``len(rows) × n`` 的稠密矩阵"""
+    import numpy as np
+
+    indptr, indices, data = matrix
+    col_ptr, col_rows, col_data = inverted
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    # 块内所有非零元素（局部行号、列号、权重）
+    local = np.repeat(np.arange(len(rows)), lengths)
+    positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+    columns, weights = indices[positions], data[positions]
+
+    # 展开每个非零元素所在列的倒排列表
+    spans = col_ptr[columns + 1] - col_ptr[columns]
+    expanded = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans) + np.repeat(col_ptr[columns], spans)
+    target = np.repeat(local, spans) * n + col_rows[expanded]
+    values = np.repeat(weights, spans) * col_data[expanded]
+    return np.bincount(target, weights=values, minlength=len(rows) * n).reshape(len(rows), n)
+
+
+def iter_blocks(rows, cost, budget, max_rows=256):
+    """按展开代价把行切成块"""
+    block, total = [], 0
+    for row in rows:
+        if block and (total + cost[row] > budget or len(block) >= max_rows):
+            yield block
+            block, total = [], 0
+        block.append(row)
+        total += cost[row]
+    if block:
+        yield block
+
+
+def compute(post_ids=None, **overrides):
+    """
+    计算相关文章，返回 ``{文章ID: [(相关文章ID, 相似度), ...]}``。
+
+    ``post_ids`` 为空时计算全部已发布文章，否则只计算这些文章（相似度仍与全部文章比较）。
+    """
+    import numpy as np
+
+    options = {**get_options(), **overrides}
+    corpus = load_corpus()
+    ids = corpus['ids']
+    n = len(ids)
+    if n < 2:
+        return {}
+
+    text = tfidf_matrix(corpus, options['max_terms'], options['max_df'], options['title_boost'])
+    text_inverted = transpose(*text, corpus['vocab_size'])
+    tags = tag_matrix(corpus)
+    tag_columns = int(tags[1].max()) + 1 if len(tags[1]) else 0
+    tags_inverted = transpose(*tags, tag_columns)
+    series = corpus['series']
+
+    # 每行展开的元素数 = 该行各词项的文档频数之和
+    df = np.diff(text_inverted[0])
+    cost = np.bincount(np.repeat(np.arange(n), np.diff(text[0])), weights=df[text[1]], minlength=n)
+
+    if post_ids is None:
+        targets = np.arange(n)
+    else:
+        targets = np.flatnonzero(np.isin(ids, list(post_ids)))
+
+    k = min(options['k'], n - 1)
+    results = {}
+    for block in iter_blocks(targets.tolist(), cost, options['block_budget']):
+        rows = np.array(block, dtype=np.int64)
+        scores = (1 - options['tag_weight']) * block_products(rows, text, text_inverted, n)
+        if tag_columns:
+            scores += options['tag_weight'] * block_products(rows, tags, tags_inverted, n)
+        if options['series_bonus']:
+            same_series = (series[rows][:, None] == series[None, :]) & (series[rows][:, None] != 0)
+            scores += options['series_bonus'] * same_series
+        scores[np.arange(len(rows)), rows] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+        for row, neighbours, values in zip(rows.tolist(), top.tolist(), top_scores.tolist()):
+            results[int(ids[row])] = [
+                (int(ids[column]), float(value)) for column, value in zip(neighbours, values) if value > 0
+            ]
+    return results
+
+
+def store(results, full=False):
+    """写入计算结果，返回相关文章有变化的文章 ID"""
+    from .models import RelatedPost
+
+    existing = RelatedPost.objects.all() if full else RelatedPost.objects.filter(post_id__in=list(results))
+    previous = {}
+    for post_id, related_id in existing.order_by('post_id', 'rank').values_list('post_id', 'related_id'):
+        previous.setdefault(post_id, []).append(related_id)
+
+    changed = [
+        post_id for post_id in set(previous) | set(results)
+        if previous.get(post_id, []) != [related_id for related_id, _ in results.get(post_id, [])]
+    ]
+    rows = [
+        RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+        for post_id, neighbours in results.items()
+        for rank, (related_id, score) in enumerate(neighbours, start=1)
+    ]
+    with transaction.atomic():
+        existing.delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=1000)
+    if changed:
+        pagecache.invalidate(*(f'post:{post_id}' for post_id in changed))
+    return changed
+
+
+def rebuild(post_ids=None, **overrides):
+    """计算并保存，返回 ``(计算的文章数, 有变化的文章数)``"""
+    results = compute(post_ids, **overrides)
+    changed = store(results, full=post_ids is None)
+    return len(results), len(changed)
@@ -0,0 +1,165 @@
+"""
+Markdown 渲染层
+
+- 以「源文本 + 扩展配置」的哈希作为渲染结果的键，内容未变时不再转换
+- 渲染结果写入共享缓存（默认 ``markdown`` 缓存别名），多进程之间复用
+- Markdown 实例按扩展配置池化，每次使用后调用 ``reset()`` 归还
+- 代码块高亮结果单独缓存，见 ``blog.highlight``
+- 开启 ``MARKDOWN_INCREMENTAL`` 时按顶层块增量渲染，见 ``blog.incremental``
+"""
+import hashlib
+import json
+import queue
+import threading
+from contextlib import contextmanager
+
+import markdown
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from . import highlight
+from .incremental import IncrementalRenderer
+
+DEFAULT_EXTENSIONS = ['extra', 'codehilite', 'toc', 'footnotes']
+
+
+def get_extensions():
+    return list(getattr(settings, 'MARKDOWN_EXTENSIONS', DEFAULT_EXTENSIONS))
+
+
+def get_extension_configs():
+    return dict(getattr(settings, 'MARKDOWN_EXTENSION_CONFIGS', {}))
+
+
+def is_incremental():
+    return getattr(settings, 'MARKDOWN_INCREMENTAL', True)
+
+
+def extension_signature(extensions=None, extension_configs=None):
+    """扩展集合及其配置的稳定签名，任何一项变化都会使旧的渲染结果失效"""
+    if extensions is None:
+        extensions = get_extensions()
+    if extension_configs is None:
+        extension_configs = get_extension_configs()
+    return json.dumps(
+        {
+            'markdown': markdown.__version__,
+            'extensions': list(extensions),
+            'configs': extension_configs,
+            'incremental': is_incremental(),
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+def content_digest(text, signature=None):
+    """源文本与扩展签名的 SHA-256 摘要"""
+    if signature is None:
+        signature = extension_signature()
+    h = hashlib.sha256()
+    h.update(signature.encode('utf-8'))
+    h.update(b'\0')
+    h.update((text or '').encode('utf-8'))
+    return h.hexdigest()
+
+
+class MarkdownPool:
+    """按扩展配置复用的 Markdown 实例池"""
+
+    def __init__(self, extensions, extension_configs=None, size=8):
+        self.extensions = list(extensions)
+        self.extension_configs = extension_configs or {}
+        self.size = size
+        self._free = queue.LifoQueue(maxsize=size)
+
+    def _create(self):
+        highlight.install()
+        return markdown.Markdown(
+            extensions=self.extensions,
+            extension_configs=self.extension_configs,
+        )
+
+    @contextmanager
+    def acquire(self):
+        try:
+            md = self._free.get_nowait()
+        except queue.Empty:
+            md = self._create()
+        try:
+            yield md
+        finally:
+            md.reset()
+            try:
+                self._free.put_nowait(md)
+            except queue.Full:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(extensions=None, extension_configs=None):
+    if extensions is None:
+        extensions = get_extensions()
+    if extension_configs is None:
+        extension_configs = get_extension_configs()
+    signature = extension_signature(extensions, extension_configs)
+    pool = _pools.get(signature)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(signature)
+            if pool is None:
+                size = getattr(settings, 'MARKDOWN_POOL_SIZE', 8)
+                pool = _pools[signature] = MarkdownPool(extensions, extension_configs, size)
+    return pool
+
+
+def get_cache():
+    alias = getattr(settings, 'MARKDOWN_CACHE_ALIAS', 'markdown')
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return None
+
+
+def convert(text, extensions=None, extension_configs=None):
+    """直接转换，不经过缓存"""
+    with get_pool(extensions, extension_configs).acquire() as md:
+        return md.convert(text or '')
+
+
+def get_incremental_renderer():
+    return IncrementalRenderer(get_pool(), extension_signature(), get_cache())
+
+
+def render_document(text, use_cache=True, key=None):
+    """渲染整篇正文，开启增量渲染时只转换缓存中没有的块"""
+    if is_incremental():
+        return get_incremental_renderer().render(text, use_cache=use_cache, key=key)
+    return convert(text)
+
+
+def render(text, digest=None, use_cache=True, key=None):
+    """
+    渲染 Markdown，返回 ``(html, digest)``。
+
+    先按摘要查共享缓存，未命中时才真正转换并回填缓存；
+    ``use_cache=False`` 时忽略已有缓存强制重新渲染；``key`` 标识同一篇文档
+    （如 ``post:<pk>``），用于跨进程复用上一版本中未变化的块。
+    """
+    if digest is None:
+        digest = content_digest(text)
+    cache = get_cache()
+    cache_key = f'md:{digest}'
+    if use_cache and cache is not None:
+        html = cache.get(cache_key)
+        if html is not None:
+            return html, digest
+
+    html = render_document(text, use_cache=use_cache, key=key)
+    if cache is not None:
+        cache.set(cache_key, html)
+    return html, digest
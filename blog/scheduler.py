@@ -0,0 +1,174 @@
+"""
+定时调度
+
+``manage.py run_scheduler`` 常驻运行，处理到期的定时项：
+
+- 定时发布的文章（状态为「定时发布」、发布时间已到）
+- 其他应用用 ``register`` 注册的定时项，如新闻通讯的定时发送（见 ``newsletter.tasks``）
+
+每个来源提供 ``upcoming(截止时间, 条数)``，用索引查询按时间顺序取出截止时间之前到期的
+``(时间, 主键)``；以及 ``dispatch(主键列表, 当前时间)``，批量处理一组到期项。
+
+调度器把各来源未来 ``SCHEDULER_HORIZON`` 秒内的定时项装入最小堆，休眠到堆顶到期或
+下一次重新装载为止，不做密集轮询；醒来后弹出所有到期项，按来源分组，在同一个事务中批量处理。
+装载后定时项可能被修改或取消，``dispatch`` 会按条件重新查询，只处理仍然到期的；
+新增或提前的定时项最迟在下一次重新装载（``SCHEDULER_RELOAD_INTERVAL`` 秒）时被发现。
+"""
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import autocomplete, counts, pagecache, search
+
+logger = logging.getLogger(__name__)
+
+_sources = {}
+
+
+def register(name, upcoming, dispatch):
+    """注册一类定时项"""
+    _sources[name] = (upcoming, dispatch)
+
+
+def get_options():
+    return {
+        'horizon': getattr(settings, 'SCHEDULER_HORIZON', 3600),
+        'reload_interval': getattr(settings, 'SCHEDULER_RELOAD_INTERVAL', 60),
+        'batch_size': getattr(settings, 'SCHEDULER_BATCH_SIZE', 500),
+    }
+
+
+class Scheduler:
+    """基于最小堆的定时器"""
+
+    def __init__(self, horizon=None, reload_interval=None, batch_size=None):
+        options = get_options()
+        self.horizon = horizon or options['horizon']
+        self.reload_interval = reload_interval or options['reload_interval']
+        self.batch_size = batch_size or options['batch_size']
+        self.heap = []
+        self.reload_at = None
+        self.stopping = threading.Event()
+
+    def load(self, now):
+        """重新装载各来源在视野内的定时项"""
+        until = now + timedelta(seconds=self.horizon)
+        self.reload_at = now + timedelta(seconds=self.reload_interval)
+        heap = []
+        for name, (upcoming, _) in _sources.items():
+            items = list(upcoming(until, self.batch_size))
+            heap.extend((when, name, pk) for when, pk in items)
+            if len(items) >= self.batch_size:
+                # 视野内的定时项没有全部装入：处理完已装入的最后一项后立即重新装载
+                self.reload_at = min(self.reload_at, items[-1][0])
+        heapq.heapify(heap)
+        self.heap = heap
+
+    def pop_due(self, now):
+        """弹出所有到期项，按来源分组"""
+        groups = {}
+        while self.heap and self.heap[0][0] <= now:
+            _, name, pk = heapq.heappop(self.heap)
+            groups.setdefault(name, []).append(pk)
+        return groups
+
+    def dispatch(self, groups, now):
+        """在一个事务中批量处理到期项，返回 ``{来源: 处理的数量}``"""
+        results = {}
+        with transaction.atomic():
+            for name, pks in groups.items():
+                _, dispatch = _sources[name]
+                results[name] = dispatch(pks, now)
+        return results
+
+    def seconds_until_next(self, now):
+        wake = self.reload_at
+        if self.heap:
+            wake = min(wake, self.heap[0][0])
+        return max(0.0, (wake - now).total_seconds())
+
+    def run_once(self, now=None):
+        """处理当前到期的定时项，返回 ``{来源: 处理的数量}``"""
+        now = now or timezone.now()
+        if self.reload_at is None or now >= self.reload_at:
+            self.load(now)
+        groups = self.pop_due(now)
+        return self.dispatch(groups, now) if groups else {}
+
+    def run(self, on_dispatch=None):
+        while not self.stopping.is_set():
+            close_old_connections()
+            try:
+                results = self.run_once()
+            except Exception:
+                logger.exception('处理定时项失败，稍后重试')
+                # 未处理的项在下次重新装载时重新取出
+                self.reload_at = timezone.now() + timedelta(seconds=min(self.reload_interval, 5))
+                self.heap = []
+                results = {}
+            if results and on_dispatch is not None:
+                on_dispatch(results)
+            self.stopping.wait(self.seconds_until_next(timezone.now()))
+
+    def stop(self):
+        self.stopping.set()
+
+
+def upcoming_posts(until, limit):
+    from .models import Post
+
+    return (
+        Post.objects.filter(status='scheduled', published_at__lte=until)
+        .order_by('published_at', 'pk')
+        .values_list('published_at', 'pk')[:limit]
+    )
+
+
+def publish_posts(pks, now):
+    """
+    批量发布到期的定时文章：逐篇条件 UPDATE 修改状态，再统一更新计数、搜索与补全索引，
+    并让首页、列表、侧栏及相关分类/标签/系列的缓存页失效
+    """
+    from .models import Post
+
+    # 只处理本次条件更新成功的文章，其他进程已发布的不再重复计数
+    due = Post.objects.filter(pk__in=pks, status='scheduled', published_at__lte=now)
+    posts = [post for post in due if Post.objects.filter(pk=post.pk, status='scheduled').update(status='published')]
+    if not posts:
+        return 0
+    ids = [post.pk for post in posts]
+
+    post_tags = {}
+    for post_id, tag_id in Post.tags.through.objects.filter(post_id__in=ids).values_list('post_id', 'tag_id'):
+        post_tags.setdefault(post_id, []).append(tag_id)
+
+    tags = {'posts', 'sidebar'}
+    for post in posts:
+        post.status = 'published'
+        state = {'category_id': post.category_id, 'series_id': post.series_id, 'published_at': post.published_at}
+        counts.adjust_for_post(state, post_tags.get(post.pk, []), 1)
+        tags.add(f'post:{post.pk}')
+        if post.category_id:
+            tags.add(f'category:{post.category_id}')
+        if post.series_id:
+            tags.add(f'series:{post.series_id}')
+        tags.update(f'tag:{tag_id}' for tag_id in post_tags.get(post.pk, []))
+
+    search.index_posts(posts)
+    transaction.on_commit(lambda: _after_publish(posts, tags))
+    return len(posts)
+
+
+def _after_publish(posts, tags):
+    # 提交之后再让缓存失效，避免其他请求在提交前把旧内容重新写入缓存
+    pagecache.invalidate(*tags)
+    for post in posts:
+        autocomplete.post_changed(post)
+
+
+register('posts', upcoming_posts, publish_posts)
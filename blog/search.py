@@ -0,0 +1,187 @@
+"""
+全文搜索
+
+SQLite 下使用 FTS5 虚拟表 ``blog_post_fts``（rowid 即文章 ID），索引标题、摘要
+和 ``content_html`` 的纯文本，按 BM25 排序并生成高亮摘要片段。默认使用
+``trigram`` 分词器，中英文都能做子串匹配。
+
+trigram 匹配不了少于 3 个字的词，这类查询（以及其他数据库上的全部查询）
+改用 ``blog.bigram`` 的二元分词倒排索引；两者都无法回答时回退到 ``icontains``。
+
+索引由 ``blog.signals`` 在文章保存、删除时同步；批量写入（如 ``rerender_posts``）
+之后调用 ``index_posts()``；``manage.py rebuild_search_index`` 全量重建。
+索引每次变化都会让 ``blog.searchcache`` 中的搜索结果缓存失效。
+"""
+import html
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape, strip_tags
+
+from . import bigram
+from .searchcache import result_cache
+
+FTS_TABLE = 'blog_post_fts'
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+
+def get_tokenizer():
+    return getattr(settings, 'SEARCH_FTS_TOKENIZER', 'trigram')
+
+
+def create_table_sql(tokenizer=None):
+    tokenizer = tokenizer or get_tokenizer()
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, excerpt, body, tokenize='{tokenizer}')"
+    )
+
+
+_table_exists = False
+
+
+def is_available():
+    """当前数据库是否支持并已建立 FTS5 索引表"""
+    global _table_exists
+    if connection.vendor != 'sqlite':
+        return False
+    if not _table_exists:
+        # 只缓存「已存在」，迁移建表后无需重启即可生效
+        _table_exists = FTS_TABLE in connection.introspection.table_names()
+    return _table_exists
+
+
+def plain_text(post):
+    """文章正文的纯文本（去掉 HTML 标签和实体）"""
+    return html.unescape(strip_tags(post.content_html or ''))
+
+
+def build_match_query(query):
+    """把用户输入转成 FTS5 查询：每个词加引号作为短语，词之间为 AND"""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"' for term in terms if term)
+
+
+def min_term_length():
+    # trigram 分词器无法匹配少于 3 个字符的词
+    return 3 if get_tokenizer().startswith('trigram') else 1
+
+
+def can_search(query):
+    terms = query.split()
+    return bool(terms) and is_available() and all(len(term) >= min_term_length() for term in terms)
+
+
+def index_posts(posts):
+    """写入（或更新）文章的索引；未发布的文章从索引中移除"""
+    posts = list(posts)
+    bigram.index_posts(posts)
+    index_fts(posts)
+    result_cache.invalidate()
+
+
+def index_fts(posts):
+    if not is_available() or not posts:
+        return
+    rows = [
+        (post.pk, post.title, post.excerpt, plain_text(post))
+        for post in posts if post.status == 'published'
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(post.pk,) for post in posts])
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+
+def remove_posts(post_ids):
+    """在文章删除之前调用（``pre_delete``），此时还能读到已索引的词项"""
+    post_ids = list(post_ids)
+    bigram.remove_posts(post_ids)
+    result_cache.invalidate()
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in post_ids])
+
+
+def iter_published(chunk_size=500):
+    from .models import Post
+
+    queryset = Post.objects.filter(status='published').only(
+        'id', 'title', 'excerpt', 'content_html', 'status'
+    ).order_by('pk')
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        yield from chunk
+        last_id = chunk[-1].pk
+
+
+def rebuild(chunk_size=500):
+    """清空并重建全部索引，返回写入的文章数"""
+    total = bigram.rebuild(iter_published(chunk_size))
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        chunk = []
+        for post in iter_published(chunk_size):
+            chunk.append(post)
+            if len(chunk) >= chunk_size:
+                index_fts(chunk)
+                chunk = []
+        index_fts(chunk)
+    result_cache.invalidate()
+    return total
+
+
+def search_ids(query, limit=None):
+    """
+    按 BM25 相关度返回 ``[(文章ID, 高亮片段HTML)]``。
+
+    标题权重最高，其次为摘要和正文。
+    """
+    limit = limit or getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+    weights = getattr(settings, 'SEARCH_FTS_WEIGHTS', (10.0, 5.0, 1.0))
+    sql = (
+        f"SELECT rowid, snippet({FTS_TABLE}, 2, %s, %s, '…', 24) "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY bm25({FTS_TABLE}, %s, %s, %s) LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [SNIPPET_START, SNIPPET_END, build_match_query(query), *weights, limit])
+        return [(pk, highlight_snippet(snippet)) for pk, snippet in cursor.fetchall()]
+
+
+def highlight_snippet(snippet):
+    """转义片段文本，再把高亮标记换成 <mark>"""
+    return escape(snippet or '').replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def find(query):
+    """
+    搜索文章，返回按相关度排序的 ``[(文章ID, 高亮片段HTML或None)]``。
+
+    结果按归一化的查询缓存；索引都无法回答时返回 ``None``，由调用方使用 ``fallback_filter()``。
+    """
+    return result_cache.get_or_compute(query, _find)
+
+
+def _find(query):
+    if can_search(query):
+        return search_ids(query)
+    ids = bigram.lookup(query)
+    if ids is None:
+        return None
+    return [(pk, None) for pk in ids[:getattr(settings, 'SEARCH_MAX_RESULTS', 1000)]]
+
+
+def fallback_filter(query):
+    """索引无法回答时的子串匹配条件"""
+    return Q(title__icontains=query) | Q(content__icontains=query) | Q(excerpt__icontains=query)
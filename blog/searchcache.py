@@ -0,0 +1,123 @@
+"""
+搜索结果缓存
+
+按归一化后的查询（全角转半角、统一大小写、合并空白）缓存排好序的结果 ID 列表，
+重复的搜索只需再取当前页的文章。搜索流量集中在少数热门查询上，淘汰策略为 LFU：
+容量满时淘汰命中次数最少的条目（次数相同时淘汰最久未用的）。
+
+缓存在进程内；文章发布、修改或删除时更新共享缓存中的代号，
+各进程读取时发现代号变化即整体清空。
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .bigram import normalize
+
+GENERATION_KEY = 'search:generation'
+
+
+def normalize_query(query):
+    return ' '.join(normalize(query).split())
+
+
+class LFUCache:
+    """O(1) 的 LFU：按命中次数分桶，桶内按最近使用排序"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._values = {}
+        self._counts = {}
+        self._buckets = {}
+        self._min_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def _touch(self, key):
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._values:
+                return default
+            self._touch(key)
+            return self._values[key]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if key in self._values:
+                self._values[key] = value
+                self._touch(key)
+                return
+            if len(self._values) >= self.maxsize:
+                bucket = self._buckets[self._min_count]
+                evicted, _ = bucket.popitem(last=False)
+                if not bucket:
+                    del self._buckets[self._min_count]
+                del self._values[evicted], self._counts[evicted]
+            self._values[key] = value
+            self._counts[key] = 1
+            self._buckets.setdefault(1, OrderedDict())[key] = None
+            self._min_count = 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._counts.clear()
+            self._buckets.clear()
+            self._min_count = 0
+
+
+class ResultCache:
+    """带全局失效代号的搜索结果缓存"""
+
+    def __init__(self, maxsize=None):
+        self.entries = LFUCache(
+            maxsize if maxsize is not None else getattr(settings, 'SEARCH_RESULT_CACHE_SIZE', 256)
+        )
+        self.generation = None
+
+    def _check_generation(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def get_or_compute(self, query, compute):
+        """返回 ``compute(归一化查询)`` 的结果，命中缓存时不调用；结果为 ``None`` 时不缓存"""
+        query = normalize_query(query)
+        if not query:
+            return compute(query)
+        self._check_generation()
+        results = self.entries.get(query)
+        if results is None:
+            generation = self.generation
+            results = compute(query)
+            # 计算期间索引有变化时结果可能已过时，不写入
+            if results is not None and generation == self.generation:
+                self.entries.set(query, results)
+        return results
+
+    def invalidate(self):
+        """让所有进程的搜索结果缓存失效"""
+        self.generation = uuid.uuid4().hex
+        cache.set(GENERATION_KEY, self.generation, None)
+        self.entries.clear()
+
+
+result_cache = ResultCache()
@@ -0,0 +1,225 @@
+"""
+博客模型信号处理：
+
+- 模型变更时让依赖它的缓存页失效
+- 维护分类、标签、系列上的已发布文章数
+- 维护文章的已审核评论数和评论的可见回复数
+- 同步全文搜索索引和搜索框自动补全索引
+"""
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, counts, pagecache, search
+from .models import Category, Comment, Link, Post, Series, Tag
+
+# 这些字段变化会影响文章出现在哪些列表中，以及侧栏中的计数
+LISTING_FIELDS = ('status', 'published_at', 'category_id', 'series_id', 'series_order', 'featured', 'featured_order')
+# 这些字段变化时需要更新搜索索引
+SEARCH_FIELDS = {'title', 'excerpt', 'content', 'content_html', 'status'}
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_listing_state(sender, instance, raw=False, **kwargs):
+    instance._listing_state = None
+    if instance.pk and not raw:
+        instance._listing_state = Post.objects.filter(pk=instance.pk).values(*LISTING_FIELDS).first()
+
+
+@receiver(post_save, sender=Post)
+def update_post_counts(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_listing_state', None)
+    current = {field: getattr(instance, field) for field in LISTING_FIELDS}
+    was, now = counts.is_published(old), counts.is_published(current)
+    if not (was or now):
+        return
+
+    moved = (
+        old is None
+        or old['category_id'] != current['category_id']
+        or old['series_id'] != current['series_id']
+        or counts.archive_month(old['published_at']) != counts.archive_month(current['published_at'])
+    )
+    if was != now or moved:
+        # 标签计数只随发布状态变化；新建的文章此时还没有标签
+        tag_ids = [] if created or was == now else list(instance.tags.values_list('pk', flat=True))
+        if was:
+            counts.adjust_for_post(old, tag_ids, -1)
+        if now:
+            counts.adjust_for_post(current, tag_ids, 1)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_pages(sender, instance, created=False, **kwargs):
+    tags = {f'post:{instance.pk}'}
+    old = getattr(instance, '_listing_state', None)
+    current = {field: getattr(instance, field) for field in LISTING_FIELDS}
+    if created or old is None or old != current:
+        tags.update({'posts', 'sidebar'})
+        for state in (old or {}, current):
+            if state.get('category_id'):
+                tags.add(f'category:{state["category_id"]}')
+            if state.get('series_id'):
+                tags.add(f'series:{state["series_id"]}')
+    pagecache.invalidate(*tags)
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not SEARCH_FIELDS.intersection(update_fields)):
+        return
+    search.index_posts([instance])
+
+
+@receiver(post_save, sender=Post)
+def update_post_suggestion(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'title', 'slug', 'status'}.intersection(update_fields)):
+        return
+    autocomplete.post_changed(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post_tags(sender, instance, **kwargs):
+    instance._deleted_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def update_deleted_post_counts(sender, instance, **kwargs):
+    if instance.status == 'published':
+        state = {
+            'category_id': instance.category_id,
+            'series_id': instance.series_id,
+            'published_at': instance.published_at,
+        }
+        counts.adjust_for_post(state, getattr(instance, '_deleted_tag_ids', []), -1)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_pages(sender, instance, **kwargs):
+    pagecache.invalidate(
+        f'post:{instance.pk}', 'posts', 'sidebar',
+        f'category:{instance.category_id}' if instance.category_id else None,
+        f'series:{instance.series_id}' if instance.series_id else None,
+    )
+
+
+@receiver(pre_delete, sender=Post)
+def remove_deleted_post_from_search(sender, instance, **kwargs):
+    # 级联删除索引文档之前，先把文章从倒排列表中移除
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_suggestion(sender, instance, **kwargs):
+    autocomplete.suggestions.changed('post', instance.pk)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    through = Post.tags.through
+    # 从标签一侧修改时 instance 为 Tag，pk_set 为文章
+    if reverse:
+        links = through.objects.filter(tag_id=instance.pk)
+    else:
+        links = through.objects.filter(post_id=instance.pk)
+
+    def pair(pk):
+        return (pk, instance.pk) if reverse else (instance.pk, pk)
+
+    if action in ('pre_remove', 'pre_clear'):
+        # 删除之后就查不到原有关联了，先记下实际存在的关联
+        if action == 'pre_remove':
+            links = links.filter(**{'post_id__in' if reverse else 'tag_id__in': pk_set})
+        instance._removed_tag_links = list(links.values_list('post_id', 'tag_id'))
+        return
+
+    if action == 'post_add':
+        changed, delta = [pair(pk) for pk in pk_set or ()], 1
+    elif action in ('post_remove', 'post_clear'):
+        changed, delta = getattr(instance, '_removed_tag_links', []), -1
+        instance._removed_tag_links = []
+    else:
+        return
+    if not changed:
+        return
+
+    published = set(
+        Post.objects.filter(pk__in={post_id for post_id, _ in changed}, status='published')
+        .values_list('pk', flat=True)
+    )
+    counts.adjust(Tag, [tag_id for post_id, tag_id in changed if post_id in published], delta)
+
+    tags = {f'tag:{tag_id}' for _, tag_id in changed}
+    tags.update(f'post:{post_id}' for post_id, _ in changed)
+    tags.add('sidebar')
+    pagecache.invalidate(*tags)
+
+
+def adjust_comment_counts(comment, delta):
+    Post.objects.filter(pk=comment.post_id).update(
+        comment_count=Greatest(F('comment_count') + delta, Value(0))
+    )
+    # 一条评论显示与否会连带它的整棵子树，回复数按文章重新计算。
+    # 级联删除时整棵子树先一起删除再逐条发送信号，只在子树的根（父评论仍在）上计算一次
+    if comment.parent_id is not None and Comment.objects.filter(pk=comment.parent_id).exists():
+        counts.recount_replies([comment.post_id])
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_approval(sender, instance, raw=False, **kwargs):
+    instance._was_approved = False
+    if instance.pk and not raw:
+        instance._was_approved = Comment.objects.filter(pk=instance.pk, is_approved=True).exists()
+
+
+@receiver(post_save, sender=Comment)
+def update_comment_counts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    was = getattr(instance, '_was_approved', False)
+    if instance.is_approved != was:
+        # 重新计算回复数依赖新评论的路径
+        instance.store_path()
+        adjust_comment_counts(instance, 1 if instance.is_approved else -1)
+
+
+@receiver(post_delete, sender=Comment)
+def update_deleted_comment_counts(sender, instance, **kwargs):
+    if instance.is_approved:
+        adjust_comment_counts(instance, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    pagecache.invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    pagecache.invalidate(f'category:{instance.pk}', 'sidebar')
+    autocomplete.group_changed('category', instance, deleted=kwargs['signal'] is post_delete)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_pages(sender, instance, **kwargs):
+    pagecache.invalidate(f'tag:{instance.pk}', 'sidebar')
+    autocomplete.group_changed('tag', instance, deleted=kwargs['signal'] is post_delete)
+
+
+@receiver(post_save, sender=Series)
+@receiver(post_delete, sender=Series)
+def invalidate_series_pages(sender, instance, **kwargs):
+    pagecache.invalidate(f'series:{instance.pk}', 'sidebar')
+    autocomplete.group_changed('series', instance, deleted=kwargs['signal'] is post_delete)
+
+
+@receiver(post_save, sender=Link)
+@receiver(post_delete, sender=Link)
+def invalidate_link_pages(sender, instance, **kwargs):
+    pagecache.invalidate('sidebar')
@@ -0,0 +1,123 @@
+"""
+静态文件构建与服务
+
+``collectstatic`` 使用 ``CompressedManifestStaticFilesStorage``：
+
+- 收集时压缩 CSS / JS（见 ``blog.minify``）
+- 文件名带内容哈希（``style.3f2a…css``），对应关系写入 ``staticfiles.json``，
+  模板中的 ``{% static %}`` 通过它解析为带哈希的文件名（``DEBUG`` 下仍使用原文件名）
+- 为文本类文件生成 ``.gz`` 与 ``.br``（需要安装 ``Brotli``），压缩后不变小的跳过
+
+带哈希的文件内容永不改变，``serve`` 对它们返回一年的 ``immutable`` 缓存头，
+并按 ``Accept-Encoding`` 直接返回预压缩的版本；没有前置 Web 服务器时由 Django 提供静态文件。
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import minify
+
+try:
+    import brotli
+except ImportError:  # 未安装时只生成 .gz
+    brotli = None
+
+MINIFIERS = {'.css': minify.css, '.js': minify.js}
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico', '.ttf', '.otf', '.eot')
+# 按优先级排列：(Accept-Encoding 中的名称, 文件后缀)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def compress(data):
+    """返回 ``{后缀: 压缩后的内容}``，只保留比原文件小的"""
+    # mtime=0 让 .gz 的内容只取决于输入，静态导出按内容摘要判断变化
+    results = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        results['.br'] = brotli.compress(data, quality=11)
+    return {suffix: value for suffix, value in results.items() if len(value) < len(data)}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """收集时压缩、加哈希并预压缩的静态文件存储"""
+
+    def _save(self, name, content):
+        minifier = MINIFIERS.get(posixpath.splitext(name)[1])
+        if minifier is not None and getattr(settings, 'STATIC_MINIFY', True):
+            content.seek(0)
+            source = content.read()
+            if isinstance(source, bytes):
+                source = source.decode('utf-8')
+            content = ContentFile(minifier(source).encode('utf-8'))
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception) and hashed_name:
+                hashed.append(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in dict.fromkeys(hashed):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            with self.open(name) as handle:
+                data = handle.read()
+            for suffix, value in compress(data).items():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                super()._save(name + suffix, ContentFile(value))
+
+
+@lru_cache(maxsize=1)
+def immutable_names():
+    """清单中带哈希的文件名（清单在部署时随进程重启更新）"""
+    if isinstance(staticfiles_storage, ManifestStaticFilesStorage):
+        return set(staticfiles_storage.hashed_files.values())
+    return set()
+
+
+def serve(request, path):
+    """提供 ``STATIC_ROOT`` 中的文件，带哈希的文件长期缓存"""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath) or path.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+        raise Http404
+
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encoding, filename = None, fullpath
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(fullpath + suffix):
+            encoding, filename = name, fullpath + suffix
+            break
+
+    stat = os.stat(filename)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    response = FileResponse(open(filename, 'rb'), content_type=content_type or 'application/octet-stream')
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if path in immutable_names():
+        response['Cache-Control'] = IMMUTABLE
+    else:
+        response['Cache-Control'] = f'public, max-age={getattr(settings, "STATIC_MAX_AGE", 60)}'
+    return response
@@ -0,0 +1,742 @@
+import json
+import re
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import autocomplete, counts, export, jobs, pagecache, related, rendering, trending
+from .admin import CommentAdmin
+from .buffers import WriteBuffer
+from .counters import ViewCounter, post_views
+from .incremental import BlockCache, IncrementalRenderer
+from .models import Category, Comment, Job, Post, PostViewBucket, Series, Tag
+from .pagination import decode_cursor, encode_cursor
+from .scheduler import Scheduler, publish_posts
+
+
+# 测试使用独立的内存缓存，不读写 .cache/ 中的文件缓存
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ('default', 'markdown')
+}
+# 测试时没有 collectstatic 生成的清单，视图测试改用普通的静态文件存储
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BlogTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+
+def normalize_html(html):
+    return re.sub(r'>\s+<', '><', html).strip()
+
+
+class IncrementalRenderingTests(BlogTestCase):
+    """分块增量渲染的结果应与整篇渲染一致（块之间的空白除外）"""
+
+    DOCUMENTS = {
+        'definition_list': 'Intro.\n\nTerm\n\n: definition\n\nTerm 2\n: definition 2\n\nAfter.',
+        'blockquote': 'Para\n\n> one\n\n> two\n\nafter\n\n> three',
+        'list': '1. one\n\n2. two\n\n    indented para\n\n3. three\n\nEnd *x*',
+        'document': (
+            '[TOC]\n\n# Title\n\nText with a note[^a] and a [link][x].\n\n## Sub\n\n- a\n\n- b\n\n'
+            '```python\nx = 1\n\n\ny = 2\n```\n\n## Sub\n\n> q1\nlazy\n\n> q2\n\nAnother[^a] ref.\n\n'
+            '| a | b |\n|---|---|\n| 1 | 2 |\n\n[^a]: Footnote text.\n\n    more footnote\n\n'
+            '[x]: http://example.com\n*[HTML]: HyperText'
+        ),
+    }
+
+    def render_incremental(self, text):
+        return IncrementalRenderer(rendering.get_pool(), 'test', None, BlockCache()).render(text)
+
+    def test_matches_full_render(self):
+        for name, text in self.DOCUMENTS.items():
+            with self.subTest(name):
+                self.assertEqual(
+                    normalize_html(self.render_incremental(text)), normalize_html(rendering.convert(text))
+                )
+
+    def test_matches_full_render_after_edit(self):
+        renderer = IncrementalRenderer(rendering.get_pool(), 'test', None, BlockCache())
+        text = self.DOCUMENTS['document']
+        renderer.render(text)
+        edited = text.replace('Another', 'Yet another')
+        self.assertEqual(normalize_html(renderer.render(edited)), normalize_html(rendering.convert(edited)))
+
+
+def create_post(author, slug='post', **fields):
+    fields.setdefault('status', 'published')
+    fields.setdefault('content', '正文')
+    return Post.objects.create(title=slug, slug=slug, author=author, **fields)
+
+
+class CommentCountTests(BlogTestCase):
+    """文章评论数与评论回复数的维护"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('author')
+        self.post = create_post(self.user)
+
+    def comment(self, parent=None, approved=True):
+        return Comment.objects.create(
+            post=self.post, parent=parent, author_name='a', author_email='a@example.com',
+            content='c', is_approved=approved,
+        )
+
+    def test_reply_counts(self):
+        a = self.comment()
+        b = self.comment(parent=a)
+        self.comment(parent=b)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual((a.reply_count, b.reply_count, self.post.comment_count), (2, 1, 3))
+
+    def test_cascade_delete_updates_ancestors(self):
+        a = self.comment()
+        b = self.comment(parent=a)
+        self.comment(parent=b)
+        b.delete()
+        a.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual((a.reply_count, self.post.comment_count), (0, 1))
+
+    def test_admin_actions_recount(self):
+        a = self.comment()
+        b = self.comment(parent=a, approved=False)
+        model_admin = site._registry[Comment]
+        request = RequestFactory().post('/')
+
+        model_admin.approve_comments(request, Comment.objects.filter(pk=b.pk))
+        a.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual((a.reply_count, self.post.comment_count), (1, 2))
+
+        model_admin.mark_as_spam(request, Comment.objects.filter(pk=b.pk))
+        a.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual((a.reply_count, self.post.comment_count), (0, 1))
+
+    def test_reply_counts_skip_hidden_subtrees(self):
+        a = self.comment()
+        b = self.comment(parent=a, approved=False)
+        c = self.comment(parent=b)
+        self.comment(parent=c)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.reply_count, b.reply_count), (0, 2))
+
+        # 批准中间的评论后整棵子树可见
+        b.is_approved = True
+        b.save()
+        a.refresh_from_db()
+        self.assertEqual(a.reply_count, 3)
+
+        b.is_approved = False
+        b.save()
+        a.refresh_from_db()
+        self.assertEqual(a.reply_count, 0)
+        self.assertEqual(counts.reconcile_comments(), 0)
+
+    def test_comment_admin_is_registered(self):
+        self.assertIsInstance(site._registry[Comment], CommentAdmin)
+
+    def test_reconcile_comments(self):
+        a = self.comment()
+        self.comment(parent=a)
+        Comment.objects.filter(pk=a.pk).update(reply_count=7)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=0)
+        self.assertEqual(counts.reconcile_comments(), 2)
+        a.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual((a.reply_count, self.post.comment_count), (1, 2))
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, STORAGES=TEST_STORAGES)
+class CommentThreadTests(BlogTestCase):
+    """评论按路径一次查询组装成树"""
+
+    def setUp(self):
+        super().setUp()
+        self.post = create_post(User.objects.create_user('author'))
+
+    def comment(self, parent=None, content='c'):
+        return Comment.objects.create(
+            post=self.post, parent=parent, author_name='a', author_email='a@example.com', content=content, is_approved=True,
+        )
+
+    def test_replies_are_assembled_into_a_tree(self):
+        root = self.comment()
+        reply = self.comment(root, 'reply')
+        self.comment(reply, 'nested')
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('blog:comment_replies', args=[root.pk])).json()
+        self.assertEqual([item['content'] for item in data['comments']], ['reply'])
+        self.assertIn('nested', data['html'])
+
+    def test_reply_form_labels_point_at_inputs(self):
+        root = self.comment()
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, f'<label for="reply-name-{root.pk}">')
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, STORAGES=TEST_STORAGES)
+class ListViewQueryTests(BlogTestCase):
+    """列表页只读取文章摘要字段，查询数不随文章数增长"""
+
+    BODY_COLUMNS = tuple(f'"blog_post"."{name}"' for name in Post.BODY_FIELDS)
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('author')
+        self.category = Category.objects.create(name='分类', slug='category')
+        self.tag = Tag.objects.create(name='标签', slug='tag')
+        self.series = Series.objects.create(name='系列', slug='series')
+
+    def add_posts(self, count):
+        for index in range(Post.objects.count(), Post.objects.count() + count):
+            post = create_post(
+                self.user, slug=f'post-{index}', category=self.category, series=self.series,
+                series_order=index, featured=index % 2 == 0,
+            )
+            post.tags.add(self.tag)
+
+    def urls(self):
+        year = Post.objects.first().published_at.year
+        return [
+            reverse('blog:home'),
+            reverse('blog:post_list'),
+            reverse('blog:category', args=['category']),
+            reverse('blog:tag', args=['tag']),
+            reverse('blog:series', args=['series']),
+            reverse('blog:archive'),
+            reverse('blog:archive_year', args=[year]),
+            reverse('blog:archive_year_posts', args=[year]),
+            reverse('blog:search') + '?q=post',
+            reverse('blog:about'),
+        ]
+
+    def capture(self, url):
+        caches['default'].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_list_views_do_not_load_body_columns(self):
+        self.add_posts(5)
+        for url in self.urls():
+            for sql in self.capture(url):
+                head = sql.split(' FROM ', 1)[0]
+                with self.subTest(url=url, sql=sql[:120]):
+                    self.assertFalse(any(column in head for column in self.BODY_COLUMNS))
+
+    def test_query_count_does_not_grow_with_posts(self):
+        # 两种数据量下都超过一页，分页查询的形状相同
+        self.add_posts(15)
+        before = {url: len(self.capture(url)) for url in self.urls()}
+        self.add_posts(30)
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertLessEqual(len(self.capture(url)), before[url])
+
+
+class RerenderPostsTests(BlogTestCase):
+    """manage.py rerender_posts"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('author')
+        self.posts = [create_post(self.user, slug=f'post-{index}') for index in range(4)]
+
+    def test_invalidates_cached_pages(self):
+        cache = pagecache.get_cache()
+        key = pagecache._tag_key(f'post:{self.posts[0].pk}')
+        cache.set(key, 'old', None)
+        call_command('rerender_posts', force=True, workers=1, stdout=StringIO())
+        self.assertNotEqual(cache.get(key), 'old')
+
+    def test_interrupt_reports_last_committed_id(self):
+        real_bulk_update = Post.objects.bulk_update
+        calls = []
+
+        def interrupt_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return real_bulk_update(*args, **kwargs)
+
+        stderr = StringIO()
+        with mock.patch.object(Post.objects, 'bulk_update', side_effect=interrupt_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('rerender_posts', force=True, workers=1, chunk_size=2, stdout=StringIO(), stderr=stderr)
+        self.assertIn(f'--start-id {self.posts[1].pk}）', stderr.getvalue())
+
+
+class ExportHeadersTests(BlogTestCase):
+    """静态导出的 _headers 只为带哈希的文件设置长期缓存"""
+
+    def test_only_hashed_paths_are_immutable(self):
+        headers = export.build_headers(['/static/css/style.0123456789ab.css']).decode('utf-8')
+        self.assertIn('/static/css/style.0123456789ab.css\n  Cache-Control: public, max-age=31536000, immutable', headers)
+        self.assertNotIn('/static/*', headers)
+
+    def test_no_immutable_headers_without_manifest(self):
+        self.assertNotIn('immutable', export.build_headers([]).decode('utf-8'))
+
+    @override_settings(STATIC_EXPORT_DYNAMIC_ORIGIN='https://app.example.com/')
+    def test_vercel_config_matches_redirects_and_headers(self):
+        config = json.loads(export.build_vercel_config(
+            {'version': 2, 'builds': [{'src': 'public/**', 'use': '@vercel/static'}]},
+            ['/archive/2024/posts/'], ['/static/css/style.0123456789ab.css'],
+        ))
+        self.assertEqual(config['builds'], [{'src': 'public/**', 'use': '@vercel/static'}])
+        self.assertIn({'source': '/dist/:path*', 'destination': '/:path*', 'permanent': True}, config['redirects'])
+        self.assertIn(
+            {'source': '/archive/2024/posts/', 'destination': '/archive/2024/posts/index.json'}, config['rewrites']
+        )
+        self.assertIn(
+            {'source': '/post/:slug/comments/:path*', 'destination': 'https://app.example.com/post/:slug/comments/:path*'},
+            config['rewrites'],
+        )
+        self.assertEqual(config['headers'], [{
+            'source': '/static/css/style.0123456789ab.css',
+            'headers': [{'key': 'Cache-Control', 'value': 'public, max-age=31536000, immutable'}],
+        }])
+
+
+class ExportOutputTests(BlogTestCase):
+    """输出目录中不是由导出生成的文件"""
+
+    def setUp(self):
+        super().setUp()
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.output_dir = Path(temp.name)
+        (self.output_dir / 'posts.html').write_text('旧页面')
+        (self.output_dir / 'about').mkdir()
+        (self.output_dir / 'about' / 'index.html').write_text('导出的页面')
+        export.save_manifest(self.output_dir, {'about/index.html': 'digest'})
+
+    def test_untracked_files_are_found(self):
+        self.assertEqual(export.find_untracked(self.output_dir, export.load_manifest(self.output_dir)), ['posts.html'])
+
+    def test_export_refuses_untracked_files_without_clean(self):
+        with mock.patch('blog.management.commands.export_static.call_command') as collectstatic:
+            with self.assertRaisesMessage(CommandError, 'posts.html'):
+                call_command('export_static', output=str(self.output_dir), stdout=StringIO())
+        collectstatic.assert_not_called()
+        self.assertTrue((self.output_dir / 'posts.html').exists())
+
+    def test_clean_removes_untracked_files(self):
+        removed = export.remove_stale(self.output_dir, ['about/index.html', 'posts.html'], {'about/index.html': 'digest'})
+        self.assertEqual(removed, 1)
+        self.assertFalse((self.output_dir / 'posts.html').exists())
+        self.assertTrue((self.output_dir / 'about' / 'index.html').exists())
+
+
+class AutocompleteTests(BlogTestCase):
+    """搜索框自动补全的前缀索引"""
+
+    def test_short_prefix_ranks_all_matches(self):
+        index = autocomplete.PrefixIndex()
+        entries = {('post', pk): (f'a{pk:04d}', f'/p/{pk}/', 1) for pk in range(500)}
+        entries[('post', 999)] = ('azure', '/p/999/', 10_000)
+        index.load(entries)
+        self.assertEqual(index.search('a', limit=1)[0]['label'], 'azure')
+
+    def test_top_results_follow_changes(self):
+        index = autocomplete.PrefixIndex()
+        index.load({('post', 1): ('apple', '/1/', 5), ('post', 2): ('apricot', '/2/', 1)})
+        self.assertEqual(index.search('a', limit=1)[0]['label'], 'apple')
+        index.put(('post', 2), 'apricot', '/2/', 50)
+        self.assertEqual(index.search('a', limit=1)[0]['label'], 'apricot')
+        index.remove(('post', 2))
+        self.assertEqual([item['label'] for item in index.search('a')], ['apple'])
+
+    def test_other_processes_replay_changes(self):
+        entries = {('post', 1): ('apple', '/1/', 5)}
+        with mock.patch.object(autocomplete, 'load_entries', return_value=entries) as load:
+            writer, reader = autocomplete.Autocomplete(), autocomplete.Autocomplete()
+            writer.get_index()
+            reader.get_index()
+            writer.changed('post', 2, ('apricot', '/2/', 1))
+            writer.changed('post', 1)
+            reader.checked_at = 0
+            self.assertEqual([item['label'] for item in reader.search('ap')], ['apricot'])
+        self.assertEqual(load.call_count, 2)
+
+    def test_changes_from_two_writers_get_distinct_numbers(self):
+        # 模拟文件缓存上非原子的 incr：两个进程取到同一个值
+        with mock.patch.object(autocomplete, 'load_entries', return_value={}), \
+                mock.patch.object(autocomplete.cache, 'incr', return_value=1):
+            first, second, reader = autocomplete.Autocomplete(), autocomplete.Autocomplete(), autocomplete.Autocomplete()
+            reader.get_index()
+            first.changed('post', 1, ('apple', '/1/', 1))
+            second.changed('post', 2, ('apricot', '/2/', 1))
+            reader.checked_at = 0
+            self.assertEqual(sorted(item['label'] for item in reader.search('ap')), ['apple', 'apricot'])
+            self.assertEqual(reader.version, 2)
+
+    def test_newly_used_tag_is_suggested(self):
+        tag = Tag.objects.create(name='缓存', slug='cache')
+        post = create_post(User.objects.create_user('author'))
+        with mock.patch.object(autocomplete, 'load_entries', return_value={}), \
+                mock.patch.object(autocomplete, 'suggestions', autocomplete.Autocomplete()) as suggestions:
+            suggestions.get_index()
+            self.assertEqual(suggestions.search('缓存'), [])
+            post.tags.add(tag)
+            self.assertEqual([item['label'] for item in suggestions.search('缓存')], ['缓存'])
+            post.tags.remove(tag)
+            self.assertEqual(suggestions.search('缓存'), [])
+
+
+class FailingBuffer(WriteBuffer):
+    def merge(self, pending, key, value):
+        pending[key] = pending.get(key, 0) + value
+
+    def write(self, batch):
+        raise RuntimeError('database is locked')
+
+
+class WriteBufferTests(BlogTestCase):
+    """写缓冲写入失败时的重试与上限"""
+
+    def test_failed_batch_is_requeued(self):
+        buffer = FailingBuffer(interval=3600, threshold=1000)
+        buffer.add('a', 1)
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        buffer.add('a', 2)
+        self.assertEqual(buffer._pending, {'a': 3})
+
+    def test_requeue_drops_oldest_beyond_cap(self):
+        buffer = FailingBuffer(interval=3600, threshold=1000, max_pending=3)
+        for key in 'abcde':
+            buffer.add(key, 1)
+        with self.assertRaises(RuntimeError), self.assertLogs('blog.buffers', 'WARNING'):
+            buffer.flush()
+        self.assertEqual(list(buffer._pending), ['c', 'd', 'e'])
+
+    def test_one_background_flush_at_a_time(self):
+        started, release = threading.Event(), threading.Event()
+        batches = []
+
+        class SlowBuffer(FailingBuffer):
+            background = True
+
+            def write(self, batch):
+                batches.append(batch)
+                started.set()
+                release.wait(5)
+                return len(batch)
+
+        buffer = SlowBuffer(interval=3600, threshold=1)
+        buffer.add('a', 1)
+        self.assertTrue(started.wait(5))
+        buffer.add('b', 1)
+        buffer.add('c', 1)
+        release.set()
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and not isinstance(thread, threading.Timer):
+                thread.join(5)
+        self.assertEqual(batches, [{'a': 1}])
+        self.assertEqual(buffer._pending, {'b': 1, 'c': 1})
+        buffer._timer.cancel()
+
+
+class ViewCounterTests(BlogTestCase):
+    """浏览量缓冲的刷新"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('author')
+        self.post = create_post(self.user)
+        self.counter = ViewCounter('blog.Post', interval=3600, threshold=1000, on_flush=trending.record_views)
+
+    def test_flush_merges_views_with_f_updates(self):
+        for _ in range(3):
+            self.counter.incr(self.post.pk)
+        self.assertEqual(self.counter.pending(self.post.pk), 3)
+        self.assertEqual(self.counter.flush(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 3)
+        self.assertEqual(self.counter.pending(self.post.pk), 0)
+
+    def test_views_are_bucketed_by_the_hour_they_happened(self):
+        before = datetime(2026, 1, 1, 10, 59, tzinfo=dt_timezone.utc)
+        after = datetime(2026, 1, 1, 11, 1, tzinfo=dt_timezone.utc)
+        for moment in (before, after, after):
+            with mock.patch('django.utils.timezone.now', return_value=moment):
+                self.counter.incr(self.post.pk)
+        self.counter.flush()
+        buckets = dict(PostViewBucket.objects.filter(post=self.post).values_list('hour', 'views'))
+        self.assertEqual(buckets, {before.replace(minute=0): 1, after.replace(minute=0): 2})
+
+
+class RelatedPostsTests(BlogTestCase):
+    """相关文章的正文向量按词频加权"""
+
+    def test_repeated_terms_weigh_more(self):
+        user = User.objects.create_user('author')
+        target = create_post(user, 'target', content='缓存 缓存 缓存 缓存 部署')
+        caching = create_post(user, 'caching', content='缓存 缓存 缓存 缓存 测试')
+        deploying = create_post(user, 'deploying', content='部署 部署 部署 部署 测试')
+
+        scores = dict(related.compute([target.pk], max_df=1.0)[target.pk])
+        self.assertGreater(scores[caching.pk], scores[deploying.pk])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PostDetailViewTests(BlogTestCase):
+    """详情页的浏览量统计与整页缓存"""
+
+    def setUp(self):
+        super().setUp()
+        # 全局的浏览量缓冲在测试之间共用：清空其他测试留下的记录，并避免定时器在后台刷新
+        post_views._pending = {}
+        for name, value in (('interval', 3600), ('threshold', 1000)):
+            patcher = mock.patch.object(post_views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, post_views, '_pending', {})
+        self.user = User.objects.create_user('author')
+        self.post = create_post(self.user)
+        self.url = self.post.get_absolute_url()
+
+    def test_views_counter(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        # 命中缓存的请求同样计入浏览量
+        self.assertEqual(post_views.pending(self.post.pk), 2)
+
+        post_views.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PageCacheTests(BlogTestCase):
+    """整页缓存按标签失效"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('author')
+        self.post = create_post(self.user)
+        self.url = self.post.get_absolute_url()
+
+    def test_saving_post_invalidates_cached_page(self):
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'hit')
+
+        self.post.title = '新标题'
+        self.post.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, '新标题')
+
+    def test_invalidating_other_tags_keeps_page(self):
+        self.client.get(self.url)
+        pagecache.invalidate('post:0', 'category:0')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'hit')
+        pagecache.invalidate('sidebar')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, STORAGES=TEST_STORAGES)
+class KeysetPaginationTests(BlogTestCase):
+    """游标编码与按游标翻页"""
+
+    def test_cursor_round_trip(self):
+        moment = datetime(2026, 1, 1, 8, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(moment, 42), datetime, int), (moment, 42))
+
+    def test_invalid_cursor_is_ignored(self):
+        for cursor in ('', 'not-base64!', encode_cursor(1), encode_cursor('x', 1)):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor, datetime, int))
+
+    def test_pages_cover_every_post_once(self):
+        user = User.objects.create_user('author')
+        # 相同的发布时间由主键决定先后
+        moment = timezone.now() - timedelta(days=1)
+        for index in range(25):
+            create_post(user, slug=f'post-{index}', published_at=moment - timedelta(hours=index % 5))
+        expected = list(Post.objects.filter(status='published').order_by('-published_at', '-pk').values_list('pk', flat=True))
+
+        seen, query, numbers = [], '', []
+        while True:
+            page = self.client.get(f'{reverse("blog:post_list")}?{query}').context['page_obj']
+            seen.extend(post.pk for post in page)
+            numbers.append(page.number)
+            if not page.has_next():
+                break
+            query = page.next_link['query']
+        self.assertEqual(seen, expected)
+        self.assertEqual(numbers, [1, 2, 3])
+
+        # 从最后一页往前翻：末页是最后 10 篇，与前一页首尾相接
+        page = self.client.get(f'{reverse("blog:post_list")}?last=1').context['page_obj']
+        self.assertEqual([post.pk for post in page], expected[15:])
+        page = self.client.get(f'{reverse("blog:post_list")}?{page.previous_link["query"]}').context['page_obj']
+        self.assertEqual([post.pk for post in page], expected[5:15])
+
+    def test_last_page_ignores_stale_total(self):
+        user = User.objects.create_user('author')
+        for index in range(12):
+            create_post(user, slug=f'post-{index}')
+        url = f'{reverse("blog:post_list")}?last=1'
+        self.client.get(reverse('blog:post_list'))
+        # 缓存的近似总数仍是 12 时又发布了 5 篇
+        for index in range(12, 17):
+            create_post(user, slug=f'post-{index}')
+        expected = list(Post.objects.filter(status='published').order_by('-published_at', '-pk').values_list('pk', flat=True))
+        page = self.client.get(url).context['page_obj']
+        self.assertEqual([post.pk for post in page], expected[-10:])
+        self.assertTrue(page.has_previous())
+
+
+calls = []
+
+
+@jobs.task(name='blog.tests.flaky', max_attempts=2)
+def flaky(fail):
+    calls.append(fail)
+    if fail:
+        raise RuntimeError('失败')
+
+
+class JobQueueTests(BlogTestCase):
+    """任务的认领、租约与重试"""
+
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def test_claimed_job_is_not_claimed_again(self):
+        job = jobs.enqueue(flaky, fail=False)
+        self.assertEqual(jobs.claim('a').pk, job.pk)
+        self.assertIsNone(jobs.claim('b'))
+
+        # 租约过期后可被其他执行者接管，原执行者的结果不再写入
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim('b').pk, job.pk)
+        self.assertEqual(jobs._finish(job, 'a', 'done'), 0)
+        self.assertEqual(jobs.execute(Job.objects.get(pk=job.pk), 'b'), 'done')
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'done')
+
+    def test_failed_job_is_retried_with_backoff_then_fails(self):
+        job = jobs.enqueue(flaky, fail=True)
+        with self.assertLogs('blog.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError', job.last_error)
+        # 退避期间不会被认领
+        self.assertEqual(jobs.run_pending(), 0)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('blog.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('failed', 2, ''))
+        self.assertEqual(calls, [True, True])
+
+    def test_burst_worker_prunes_old_finished_jobs(self):
+        old = jobs.enqueue(flaky, fail=False)
+        recent = jobs.enqueue(flaky, fail=False)
+        failed = jobs.enqueue(flaky, fail=False)
+        Job.objects.filter(pk=old.pk).update(status='done', finished_at=timezone.now() - timedelta(days=30))
+        Job.objects.filter(pk=recent.pk).update(status='done', finished_at=timezone.now())
+        Job.objects.filter(pk=failed.pk).update(status='failed', finished_at=timezone.now() - timedelta(days=30))
+
+        out = StringIO()
+        call_command('run_worker', '--burst', '--prune', stdout=out)
+        self.assertIn('已删除 1 个', out.getvalue())
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, failed.pk})
+
+    def test_backoff_grows_and_is_capped(self):
+        with mock.patch('random.uniform', return_value=1.0):
+            self.assertEqual([jobs.backoff(n, base=10, cap=60) for n in (1, 2, 3, 4, 5)], [10, 20, 40, 60, 60])
+
+
+class SchedulerTests(BlogTestCase):
+    """定时发布"""
+
+    def test_publishes_due_posts(self):
+        user = User.objects.create_user('author')
+        now = timezone.now()
+        due = create_post(user, 'due', published_at=now + timedelta(minutes=5))
+        later = create_post(user, 'later', published_at=now + timedelta(hours=2))
+        self.assertEqual((due.status, later.status), ('scheduled', 'scheduled'))
+        pagecache.get_cache().set(pagecache._tag_key('posts'), 'old', None)
+
+        scheduler = Scheduler(horizon=3600, reload_interval=60)
+        self.assertEqual(scheduler.run_once(now).get('posts'), None)
+        with self.captureOnCommitCallbacks(execute=True):
+            results = scheduler.run_once(now + timedelta(minutes=10))
+
+        self.assertEqual(results['posts'], 1)
+        due.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((due.status, later.status), ('published', 'scheduled'))
+        self.assertNotEqual(pagecache.get_cache().get(pagecache._tag_key('posts')), 'old')
+        # 装载之后被取消的定时项不会被发布
+        Post.objects.filter(pk=later.pk).update(status='draft')
+        self.assertEqual(scheduler.run_once(now + timedelta(hours=3)).get('posts', 0), 0)
+
+    def test_partial_save_keeps_status_in_sync(self):
+        post = create_post(User.objects.create_user('author'))
+        post.published_at = timezone.now() + timedelta(hours=1)
+        post.save(update_fields=['published_at'])
+        self.assertEqual(post.status, 'scheduled')
+        self.assertEqual(Post.objects.get(pk=post.pk).status, 'scheduled')
+
+    def test_scheduled_post_without_date(self):
+        post = create_post(User.objects.create_user('author'), status='scheduled')
+        self.assertIsNotNone(Post.objects.get(pk=post.pk).published_at)
+        post.published_at = None
+        with self.assertRaises(ValidationError):
+            post.clean()
+
+    def test_post_published_elsewhere_is_not_counted_again(self):
+        category = Category.objects.create(name='分类', slug='category')
+        post = create_post(User.objects.create_user('author'), published_at=timezone.now() + timedelta(minutes=5), category=category)
+        real_filter = Post.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            # 取出到期文章之后、更新状态之前，另一个调度器已发布了它
+            if 'pk__in' not in kwargs:
+                return real_filter(*args, **kwargs)
+            due = list(real_filter(*args, **kwargs))
+            real_filter(pk__in=kwargs['pk__in']).update(status='published')
+            return due
+
+        with mock.patch.object(Post.objects, 'filter', side_effect=racing_filter):
+            self.assertEqual(publish_posts([post.pk], timezone.now() + timedelta(minutes=10)), 0)
+        category.refresh_from_db()
+        self.assertEqual(category.post_count, 0)
@@ -0,0 +1,115 @@
+"""
+近期热门与总榜
+
+浏览量写回时（见 ``blog.counters``）同时按小时累加到 ``PostViewBucket``。
+
+- 近期热门：最近 ``TRENDING_WINDOW_HOURS`` 小时内每小时的浏览量按指数衰减加权求和，
+  半衰期为 ``TRENDING_HALF_LIFE_HOURS`` 小时，老文章不会一直占据榜首
+- 总榜：按累计浏览量排序
+
+两个榜单都只保存文章 ID 列表，放在缓存中定时刷新（``manage.py refresh_trending``
+或缓存过期后由下一个请求重新计算），侧栏只需按主键取这几篇文章。
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+TRENDING_KEY = 'trending:ids'
+POPULAR_KEY = 'popular:ids'
+
+
+def bucket_hour(moment=None):
+    moment = moment or timezone.now()
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_views(batch):
+    """把一批 ``{(文章ID, 小时): 次数}`` 累加到对应小时的桶中"""
+    from .models import PostViewBucket
+
+    PostViewBucket.objects.bulk_create(
+        [PostViewBucket(post_id=pk, hour=hour, views=0) for pk, hour in batch],
+        ignore_conflicts=True,
+    )
+    groups = {}
+    for (pk, hour), amount in batch.items():
+        groups.setdefault((hour, amount), []).append(pk)
+    for (hour, amount), pks in groups.items():
+        PostViewBucket.objects.filter(post_id__in=pks, hour=hour).update(views=F('views') + amount)
+
+
+def compute_trending(limit=None, moment=None):
+    """按衰减后的近期浏览量排序的已发布文章 ID"""
+    from .models import PostViewBucket
+
+    limit = limit or getattr(settings, 'TRENDING_SIZE', 20)
+    window = getattr(settings, 'TRENDING_WINDOW_HOURS', 72)
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)
+    now = bucket_hour(moment)
+    rows = PostViewBucket.objects.filter(
+        hour__gt=now - timedelta(hours=window), post__status='published'
+    ).values_list('post_id', 'hour', 'views')
+
+    decay = math.log(2) / half_life
+    scores = {}
+    for post_id, hour, views in rows:
+        age = max(0.0, (now - hour).total_seconds() / 3600)
+        scores[post_id] = scores.get(post_id, 0.0) + views * math.exp(-decay * age)
+    return sorted(scores, key=lambda pk: (-scores[pk], -pk))[:limit]
+
+
+def compute_popular(limit=None):
+    """累计浏览量最高的已发布文章 ID"""
+    from .models import Post
+
+    limit = limit or getattr(settings, 'TRENDING_SIZE', 20)
+    return list(
+        Post.objects.filter(status='published').order_by('-views', '-pk').values_list('pk', flat=True)[:limit]
+    )
+
+
+def refresh():
+    """重新计算两个榜单并写入缓存"""
+    trending = compute_trending()
+    popular = compute_popular()
+    cache.set(TRENDING_KEY, trending, getattr(settings, 'TRENDING_REFRESH_INTERVAL', 300) * 2)
+    cache.set(POPULAR_KEY, popular, getattr(settings, 'POPULAR_REFRESH_INTERVAL', 600) * 2)
+    return trending, popular
+
+
+def prune(days=None):
+    """删除超过保留期的小时桶，返回删除的行数"""
+    from .models import PostViewBucket
+
+    days = days or getattr(settings, 'TRENDING_BUCKET_RETENTION_DAYS', 30)
+    deleted, _ = PostViewBucket.objects.filter(hour__lt=bucket_hour() - timedelta(days=days)).delete()
+    return deleted
+
+
+def get_trending_ids():
+    return cache.get_or_set(TRENDING_KEY, compute_trending, getattr(settings, 'TRENDING_REFRESH_INTERVAL', 300))
+
+
+def get_popular_ids():
+    return cache.get_or_set(POPULAR_KEY, compute_popular, getattr(settings, 'POPULAR_REFRESH_INTERVAL', 600))
+
+
+def posts_for(ids, limit):
+    """按 ID 列表的顺序取文章（一次主键查询），跳过已下线的"""
+    from .models import Post
+
+    posts = Post.objects.summaries().filter(status='published').in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts][:limit]
+
+
+def trending_posts(limit=5):
+    """近期热门；最近没有浏览记录时退回到总榜"""
+    return posts_for(get_trending_ids() or get_popular_ids(), limit)
+
+
+def popular_posts(limit=5):
+    return posts_for(get_popular_ids(), limit)
@@ -13,8 +13,13 @@ urlpatterns = [
     # 文章详情
     path('post/<slug:slug>/', views.PostDetailView.as_view(), name='post_detail'),
 
+    # 评论分页与回复按需加载（JSON）
+    path('post/<slug:slug>/comments/', views.comment_threads, name='comment_threads'),
+    path('comments/<int:pk>/replies/', views.comment_replies, name='comment_replies'),
+
     # 归档页面
     path('archive/', views.ArchiveView.as_view(), name='archive'),
+    path('archive/<int:year>/posts/', views.archive_year_posts, name='archive_year_posts'),
 
     # 按年份归档
     path('archive/<int:year>/', views.PostListView.as_view(), name='archive_year'),
@@ -31,10 +36,14 @@ urlpatterns = [
 
     # 搜索
     path('search/', views.SearchView.as_view(), name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
 
     # 关于页面
     path('about/', views.about, name='about'),
 
     # 点赞
     path('like/', views.like_post, name='like_post'),
+
+    # 后台编辑器实时预览
+    path('preview/', views.markdown_preview, name='markdown_preview'),
 ]
@@ -1,12 +1,23 @@
+from datetime import datetime
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import ListView, DetailView
-from django.db.models import Q, Count
+from django.views.generic import ListView, DetailView, TemplateView
 from django.core.paginator import Paginator
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
+from django.template.loader import render_to_string
+from django.conf import settings
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from .models import Post, Category, Tag, Series, Comment, Link
+from django.views.decorators.cache import cache_control
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.decorators import method_decorator
+from django.utils import timezone
+from .models import ArchiveMonth, Post, Category, Tag, Series, Comment, Link
+from .counters import post_views
+from . import autocomplete, rendering, search, trending
+from .pagecache import cached_page, tag_page, tag_posts, set_page_meta
+from .pagination import encode_cursor, decode_cursor, KeysetPaginationMixin
 from newsletter.models import Subscriber
 
 
@@ -20,7 +31,14 @@ def get_client_ip(request):
     return ip
 
 
-class HomeView(ListView):
+def count_cached_view(request, meta):
+    """整页缓存命中时仍然统计浏览量"""
+    if meta.get('post_id'):
+        post_views.incr(meta['post_id'])
+
+
+@method_decorator(cached_page(query_params=KeysetPaginationMixin.cursor_params), name='dispatch')
+class HomeView(KeysetPaginationMixin, ListView):
     """首页视图"""
     model = Post
     template_name = 'blog/home.html'
@@ -28,40 +46,43 @@ class HomeView(ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags')
+        return Post.objects.summaries().filter(status='published').select_related('author', 'category').prefetch_related('tags')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         # 特色文章（用于滑块）
-        featured_posts = Post.objects.filter(
+        featured_posts = Post.objects.summaries().filter(
             status='published',
             featured=True
         ).select_related('author').order_by('featured_order', '-published_at')[:5]
         context['featured_posts'] = featured_posts
 
         # 热门标签
-        context['popular_tags'] = Tag.objects.annotate(
-            post_count=Count('posts')
-        ).filter(post_count__gt=0).order_by('-post_count')[:15]
+        context['popular_tags'] = Tag.objects.filter(post_count__gt=0).order_by('-post_count')[:15]
 
         # 文章分类
-        context['categories'] = Category.objects.annotate(
-            post_count=Count('posts')
-        ).filter(post_count__gt=0).order_by('-post_count')
+        context['categories'] = Category.objects.filter(post_count__gt=0).order_by('-post_count')
 
         # 友链
         context['links'] = Link.objects.filter(is_active=True).order_by('order')
 
         # 系列文章
-        context['series_list'] = Series.objects.annotate(
-            post_count=Count('posts')
-        ).filter(post_count__gt=0).order_by('-post_count')[:5]
+        context['series_list'] = Series.objects.filter(post_count__gt=0).order_by('-post_count')[:5]
+
+        # 近期热门
+        context['popular_posts'] = trending.trending_posts(5)
+
+        tag_page(self.request, 'posts', 'sidebar')
+        tag_posts(self.request, context['posts'])
+        tag_posts(self.request, featured_posts)
+        tag_posts(self.request, context['popular_posts'])
 
         return context
 
 
-class PostListView(ListView):
+@method_decorator(cached_page(query_params=KeysetPaginationMixin.cursor_params), name='dispatch')
+class PostListView(KeysetPaginationMixin, ListView):
     """文章列表视图"""
     model = Post
     template_name = 'blog/post_list.html'
@@ -69,7 +90,7 @@ class PostListView(ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags')
+        queryset = Post.objects.summaries().filter(status='published').select_related('author', 'category').prefetch_related('tags')
 
         # 按年份筛选
         year = self.kwargs.get('year')
@@ -94,10 +115,16 @@ class PostListView(ListView):
         # 按系列筛选
         series_slug = self.kwargs.get('series_slug')
         if series_slug:
-            queryset = queryset.filter(series__slug=series_slug).order_by('series_order')
+            queryset = queryset.filter(series__slug=series_slug)
 
         return queryset
 
+    def get_keyset_fields(self):
+        # 系列内按序号正序排列
+        if self.kwargs.get('series_slug'):
+            return (('series_order', False), ('pk', False))
+        return super().get_keyset_fields()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['current_year'] = self.kwargs.get('year')
@@ -105,9 +132,13 @@ class PostListView(ListView):
         context['current_category'] = self.kwargs.get('category_slug')
         context['current_tag'] = self.kwargs.get('tag_slug')
         context['current_series'] = self.kwargs.get('series_slug')
+
+        tag_page(self.request, 'posts', 'sidebar')
+        tag_posts(self.request, context['posts'])
         return context
 
 
+@method_decorator(cached_page(on_hit=count_cached_view), name='dispatch')
 class PostDetailView(DetailView):
     """文章详情视图"""
     model = Post
@@ -115,46 +146,55 @@ class PostDetailView(DetailView):
     context_object_name = 'post'
 
     def get_queryset(self):
-        return Post.objects.filter(status='published').select_related('author', 'category', 'series').prefetch_related('tags', 'comments')
+        return Post.objects.filter(status='published').select_related('author', 'category', 'series').prefetch_related('tags')
 
     def get_object(self, queryset=None):
         post = super().get_object(queryset)
-        # 增加浏览量
-        post.views += 1
-        post.save(update_fields=['views'])
+        # 增加浏览量（写回缓冲，批量合并到数据库）
+        post.views += post_views.pending(post.pk) + 1
+        post_views.incr(post.pk)
         return post
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         post = self.object
 
-        # 获取已审核的顶级评论
-        comments = post.comments.filter(parent__isnull=True, is_approved=True).select_related().order_by('created_at')
+        # 首屏只取第一页顶级评论，回复按需通过 JSON 接口加载
+        comments, next_key = Comment.objects.threads(post, limit=settings.COMMENTS_PER_PAGE)
         context['comments'] = comments
-        context['comment_count'] = post.comments.filter(is_approved=True).count()
+        context['comments_next'] = encode_cursor(*next_key) if next_key else ''
+        context['comment_count'] = post.comment_count
 
         # 系列中的其他文章
         if post.series:
-            series_posts = post.series.posts.filter(status='published').order_by('series_order')
+            series_posts = post.series.posts.summaries().filter(status='published').order_by('series_order')
             context['series_posts'] = series_posts
             context['series_position'] = list(series_posts.values_list('id', flat=True)).index(post.id) + 1
 
-        # 相关文章（相同分类）
-        related_posts = Post.objects.filter(
-            status='published',
-            category=post.category
-        ).exclude(id=post.id)[:4]
+        # 相关文章：读取预先计算的结果，尚未计算时退回到相同分类
+        related_posts = [
+            entry.related for entry in post.related_entries.filter(
+                related__status='published'
+            ).select_related('related').defer(
+                *(f'related__{field}' for field in Post.BODY_FIELDS)
+            )[:settings.RELATED_POSTS_COUNT]
+        ]
+        if not related_posts:
+            related_posts = Post.objects.summaries().filter(
+                status='published',
+                category=post.category
+            ).exclude(id=post.id)[:settings.RELATED_POSTS_COUNT]
         context['related_posts'] = related_posts
 
-        # 热门文章
-        context['popular_posts'] = Post.objects.filter(
-            status='published'
-        ).order_by('-views')[:5]
-
         # 标签云
-        context['all_tags'] = Tag.objects.annotate(
-            post_count=Count('posts')
-        ).filter(post_count__gt=0).order_by('-post_count')
+        context['all_tags'] = Tag.objects.filter(post_count__gt=0).order_by('-post_count')
+
+        tag_page(self.request, 'sidebar')
+        tag_posts(self.request, [post])
+        tag_posts(self.request, related_posts)
+        if post.series:
+            tag_posts(self.request, series_posts)
+        set_page_meta(self.request, post_id=post.pk)
 
         return context
 
@@ -191,77 +231,201 @@ class PostDetailView(DetailView):
         return redirect('blog:post_detail', slug=post.slug)
 
 
-class ArchiveView(ListView):
-    """归档视图"""
-    model = Post
-    template_name = 'blog/archive.html'
-    context_object_name = 'posts'
+@method_decorator(cached_page(), name='dispatch')
+class ArchiveView(TemplateView):
+    """
+    归档视图
 
-    def get_queryset(self):
-        return Post.objects.filter(status='published').select_related('author', 'category').order_by('-published_at')
+    年份与每月文章数来自增量维护的 ``ArchiveMonth``，各年份默认折叠，
+    展开时再通过 ``archive_year_posts`` 加载该年的文章列表。
+    """
+    template_name = 'blog/archive.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        posts = context['posts']
 
-        # 按年份分组
-        posts_by_year = {}
-        for post in posts:
-            year = post.published_at.year
-            if year not in posts_by_year:
-                posts_by_year[year] = []
-            posts_by_year[year].append(post)
-
-        context['posts_by_year'] = posts_by_year
-
-        # 所有年份
-        context['years'] = sorted(posts_by_year.keys(), reverse=True)
+        # 按年份汇总每月文章数
+        years = {}
+        for month in ArchiveMonth.objects.filter(post_count__gt=0):
+            year = years.setdefault(month.year, {'year': month.year, 'count': 0, 'months': []})
+            year['count'] += month.post_count
+            year['months'].append(month)
+        context['years'] = sorted(years.values(), key=lambda year: year['year'], reverse=True)
 
         # 所有标签及文章数
-        context['all_tags'] = Tag.objects.annotate(
-            post_count=Count('posts')
-        ).filter(post_count__gt=0).order_by('-post_count')
+        context['all_tags'] = Tag.objects.filter(post_count__gt=0).order_by('-post_count')
 
         # 所有系列
-        context['all_series'] = Series.objects.annotate(
-            post_count=Count('posts')
-        ).filter(post_count__gt=0).order_by('-post_count')
+        context['all_series'] = Series.objects.filter(post_count__gt=0).order_by('-post_count')
+
+        tag_page(self.request, 'posts', 'sidebar')
 
         return context
 
 
-class SearchView(ListView):
-    """搜索结果视图"""
+@cached_page()
+@require_http_methods(["GET"])
+def archive_year_posts(request, year):
+    """某一年的文章列表（只取标题、链接、日期和分类），返回 JSON"""
+    if not 1 <= year < 9999:
+        raise Http404
+    start = timezone.make_aware(datetime(year, 1, 1))
+    end = timezone.make_aware(datetime(year + 1, 1, 1))
+    posts = list(
+        Post.objects.filter(status='published', published_at__gte=start, published_at__lt=end)
+        .order_by('-published_at')
+        .values('id', 'title', 'slug', 'published_at', 'category__name')
+    )
+    for post in posts:
+        # 按站点时区分月
+        post['published_at'] = timezone.localtime(post['published_at'])
+    html = render_to_string('blog/includes/archive_year.html', {'posts': posts}, request=request)
+    tag_page(request, 'posts', *(f'post:{post["id"]}' for post in posts))
+    return JsonResponse({'year': year, 'count': len(posts), 'html': html})
+
+
+@method_decorator(cached_page(query_params=('q',) + KeysetPaginationMixin.cursor_params), name='dispatch')
+class SearchView(KeysetPaginationMixin, ListView):
+    """
+    搜索结果视图
+
+    索引能回答的查询按相关度（FTS5 的 BM25，或二元分词索引的 ID 倒序）排序，
+    否则按发布时间列出子串匹配结果。
+    """
     model = Post
     template_name = 'blog/search.html'
     context_object_name = 'posts'
     paginate_by = 10
 
+    def get_query(self):
+        return self.request.GET.get('q', '').strip()
+
     def get_queryset(self):
-        query = self.request.GET.get('q', '')
+        query = self.get_query()
         if query:
-            return Post.objects.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(excerpt__icontains=query),
-                status='published'
-            ).select_related('author', 'category').prefetch_related('tags')
+            queryset = Post.objects.summaries().filter(status='published').select_related(
+                'author', 'category'
+            ).prefetch_related('tags')
+            if self.get_results() is not None:
+                return queryset
+            return queryset.filter(search.fallback_filter(query))
         return Post.objects.none()
 
+    def get_results(self):
+        if not hasattr(self, '_results'):
+            query = self.get_query()
+            self._results = search.find(query) if query else None
+        return self._results
+
+    def paginate_queryset(self, queryset, page_size):
+        results = self.get_results()
+        if results is None:
+            return super().paginate_queryset(queryset, page_size)
+
+        page = self.paginate_sequence(results, page_size)
+        posts = queryset.in_bulk([pk for pk, _ in page.object_list])
+        items = []
+        for pk, snippet in page.object_list:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_snippet = snippet
+                items.append(post)
+        page.object_list = items
+        return None, page, items, page.has_other_pages()
+
+    def get_pagination_params(self):
+        return {'q': self.get_query()}
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['query'] = self.request.GET.get('q', '')
+        context['query'] = self.get_query()
+
+        tag_page(self.request, 'posts')
+        tag_posts(self.request, context['posts'])
         return context
 
 
+@require_http_methods(["GET"])
+@cache_control(public=True, max_age=60)
+def search_suggest(request):
+    """搜索框自动补全（JSON），由进程内前缀索引回答，不访问数据库"""
+    query = request.GET.get('q', '')[:100]
+    limit = getattr(settings, 'AUTOCOMPLETE_LIMIT', 8)
+    return JsonResponse({
+        'query': query,
+        'suggestions': autocomplete.suggestions.search(query, limit),
+    })
+
+
+@cached_page()
 def about(request):
     """关于页面"""
     context = {
-        'popular_posts': Post.objects.filter(status='published').order_by('-views')[:5],
+        'popular_posts': trending.popular_posts(5),
     }
+    tag_posts(request, context['popular_posts'])
     return render(request, 'blog/about.html', context)
 
 
+def serialize_comment(comment):
+    """评论的 JSON 表示（含已加载的子评论）"""
+    return {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'author_name': comment.author_name,
+        'author_url': comment.author_url,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+        'depth': comment.depth,
+        'reply_count': comment.reply_count,
+        'children': [serialize_comment(child) for child in getattr(comment, '_tree_children', [])],
+    }
+
+
+@cached_page(query_params=('after',))
+@require_http_methods(["GET"])
+def comment_threads(request, slug):
+    """顶级评论分页（键集游标），返回 JSON"""
+    post = get_object_or_404(Post.objects.only('id', 'slug', 'author__username').select_related('author'), slug=slug, status='published')
+    after = request.GET.get('after')
+    after_key = decode_cursor(after, datetime, int)
+    if after and after_key is None:
+        raise Http404('无效的分页游标')
+
+    comments, next_key = Comment.objects.threads(post, after=after_key, limit=settings.COMMENTS_PER_PAGE)
+    html = ''.join(
+        render_to_string('blog/includes/comment_thread.html', {'comment': comment, 'post': post}, request=request)
+        for comment in comments
+    )
+    tag_page(request, f'post:{post.pk}')
+    return JsonResponse({
+        'comments': [serialize_comment(comment) for comment in comments],
+        'html': html,
+        'next': encode_cursor(*next_key) if next_key else None,
+    })
+
+
+@cached_page()
+@require_http_methods(["GET"])
+def comment_replies(request, pk):
+    """某条评论下的全部已审核回复（一次查询组装成树），返回 JSON"""
+    comment = get_object_or_404(
+        Comment.objects.select_related('post__author'),
+        pk=pk, is_approved=True, post__status='published',
+    )
+    replies = Comment.objects.subtree(comment)
+    html = render_to_string(
+        'blog/includes/comment_replies.html',
+        {'replies': replies, 'post': comment.post},
+        request=request,
+    )
+    tag_page(request, f'post:{comment.post_id}')
+    return JsonResponse({
+        'comments': [serialize_comment(reply) for reply in replies],
+        'html': html,
+    })
+
+
 @require_http_methods(["POST"])
 def like_post(request):
     """点赞文章（简单实现）"""
@@ -269,3 +433,13 @@ def like_post(request):
     post = get_object_or_404(Post, id=post_id)
     # 这里可以添加更复杂的点赞逻辑
     return JsonResponse({'success': True, 'likes': post.views})
+
+
+@staff_member_required
+@require_http_methods(["POST"])
+def markdown_preview(request):
+    """后台编辑器实时预览（按块增量渲染，只转换改动过的块）"""
+    content = request.POST.get('content', '')
+    post_id = request.POST.get('post_id') or 'new'
+    html = rendering.render_document(content, key=f'preview:{request.user.pk}:{post_id}')
+    return JsonResponse({'html': html})
@@ -87,6 +87,18 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic 时压缩 CSS/JS、文件名加内容哈希并生成 .gz/.br（见 blog.staticfiles）
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'blog.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+STATIC_MINIFY = True
+# 没有前置 Web 服务器时由 Django 提供 STATIC_ROOT 中的文件；
+# 带哈希的文件缓存一年（immutable），其余文件缓存 STATIC_MAX_AGE 秒
+STATIC_SERVE = not DEBUG
+STATIC_MAX_AGE = 60
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -101,8 +113,84 @@ MARKDOWN_EXTENSIONS = [
     'footnotes',
 ]
 
+MARKDOWN_EXTENSION_CONFIGS = {}
+
+# Markdown 渲染缓存及实例池大小
+MARKDOWN_CACHE_ALIAS = 'markdown'
+MARKDOWN_POOL_SIZE = 8
+
+# 按顶层块增量渲染，长文修改一处只重新渲染变化的块
+MARKDOWN_INCREMENTAL = True
+MARKDOWN_BLOCK_CACHE_SIZE = 4096
+
+# 代码块高亮缓存：内存 LRU 条目数；设置缓存别名后同时落盘，多进程共享
+MARKDOWN_HIGHLIGHT_CACHE_SIZE = 2048
+MARKDOWN_HIGHLIGHT_CACHE_ALIAS = None
+
+# 缓存配置（多个 worker 需要共享缓存，生产环境建议换成 Redis / Memcached）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'default',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'markdown': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'markdown',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# 整页缓存：匿名访问的页面缓存秒数，模型变更时按标签提前失效；
+# 浏览量变化不失效，缓存页上的阅读数最多滞后这么久
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = 300
+
+# 列表分页：近似总数的缓存秒数
+PAGINATION_COUNT_TIMEOUT = 600
+
+# 全文搜索：FTS5 分词器、标题/摘要/正文的 BM25 权重、最多返回的结果数
+SEARCH_FTS_TOKENIZER = 'trigram'
+SEARCH_FTS_WEIGHTS = (10.0, 5.0, 1.0)
+SEARCH_MAX_RESULTS = 1000
+# 进程内缓存的热门查询结果数（LFU 淘汰）
+SEARCH_RESULT_CACHE_SIZE = 256
+
+# 搜索框自动补全：返回条数、检查其他进程更新的间隔秒数、索引最长使用秒数
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_CHECK_INTERVAL = 5
+AUTOCOMPLETE_MAX_AGE = 600
+
+# 热门文章：榜单长度、近期热门的统计窗口与半衰期（小时）、两个榜单的刷新间隔（秒）、
+# 每小时浏览量的保留天数（manage.py refresh_trending --prune）
+TRENDING_SIZE = 20
+TRENDING_WINDOW_HOURS = 72
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_REFRESH_INTERVAL = 300
+POPULAR_REFRESH_INTERVAL = 600
+TRENDING_BUCKET_RETENTION_DAYS = 30
+
+# 相关文章（manage.py build_related_posts）：每篇保留的数量、每篇参与计算的词项数、
+# 超过该比例文章都包含的词项视为常用词、标题词项加权、标签相似度占比、同系列加分
+RELATED_POSTS_COUNT = 4
+RELATED_MAX_TERMS = 64
+RELATED_MAX_DF = 0.3
+RELATED_TITLE_BOOST = 2.0
+RELATED_TAG_WEIGHT = 0.3
+RELATED_SERIES_BONUS = 0.1
+
+# 静态导出（manage.py export_static）：输出目录；动态接口（评论、搜索、订阅等）
+# 代理到的 Django 服务地址，为空时 _redirects 中不生成代理规则；_redirects/_headers 只对
+# Netlify、Cloudflare Pages 生效，部署在 Vercel 时同样的规则写入 vercel.json，为空时不写
+STATIC_EXPORT_DIR = BASE_DIR / 'public'
+STATIC_EXPORT_DYNAMIC_ORIGIN = ''
+STATIC_EXPORT_VERCEL_CONFIG = BASE_DIR / 'vercel.json'
+
 # 评论配置
 COMMENTS_APPROVAL_REQUIRED = True
+COMMENTS_PER_PAGE = 20
 
 # 站点配置
 SITE_URL = 'https://sakura-blog.example.com'
@@ -115,5 +203,42 @@ EMAIL_HOST = 'localhost'
 EMAIL_PORT = 25
 EMAIL_USE_TLS = False
 
+# 新闻通讯发送（manage.py send_newsletters）：每批邮件数、每秒最多发送数（0 为不限制）、
+# 发送租约秒数（每批发送后续期，进程中断后过期才能由其他进程接着发送）
+NEWSLETTER_BATCH_SIZE = 100
+NEWSLETTER_RATE_LIMIT = 10
+NEWSLETTER_LEASE_SECONDS = 300
+# 邮件打开追踪：缓冲的打开事件每隔多少秒或累计多少条合并写入一次数据库
+NEWSLETTER_OPEN_FLUSH_INTERVAL = 5
+NEWSLETTER_OPEN_FLUSH_THRESHOLD = 500
+
+# 新闻通讯摘要：附上订阅者上次收到通讯之后发布的新文章，最多多少篇（0 为不附上）
+NEWSLETTER_DIGEST_RECENT_POSTS = 10
+
+# 后台任务队列（manage.py run_worker）：工作线程数、队列为空时的轮询间隔（秒）、
+# 任务租约秒数（执行期间自动续期）、默认最多尝试次数、重试退避的初始与最大秒数、
+# 已完成任务的保留天数及工作进程清理过期任务的间隔秒数
+JOB_WORKER_CONCURRENCY = 4
+JOB_POLL_INTERVAL = 1.0
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE = 10
+JOB_RETRY_MAX = 3600
+JOB_RETENTION_DAYS = 7
+JOB_PRUNE_INTERVAL = 3600
+
+# 定时调度（manage.py run_scheduler）：每次装载未来多少秒内的定时项、重新装载的间隔秒数
+# （新增或提前的定时项最迟在这段时间后被发现）、每类定时项每次最多装载的条数
+SCHEDULER_HORIZON = 3600
+SCHEDULER_RELOAD_INTERVAL = 60
+SCHEDULER_BATCH_SIZE = 500
+
 # 时区
 TIME_ZONE = 'Asia/Shanghai'
+
+# 浏览量写回缓冲：每隔多少秒或累计多少次浏览合并写入一次数据库
+VIEW_COUNT_FLUSH_INTERVAL = 30
+VIEW_COUNT_FLUSH_THRESHOLD = 100
+
+# 写缓冲（浏览量、邮件打开）在数据库持续写入失败时最多保留的记录数，超出时丢弃最早的
+WRITE_BUFFER_MAX_PENDING = 100000
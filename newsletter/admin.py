@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
+from blog import jobs
 from .models import Subscriber, Newsletter, NewsletterLog
+from .tasks import deliver_newsletter
 
 
 @admin.register(Subscriber)
@@ -50,23 +53,12 @@ class NewsletterAdmin(admin.ModelAdmin):
     actions = ['send_newsletter']
 
     def send_newsletter(self, request, queryset):
-        for newsletter in queryset:
-            if newsletter.status == 'draft':
-                # 获取所有活跃订阅者
-                subscribers = Subscriber.objects.filter(is_active=True, is_verified=True)
-                newsletter.recipient_count = subscribers.count()
-                newsletter.status = 'sent'
-                newsletter.sent_date = timezone.now()
-                newsletter.save()
-
-                # 创建发送日志
-                for subscriber in subscribers:
-                    NewsletterLog.objects.create(
-                        newsletter=newsletter,
-                        subscriber=subscriber
-                    )
-
-                self.message_user(request, f'已发送新闻通讯 "{newsletter.subject}" 到 {newsletter.recipient_count} 位订阅者。')
+        # 实际发送由后台任务完成（manage.py run_worker，见 newsletter.delivery）；
+        # 直接标记为「发送中」，定时调度器不会再次把它们加入队列
+        drafts = list(queryset.filter(status='draft').values_list('pk', flat=True))
+        Newsletter.objects.filter(pk__in=drafts).update(status='sending', scheduled_date=timezone.now())
+        jobs.enqueue_many(deliver_newsletter, [{'newsletter_id': pk} for pk in drafts])
+        self.message_user(request, f'已将 {len(drafts)} 期新闻通讯加入发送队列，将在后台分批发送。')
     send_newsletter.short_description = '发送选中的新闻通讯'
 
 
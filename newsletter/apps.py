@@ -5,3 +5,6 @@ class NewsletterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'newsletter'
     verbose_name = '新闻通讯'
+
+    def ready(self):
+        from . import tasks  # noqa: F401
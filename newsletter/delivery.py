@@ -0,0 +1,209 @@
+"""
+新闻通讯批量发送
+
+- 订阅者按主键顺序用 ``iterator(chunk_size=…)`` 流式读取，内存占用与订阅者总数无关
+- 整个发送过程复用同一个邮件连接，每批用 ``send_messages`` 发送，
+  SMTP 连接中途断开时重连一次再重试该批
+- 每批发送后用一条 ``bulk_create`` 写入发送日志，并批量更新订阅者的上次发送时间
+- 发送日志对 (新闻通讯, 订阅者) 唯一：每批发送前跳过已有日志的订阅者，
+  中断后再次发送即从断点继续，已发送的不会重复发送（只有中断时正在发送的那一批可能重发）
+- ``NEWSLETTER_RATE_LIMIT`` 限制每秒发送的邮件数（0 为不限制）
+- 发送前用条件 UPDATE 认领租约（``NEWSLETTER_LEASE_SECONDS``），每批发送后续期：
+  ``send_newsletters`` 命令、后台任务、定时调度不会同时发送同一期；
+  发送进程中断后，租约过期的「发送中」通讯才会被重新认领、从断点继续
+- 邮件正文由 ``newsletter.digest`` 按订阅者分组渲染，每组只渲染一次模板
+
+邮件连接由 ``EMAIL_BACKEND`` 决定，开发与测试时可使用 console 或 locmem 后端。
+"""
+import smtplib
+import time
+import uuid
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .digest import DigestBuilder
+from .models import Newsletter, NewsletterLog, Subscriber
+
+
+class RateLimiter:
+    """把平均发送速率限制在每秒 ``rate`` 封以内"""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self.started = None
+        self.count = 0
+
+    def wait(self, amount):
+        """发送 ``amount`` 封之前调用，必要时等待"""
+        if not self.rate:
+            return
+        now = self.clock()
+        if self.started is None:
+            self.started = now
+        delay = self.started + self.count / self.rate - now
+        if delay > 0:
+            self.sleep(delay)
+        self.count += amount
+
+
+class DeliveryInProgress(Exception):
+    """该期通讯正由其他进程发送（租约未过期）"""
+
+
+def get_options():
+    return {
+        'batch_size': getattr(settings, 'NEWSLETTER_BATCH_SIZE', 100),
+        'rate': getattr(settings, 'NEWSLETTER_RATE_LIMIT', 0),
+        'lease': getattr(settings, 'NEWSLETTER_LEASE_SECONDS', 300),
+    }
+
+
+def recipients():
+    """应当收到新闻通讯的订阅者"""
+    return Subscriber.objects.filter(is_active=True, is_verified=True)
+
+
+def _claimable(now):
+    """未发送完，且没有其他进程持有未过期的租约"""
+    return ~Q(status='sent') & (
+        ~Q(status='sending') | Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    )
+
+
+def due_newsletters(now=None):
+    """到达定时发送时间的新闻通讯，以及发送中断、租约已过期的"""
+    now = now or timezone.now()
+    return Newsletter.objects.filter(
+        _claimable(now), status__in=['scheduled', 'sending'], scheduled_date__lte=now
+    ).order_by('scheduled_date', 'pk')
+
+
+def claim(newsletter, owner, lease=None):
+    """用条件 UPDATE 认领发送租约，其他进程持有未过期的租约时返回 False"""
+    lease = lease or get_options()['lease']
+    now = timezone.now()
+    claimed = Newsletter.objects.filter(_claimable(now), pk=newsletter.pk).update(
+        status='sending', locked_by=owner, locked_until=now + timedelta(seconds=lease)
+    )
+    if claimed:
+        newsletter.status, newsletter.locked_by = 'sending', owner
+    return bool(claimed)
+
+
+def renew(newsletter, owner, lease=None):
+    """续期租约，租约已被他人接管时抛出 ``DeliveryInProgress``"""
+    lease = lease or get_options()['lease']
+    renewed = Newsletter.objects.filter(pk=newsletter.pk, locked_by=owner).update(
+        locked_until=timezone.now() + timedelta(seconds=lease)
+    )
+    if not renewed:
+        raise DeliveryInProgress(f'「{newsletter.subject}」的发送租约已被其他进程接管')
+
+
+def build_message(newsletter, subscriber, connection, builder=None):
+    """``builder`` 为本期通讯的 ``DigestBuilder``，批量发送时共用以复用各分组的渲染结果"""
+    builder = builder or DigestBuilder(newsletter)
+    body, html, unsubscribe_url = builder.render(subscriber)
+    message = EmailMultiAlternatives(
+        newsletter.subject,
+        body,
+        settings.DEFAULT_FROM_EMAIL,
+        [subscriber.email],
+        connection=connection,
+        headers={'List-Unsubscribe': f'<{unsubscribe_url}>'},
+    )
+    message.attach_alternative(html, 'text/html')
+    return message
+
+
+def send_batch(connection, messages):
+    """发送一批邮件，连接已断开时重连一次"""
+    try:
+        return connection.send_messages(messages)
+    except smtplib.SMTPServerDisconnected:
+        connection.close()
+        connection.open()
+        return connection.send_messages(messages)
+
+
+def iter_batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def deliver(newsletter, connection=None, batch_size=None, rate=None):
+    """
+    把 ``newsletter`` 发送给所有有效订阅者，返回 ``(本次发送数, 跳过的已发送数)``。
+
+    可重复调用：已有发送日志的订阅者会被跳过；已发送完的通讯不再发送，返回 ``(0, 收件人数)``。
+    其他进程正在发送时抛出 ``DeliveryInProgress``。
+    """
+    options = get_options()
+    batch_size = batch_size or options['batch_size']
+    limiter = RateLimiter(options['rate'] if rate is None else rate)
+
+    owner = uuid.uuid4().hex
+    if not claim(newsletter, owner, options['lease']):
+        # 认领失败也可能是已经发送完（传入的对象是旧的），只有租约未过期时才算冲突
+        current = Newsletter.objects.filter(pk=newsletter.pk).values('status', 'sent_date', 'recipient_count').first()
+        if current and current['status'] == 'sent':
+            newsletter.status, newsletter.sent_date = 'sent', current['sent_date']
+            newsletter.recipient_count = current['recipient_count']
+            return 0, newsletter.recipient_count
+        raise DeliveryInProgress(f'「{newsletter.subject}」正由其他进程发送')
+
+    subscribers = recipients().order_by('pk').only('pk', 'email', 'name', 'token', 'subscribe_date', 'last_sent_date')
+    builder = DigestBuilder(newsletter)
+    connection = connection or get_connection()
+    sent = skipped = 0
+    connection.open()
+    try:
+        for batch in iter_batches(subscribers.iterator(chunk_size=batch_size), batch_size):
+            done = set(
+                NewsletterLog.objects.filter(
+                    newsletter=newsletter, subscriber_id__in=[subscriber.pk for subscriber in batch]
+                ).values_list('subscriber_id', flat=True)
+            )
+            pending = [subscriber for subscriber in batch if subscriber.pk not in done]
+            skipped += len(batch) - len(pending)
+            if not pending:
+                continue
+
+            limiter.wait(len(pending))
+            send_batch(connection, [build_message(newsletter, subscriber, connection, builder) for subscriber in pending])
+            now = timezone.now()
+            with transaction.atomic():
+                NewsletterLog.objects.bulk_create(
+                    [NewsletterLog(newsletter=newsletter, subscriber=subscriber) for subscriber in pending],
+                    ignore_conflicts=True,
+                )
+                Subscriber.objects.filter(pk__in=[subscriber.pk for subscriber in pending]).update(last_sent_date=now)
+            sent += len(pending)
+            renew(newsletter, owner, options['lease'])
+    finally:
+        connection.close()
+
+    newsletter.status = 'sent'
+    newsletter.sent_date = timezone.now()
+    newsletter.recipient_count = newsletter.logs.count()
+    newsletter.locked_by, newsletter.locked_until = '', None
+    Newsletter.objects.filter(pk=newsletter.pk, locked_by=owner).update(
+        status=newsletter.status,
+        sent_date=newsletter.sent_date,
+        recipient_count=newsletter.recipient_count,
+        locked_by='',
+        locked_until=None,
+    )
+    return sent, skipped
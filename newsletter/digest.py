@@ -0,0 +1,109 @@
+"""
+新闻通讯摘要邮件
+
+每期通讯除正文外附上关联文章（``Newsletter.related_posts``），以及订阅者上次收到通讯
+（从未收到过则从订阅时间算起）之后发布的新文章，最多 ``NEWSLETTER_DIGEST_RECENT_POSTS`` 篇。
+
+逐个订阅者渲染模板的开销与订阅者数量成正比。实际上「新文章」只取决于订阅者的截止时间
+落在哪两篇文章的发布时间之间，取最新的 N 篇时至多有 N+1 种组合：
+
+- 订阅者按新文章的篇数分组，每组只渲染一次 HTML 与纯文本模板
+- 称呼、退订链接、打开追踪像素等因人而异的内容在渲染时以占位符代替，
+  发送时按订阅者做字符串拼接（HTML 中的值先转义）
+
+渲染次数因此只与分组数有关，与订阅者数量无关。
+"""
+import re
+from bisect import bisect_left
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import escape
+
+PLACEHOLDER_RE = re.compile('\x1a(\\w+)\x1a')
+RECIPIENT_FIELDS = ('name', 'unsubscribe_url', 'pixel_url')
+
+
+def placeholder(field):
+    return f'\x1a{field}\x1a'
+
+
+def get_recent_limit():
+    return getattr(settings, 'NEWSLETTER_DIGEST_RECENT_POSTS', 10)
+
+
+class RenderedBody:
+    """渲染好的邮件正文，按占位符切分，替换时只做一次拼接"""
+
+    def __init__(self, text, html=False):
+        self.parts = PLACEHOLDER_RE.split(text)
+        self.html = html
+
+    def substitute(self, values):
+        parts = list(self.parts)
+        # 切分结果中奇数位置是占位符名
+        for index in range(1, len(parts), 2):
+            value = values[parts[index]]
+            parts[index] = escape(value) if self.html else value
+        return ''.join(parts)
+
+
+class DigestBuilder:
+    """一期通讯的摘要邮件，按分组缓存渲染结果"""
+
+    def __init__(self, newsletter, recent_limit=None):
+        from blog.models import Post
+
+        self.newsletter = newsletter
+        self.related_posts = list(newsletter.related_posts.filter(status='published').summaries().order_by('-published_at'))
+        limit = get_recent_limit() if recent_limit is None else recent_limit
+        # 最新的 N 篇已发布文章（按发布时间倒序），每位订阅者看到的是其中的一个前缀
+        self.recent_posts = list(
+            Post.objects.filter(status='published')
+            .exclude(pk__in=[post.pk for post in self.related_posts])
+            .summaries()
+            .order_by('-published_at', '-pk')[:limit]
+        ) if limit else []
+        # 升序排列的 -时间戳，便于用 bisect 计算发布时间晚于截止时间的篇数
+        self._keys = [-post.published_at.timestamp() for post in self.recent_posts]
+        self._bodies = {}
+        self.renders = 0
+
+    def cohort(self, subscriber):
+        """订阅者所在的分组：截止时间之后发布的新文章篇数"""
+        since = subscriber.last_sent_date or subscriber.subscribe_date
+        if since is None:
+            return len(self.recent_posts)
+        return bisect_left(self._keys, -since.timestamp())
+
+    def bodies(self, cohort):
+        """一个分组的 ``(纯文本, HTML)``，每个分组只渲染一次"""
+        if cohort not in self._bodies:
+            context = {
+                'newsletter': self.newsletter,
+                'related_posts': self.related_posts,
+                'recent_posts': self.recent_posts[:cohort],
+                'site_name': settings.SITE_NAME,
+                'site_url': settings.SITE_URL,
+            }
+            context.update((field, placeholder(field)) for field in RECIPIENT_FIELDS)
+            self._bodies[cohort] = (
+                RenderedBody(render_to_string('newsletter/email/digest.txt', context)),
+                RenderedBody(render_to_string('newsletter/email/digest.html', context), html=True),
+            )
+            self.renders += 1
+        return self._bodies[cohort]
+
+    def recipient_values(self, subscriber):
+        return {
+            'name': subscriber.name or '朋友',
+            'unsubscribe_url': settings.SITE_URL + reverse('newsletter:unsubscribe_token', args=[subscriber.token]),
+            'pixel_url': settings.SITE_URL + reverse('newsletter:open_pixel', args=[self.newsletter.pk, subscriber.token]),
+        }
+
+    def render(self, subscriber):
+        """返回 ``(纯文本正文, HTML 正文, 退订链接)``"""
+        text, html = self.bodies(self.cohort(subscriber))
+        values = self.recipient_values(subscriber)
+        return text.substitute(values), html.substitute(values), values['unsubscribe_url']
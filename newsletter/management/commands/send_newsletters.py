@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter import delivery
+from newsletter.models import Newsletter
+
+
+class Command(BaseCommand):
+    help = '分批发送新闻通讯（默认发送所有到达定时时间的，可中断后继续）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='只发送这些新闻通讯')
+        parser.add_argument('--batch-size', type=int, default=None, help='每批发送的邮件数')
+        parser.add_argument('--rate', type=float, default=None, help='每秒最多发送的邮件数，0 为不限制')
+
+    def handle(self, *args, **options):
+        if options['ids']:
+            newsletters = list(Newsletter.objects.filter(pk__in=options['ids']))
+            missing = set(options['ids']) - {newsletter.pk for newsletter in newsletters}
+            if missing:
+                raise CommandError(f'新闻通讯不存在：{", ".join(map(str, sorted(missing)))}')
+        else:
+            newsletters = list(delivery.due_newsletters())
+
+        for newsletter in newsletters:
+            if newsletter.status == 'sent':
+                self.stdout.write(f'「{newsletter.subject}」已发送，跳过。')
+                continue
+            started = time.monotonic()
+            try:
+                sent, skipped = delivery.deliver(newsletter, batch_size=options['batch_size'], rate=options['rate'])
+            except delivery.DeliveryInProgress as exc:
+                self.stdout.write(self.style.WARNING(f'{exc}，跳过。'))
+                continue
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'「{newsletter.subject}」：发送 {sent} 封，跳过已发送的 {skipped} 位，耗时 {elapsed:.1f} 秒。'
+            )
+        self.stdout.write(self.style.SUCCESS(f'已处理 {len(newsletters)} 期新闻通讯。'))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:44
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_logs(apps, schema_editor):
+    NewsletterLog = apps.get_model('newsletter', 'NewsletterLog')
+    keep = (
+        NewsletterLog.objects.values('newsletter_id', 'subscriber_id')
+        .annotate(first=Min('pk')).values_list('first', flat=True)
+    )
+    NewsletterLog.objects.exclude(pk__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newsletter',
+            name='status',
+            field=models.CharField(choices=[('draft', '草稿'), ('scheduled', '定时发送'), ('sending', '发送中'), ('sent', '已发送')], default='draft', max_length=20, verbose_name='状态'),
+        ),
+        migrations.RunPython(remove_duplicate_logs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='newsletterlog',
+            constraint=models.UniqueConstraint(fields=('newsletter', 'subscriber'), name='newsletter_log_unique_recipient'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0002_delivery_log_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['status', 'scheduled_date'], name='newsletter__status_0c1b5a_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0003_scheduled_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='locked_by',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='发送者'),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='租约到期时间'),
+        ),
+    ]
@@ -34,6 +34,7 @@ class Newsletter(models.Model):
     STATUS_CHOICES = [
         ('draft', '草稿'),
         ('scheduled', '定时发送'),
+        ('sending', '发送中'),
         ('sent', '已发送'),
     ]
 
@@ -48,6 +49,10 @@ class Newsletter(models.Model):
     scheduled_date = models.DateTimeField(null=True, blank=True, verbose_name='定时发送时间')
     sent_date = models.DateTimeField(null=True, blank=True, verbose_name='发送时间')
 
+    # 发送租约：发送进程认领后定期续期，进程中断、租约过期后可由其他进程接着发送
+    locked_by = models.CharField(max_length=100, blank=True, editable=False, verbose_name='发送者')
+    locked_until = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='租约到期时间')
+
     recipient_count = models.PositiveIntegerField(default=0, verbose_name='接收者数量')
     open_count = models.PositiveIntegerField(default=0, verbose_name='打开数量')
 
@@ -58,6 +63,10 @@ class Newsletter(models.Model):
         verbose_name = '新闻通讯'
         verbose_name_plural = '新闻通讯'
         ordering = ['-created_at']
+        indexes = [
+            # 调度器按定时发送时间取出到期的新闻通讯
+            models.Index(fields=['status', 'scheduled_date']),
+        ]
 
     def __str__(self):
         return self.subject
@@ -75,6 +84,10 @@ class NewsletterLog(models.Model):
         verbose_name = '发送日志'
         verbose_name_plural = '发送日志'
         ordering = ['-sent_date']
+        # 每位订阅者每期只发送一次，中断后重新发送时据此跳过
+        constraints = [
+            models.UniqueConstraint(fields=['newsletter', 'subscriber'], name='newsletter_log_unique_recipient'),
+        ]
 
     def __str__(self):
         return f'{self.newsletter.subject} -> {self.subscriber.email}'
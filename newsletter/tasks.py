@@ -0,0 +1,79 @@
+"""
+新闻通讯的后台任务（由 ``manage.py run_worker`` 执行，见 ``blog.jobs``）
+
+发送失败时直接抛出异常，由任务队列按指数退避重试。
+定时发送的新闻通讯由 ``manage.py run_scheduler`` 在到期时加入队列（见 ``blog.scheduler``）。
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+
+from blog import jobs, scheduler
+
+from . import delivery
+from .models import Newsletter, Subscriber
+
+
+@jobs.task
+def send_verification_email(subscriber_id):
+    """发送验证邮件"""
+    subscriber = Subscriber.objects.filter(pk=subscriber_id, is_active=True, is_verified=False).first()
+    if subscriber is None:
+        return
+    verify_url = f"{settings.SITE_URL}/newsletter/verify/{subscriber.token}/"
+
+    subject = '【樱花技术博客】邮箱验证'
+    message = f'''
+    您好 {subscriber.name or '朋友'}！
+
+    感谢您订阅樱花技术博客！
+
+    请点击以下链接验证您的邮箱：
+    {verify_url}
+
+    如果您没有订阅过我们的博客，请忽略此邮件。
+
+    ---
+    樱花技术博客
+    '''
+
+    send_mail(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [subscriber.email],
+        fail_silently=False,
+    )
+
+
+@jobs.task(max_attempts=10)
+def deliver_newsletter(newsletter_id):
+    """
+    批量发送一期新闻通讯；中断后重试会跳过已发送的订阅者。
+    其他进程正在发送时抛出 ``DeliveryInProgress``，由任务队列稍后重试
+    """
+    newsletter = Newsletter.objects.filter(pk=newsletter_id, status__in=['scheduled', 'sending']).first()
+    if newsletter is not None:
+        delivery.deliver(newsletter)
+
+
+def upcoming_newsletters(until, limit):
+    return (
+        Newsletter.objects.filter(status='scheduled', scheduled_date__lte=until)
+        .order_by('scheduled_date', 'pk')
+        .values_list('scheduled_date', 'pk')[:limit]
+    )
+
+
+def dispatch_newsletters(pks, now):
+    """把到期的定时新闻通讯标记为「发送中」并加入发送队列，避免重复调度"""
+    due = list(
+        Newsletter.objects.filter(pk__in=pks, status='scheduled', scheduled_date__lte=now).values_list('pk', flat=True)
+    )
+    # 逐条条件更新，只为本次真正改为「发送中」的通讯加入队列（其他调度器可能已处理）
+    claimed = [pk for pk in due if Newsletter.objects.filter(pk=pk, status='scheduled').update(status='sending')]
+    if not claimed:
+        return 0
+    return jobs.enqueue_many(deliver_newsletter, [{'newsletter_id': pk} for pk in claimed])
+
+
+scheduler.register('newsletters', upcoming_newsletters, dispatch_newsletters)
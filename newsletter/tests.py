@@ -0,0 +1,145 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from blog import jobs
+from blog.models import Job
+from blog.scheduler import Scheduler
+
+from . import delivery, tasks
+from .models import Newsletter, NewsletterLog, Subscriber
+from .tracking import OpenTracker
+
+# 默认缓存是 BASE_DIR/.cache 下的文件缓存，测试改用进程内缓存，不读写工作目录
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-newsletter-{alias}'}
+    for alias in ('default', 'markdown')
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NewsletterTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+
+class OpenTrackerTests(NewsletterTestCase):
+    """邮件打开事件的缓冲写入"""
+
+    def setUp(self):
+        self.newsletter = Newsletter.objects.create(subject='s', content='c', status='sent')
+        self.subscribers = [
+            Subscriber.objects.create(email=f's{index}@example.com', is_verified=True) for index in range(3)
+        ]
+        NewsletterLog.objects.bulk_create(
+            [NewsletterLog(newsletter=self.newsletter, subscriber=subscriber) for subscriber in self.subscribers]
+        )
+
+    def test_flush_counts_each_subscriber_once(self):
+        tracker = OpenTracker(interval=3600, threshold=1000)
+        for subscriber in self.subscribers[:2]:
+            tracker.record(self.newsletter.pk, subscriber.token)
+            tracker.record(self.newsletter.pk, subscriber.token)
+        self.assertEqual(tracker.flush(), 2)
+
+        tracker.record(self.newsletter.pk, self.subscribers[0].token)
+        self.assertEqual(tracker.flush(), 0)
+        self.newsletter.refresh_from_db()
+        self.assertEqual(self.newsletter.open_count, 2)
+        self.assertEqual(NewsletterLog.objects.filter(opened=True).count(), 2)
+
+    def test_disabled_tracker_records_nothing(self):
+        tracker = OpenTracker(interval=3600, threshold=1000)
+        tracker.enabled = False
+        tracker.record(self.newsletter.pk, self.subscribers[0].token)
+        self.assertEqual(tracker.flush(), 0)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', NEWSLETTER_RATE_LIMIT=0)
+class DeliveryLeaseTests(NewsletterTestCase):
+    """同一期通讯同时只由一个进程发送"""
+
+    def setUp(self):
+        for index in range(3):
+            Subscriber.objects.create(email=f's{index}@example.com', is_verified=True)
+        self.newsletter = Newsletter.objects.create(
+            subject='s', content='c', status='scheduled', scheduled_date=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_only_one_claim_wins(self):
+        self.assertTrue(delivery.claim(self.newsletter, 'a'))
+        self.assertFalse(delivery.claim(Newsletter.objects.get(pk=self.newsletter.pk), 'b'))
+        self.assertNotIn(self.newsletter, delivery.due_newsletters())
+
+    def test_live_lease_blocks_delivery(self):
+        delivery.claim(self.newsletter, 'other')
+        with self.assertRaises(delivery.DeliveryInProgress):
+            delivery.deliver(Newsletter.objects.get(pk=self.newsletter.pk))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_sent_newsletter_is_not_reported_in_progress(self):
+        stale = Newsletter.objects.get(pk=self.newsletter.pk)
+        self.assertEqual(delivery.deliver(Newsletter.objects.get(pk=self.newsletter.pk)), (3, 0))
+        self.assertEqual(delivery.deliver(stale), (0, 3))
+        self.assertEqual(stale.status, 'sent')
+        self.assertEqual(len(mail.outbox), 3)
+
+        stdout = StringIO()
+        call_command('send_newsletters', self.newsletter.pk, stdout=stdout)
+        self.assertIn('已发送，跳过', stdout.getvalue())
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_expired_lease_resumes_delivery(self):
+        delivery.claim(self.newsletter, 'crashed')
+        Newsletter.objects.filter(pk=self.newsletter.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        NewsletterLog.objects.create(newsletter=self.newsletter, subscriber=Subscriber.objects.first())
+
+        self.assertIn(self.newsletter, delivery.due_newsletters())
+        self.assertEqual(delivery.deliver(Newsletter.objects.get(pk=self.newsletter.pk)), (2, 1))
+        self.newsletter.refresh_from_db()
+        self.assertEqual((self.newsletter.status, self.newsletter.locked_by), ('sent', ''))
+        self.assertEqual(self.newsletter.recipient_count, 3)
+
+    def test_scheduled_newsletter_is_sent_once_by_the_job(self):
+        results = Scheduler(horizon=3600, reload_interval=60).run_once()
+        self.assertEqual(results['newsletters'], 1)
+        self.newsletter.refresh_from_db()
+        self.assertEqual(self.newsletter.status, 'sending')
+
+        # 任务执行之前命令行已在发送：任务因租约冲突重新排队，不会重复发送
+        delivery.claim(self.newsletter, 'command')
+        with self.assertLogs('blog.jobs', 'WARNING'):
+            jobs.run_pending()
+        self.assertEqual(Job.objects.get().status, 'queued')
+        self.assertEqual(len(mail.outbox), 0)
+
+        Newsletter.objects.filter(pk=self.newsletter.pk).update(locked_by='', locked_until=None)
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(jobs.run_pending(), 1)
+        self.newsletter.refresh_from_db()
+        self.assertEqual(self.newsletter.status, 'sent')
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_dispatch_enqueues_only_claimed_newsletters(self):
+        real_filter = Newsletter.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            # 取出到期通讯之后、标记「发送中」之前，另一个调度器已处理了它
+            if 'pk__in' not in kwargs:
+                return real_filter(*args, **kwargs)
+            due = list(real_filter(*args, **kwargs).values_list('pk', flat=True))
+            real_filter(pk__in=due).update(status='sending')
+            return mock.Mock(values_list=mock.Mock(return_value=due))
+
+        with mock.patch.object(Newsletter.objects, 'filter', side_effect=racing_filter):
+            self.assertEqual(tasks.dispatch_newsletters([self.newsletter.pk], timezone.now()), 0)
+        self.assertFalse(Job.objects.exists())
+
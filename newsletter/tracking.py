@@ -0,0 +1,80 @@
+"""
+新闻通讯打开追踪
+
+邮件 HTML 末尾嵌入一个 1×1 的透明 GIF（``newsletter:open_pixel``）。一期通讯发出后
+短时间内会集中到来大量打开请求，请求中只把 (通讯ID, 订阅者令牌) 记入进程内缓冲，
+立即返回预先生成的 GIF，不访问数据库。
+
+缓冲（见 ``blog.buffers``）达到阈值或定时器到期后在后台线程中合并写入：
+每期通讯对缓冲中的订阅者执行批量 UPDATE，只更新 ``opened=False`` 的日志（同一订阅者多次打开、多个进程重复上报都只计一次），
+再按实际更新的行数对 ``Newsletter.open_count`` 做一次 F() 累加。
+打开时间记为该期通讯本批事件中最早的一次，精度为刷新间隔。
+"""
+import base64
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from blog.buffers import WriteBuffer
+
+# 1×1 透明 GIF
+PIXEL = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+# 单条 UPDATE 中 IN 列表的最大长度
+UPDATE_CHUNK_SIZE = 500
+
+
+class OpenTracker(WriteBuffer):
+    """进程内打开事件缓冲，``{(通讯ID, 订阅者令牌): 最早的打开时间}``"""
+
+    interval_setting = 'NEWSLETTER_OPEN_FLUSH_INTERVAL'
+    default_interval = 5
+    threshold_setting = 'NEWSLETTER_OPEN_FLUSH_THRESHOLD'
+    default_threshold = 500
+    # 像素请求本身不等待数据库
+    background = True
+
+    def record(self, newsletter_id, token, moment=None):
+        """记录一次打开，必要时触发刷新"""
+        self.add((newsletter_id, str(token)), moment or timezone.now())
+
+    def merge(self, pending, key, value):
+        pending[key] = min(pending.get(key, value), value)
+
+    def write(self, batch):
+        """写入一批打开事件，返回新记录的打开数"""
+        from .models import Newsletter, NewsletterLog, Subscriber
+
+        by_newsletter = {}
+        for (newsletter_id, token), moment in batch.items():
+            tokens, first = by_newsletter.get(newsletter_id, ([], moment))
+            tokens.append(token)
+            by_newsletter[newsletter_id] = (tokens, min(first, moment))
+
+        subscribers = {}
+        all_tokens = list({token for _, token in batch})
+        for start in range(0, len(all_tokens), UPDATE_CHUNK_SIZE):
+            chunk = all_tokens[start:start + UPDATE_CHUNK_SIZE]
+            subscribers.update(
+                (str(token), pk) for token, pk in Subscriber.objects.filter(token__in=chunk).values_list('token', 'pk')
+            )
+
+        opened = 0
+        with transaction.atomic():
+            for newsletter_id, (tokens, first) in by_newsletter.items():
+                ids = [subscribers[token] for token in tokens if token in subscribers]
+                updated = 0
+                for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+                    updated += NewsletterLog.objects.filter(
+                        newsletter_id=newsletter_id,
+                        subscriber_id__in=ids[start:start + UPDATE_CHUNK_SIZE],
+                        opened=False,
+                    ).update(opened=True, opened_date=first)
+                if updated:
+                    Newsletter.objects.filter(pk=newsletter_id).update(open_count=F('open_count') + updated)
+                opened += updated
+        return opened
+
+
+opens = OpenTracker()
@@ -14,6 +14,9 @@ urlpatterns = [
     path('unsubscribe/', views.unsubscribe, name='unsubscribe'),
     path('unsubscribe/<uuid:token>/', views.unsubscribe, name='unsubscribe_token'),
 
+    # 打开追踪像素
+    path('open/<int:newsletter_id>/<uuid:token>.gif', views.open_pixel, name='open_pixel'),
+
     # 管理页面
     path('manage/', views.newsletter_management, name='manage'),
 ]
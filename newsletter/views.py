@@ -1,11 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.core.mail import send_mail
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
-from django.conf import settings
+from blog import jobs
 from .models import Subscriber, Newsletter, NewsletterLog
+from .tasks import send_verification_email
+from .tracking import PIXEL, opens
 import uuid
 
 
@@ -35,11 +36,11 @@ def subscribe(request):
                 subscriber.is_verified = False
                 subscriber.token = uuid.uuid4()
                 subscriber.save()
-                send_verification_email(subscriber)
+                jobs.enqueue(send_verification_email, subscriber_id=subscriber.pk)
                 messages.success(request, '请查收邮箱进行验证。')
         else:
             # 发送验证邮件
-            send_verification_email(subscriber)
+            jobs.enqueue(send_verification_email, subscriber_id=subscriber.pk)
             messages.success(request, '订阅成功！请查收邮箱进行验证。')
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -82,35 +83,13 @@ def unsubscribe(request, token=None):
     return render(request, 'newsletter/unsubscribe.html')
 
 
-def send_verification_email(subscriber):
-    """发送验证邮件"""
-    verify_url = f"{settings.SITE_URL}/newsletter/verify/{subscriber.token}/"
-
-    subject = '【樱花技术博客】邮箱验证'
-    message = f'''
-    您好 {subscriber.name or '朋友'}！
-
-    感谢您订阅樱花技术博客！
-
-    请点击以下链接验证您的邮箱：
-    {verify_url}
-
-    如果您没有订阅过我们的博客，请忽略此邮件。
-
-    ---
-    樱花技术博客
-    '''
-
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [subscriber.email],
-            fail_silently=False,
-        )
-    except Exception as e:
-        print(f"发送邮件失败: {e}")
+@require_http_methods(["GET"])
+def open_pixel(request, newsletter_id, token):
+    """打开追踪像素：只记入缓冲，立即返回 GIF"""
+    opens.record(newsletter_id, token)
+    response = HttpResponse(PIXEL, content_type='image/gif')
+    response['Cache-Control'] = 'private, no-cache, no-store, must-revalidate'
+    return response
 
 
 def newsletter_management(request):
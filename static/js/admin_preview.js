@@ -0,0 +1,49 @@
+/**
+ * 樱花技术博客 - 后台文章编辑实时预览
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    const textarea = document.getElementById('id_content');
+    if (!textarea) {
+        return;
+    }
+
+    const preview = document.createElement('div');
+    preview.className = 'markdown-preview';
+    preview.style.cssText = 'margin-top: 1rem; padding: 1rem; border: 1px solid #ddd; max-height: 600px; overflow: auto; background: #fff;';
+    textarea.parentNode.appendChild(preview);
+
+    const csrfInput = document.querySelector('input[name="csrfmiddlewaretoken"]');
+    const match = window.location.pathname.match(/\/(\d+)\/change\/$/);
+    const postId = match ? match[1] : '';
+    let timer = null;
+    let pending = null;
+
+    function refresh() {
+        if (pending) {
+            pending.abort();
+        }
+        pending = new AbortController();
+
+        const body = new FormData();
+        body.append('content', textarea.value);
+        body.append('post_id', postId);
+
+        fetch('/preview/', {
+            method: 'POST',
+            body: body,
+            headers: {'X-CSRFToken': csrfInput ? csrfInput.value : ''},
+            signal: pending.signal,
+        })
+            .then(response => response.json())
+            .then(data => { preview.innerHTML = data.html; })
+            .catch(() => {});
+    }
+
+    textarea.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(refresh, 300);
+    });
+
+    refresh();
+});
@@ -39,31 +39,67 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // 评论回复
-    const replyButtons = document.querySelectorAll('.comment-actions .reply-btn');
-    replyButtons.forEach(function(btn) {
-        btn.addEventListener('click', function(e) {
-            e.preventDefault();
-            const commentId = this.dataset.commentId;
-            const replyForm = document.getElementById('reply-form-' + commentId);
-            if (replyForm) {
-                replyForm.style.display = 'block';
-                replyForm.scrollIntoView({ behavior: 'smooth', block: 'center' });
+    // 评论回复、取消回复、按需加载（事件委托，异步加载的评论同样生效）
+    const commentsSection = document.querySelector('.comments-section');
+    if (commentsSection) {
+        commentsSection.addEventListener('click', function(e) {
+            const replyBtn = e.target.closest('.comment-actions .reply-btn');
+            if (replyBtn) {
+                e.preventDefault();
+                const replyForm = document.getElementById('reply-form-' + replyBtn.dataset.commentId);
+                if (replyForm) {
+                    replyForm.style.display = 'block';
+                    replyForm.scrollIntoView({ behavior: 'smooth', block: 'center' });
+                }
+                return;
             }
-        });
-    });
 
-    // 取消回复
-    const cancelReplyButtons = document.querySelectorAll('.cancel-reply');
-    cancelReplyButtons.forEach(function(btn) {
-        btn.addEventListener('click', function(e) {
-            e.preventDefault();
-            const form = this.closest('.reply-form');
-            if (form) {
-                form.style.display = 'none';
+            const cancelBtn = e.target.closest('.cancel-reply');
+            if (cancelBtn) {
+                e.preventDefault();
+                const form = cancelBtn.closest('.reply-form');
+                if (form) {
+                    form.style.display = 'none';
+                }
+                return;
+            }
+
+            const repliesBtn = e.target.closest('.load-replies');
+            if (repliesBtn) {
+                e.preventDefault();
+                repliesBtn.disabled = true;
+                fetch(repliesBtn.dataset.url)
+                    .then(response => response.json())
+                    .then(data => {
+                        const slot = repliesBtn.nextElementSibling;
+                        if (slot) {
+                            slot.innerHTML = data.html;
+                        }
+                        repliesBtn.remove();
+                    })
+                    .catch(() => { repliesBtn.disabled = false; });
+                return;
+            }
+
+            const moreBtn = e.target.closest('.load-more-comments');
+            if (moreBtn) {
+                e.preventDefault();
+                moreBtn.disabled = true;
+                fetch(moreBtn.dataset.url)
+                    .then(response => response.json())
+                    .then(data => {
+                        commentsSection.querySelector('.comments-list').insertAdjacentHTML('beforeend', data.html);
+                        if (data.next) {
+                            moreBtn.dataset.url = moreBtn.dataset.url.split('?')[0] + '?after=' + data.next;
+                            moreBtn.disabled = false;
+                        } else {
+                            moreBtn.remove();
+                        }
+                    })
+                    .catch(() => { moreBtn.disabled = false; });
             }
         });
-    });
+    }
 
     // 代码块复制按钮
     const codeBlocks = document.querySelectorAll('.post-content pre');
@@ -160,21 +196,41 @@ document.addEventListener('DOMContentLoaded', function() {
                 alert('请输入搜索关键词');
             }
         });
+        if (searchForm.dataset.suggestUrl) {
+            initSearchSuggest(searchForm);
+        }
     }
 
-    // 归档年份折叠
+    // 归档年份折叠，首次展开时加载该年的文章列表
     const archiveYears = document.querySelectorAll('.archive-year');
     archiveYears.forEach(function(year) {
         const title = year.querySelector('.archive-year-title');
-        if (title) {
-            title.style.cursor = 'pointer';
-            title.addEventListener('click', function() {
-                const posts = year.querySelector('.archive-posts');
-                if (posts) {
-                    posts.style.display = posts.style.display === 'none' ? 'block' : 'none';
-                }
-            });
+        const posts = year.querySelector('.archive-posts');
+        if (!title || !posts) {
+            return;
         }
+        title.style.cursor = 'pointer';
+        title.addEventListener('click', function(e) {
+            e.preventDefault();
+            if (posts.style.display !== 'none') {
+                posts.style.display = 'none';
+                return;
+            }
+            posts.style.display = 'block';
+            if (year.dataset.url && !year.dataset.loaded) {
+                year.dataset.loaded = '1';
+                posts.innerHTML = '<p style="color: var(--color-text-muted);">加载中...</p>';
+                fetch(year.dataset.url)
+                    .then(response => response.json())
+                    .then(data => {
+                        posts.innerHTML = data.html;
+                    })
+                    .catch(() => {
+                        delete year.dataset.loaded;
+                        posts.innerHTML = '<p style="color: var(--color-text-muted);">加载失败，请重试。</p>';
+                    });
+            }
+        });
     });
 
     // 返回顶部
@@ -361,6 +417,99 @@ function openLightbox(src) {
     });
 }
 
+/**
+ * 搜索框自动补全
+ */
+function initSearchSuggest(form) {
+    const input = form.querySelector('input[name="q"]');
+    const list = document.createElement('ul');
+    list.className = 'search-suggestions';
+    list.hidden = true;
+    input.parentNode.appendChild(list);
+
+    let timer = null;
+    let controller = null;
+    let active = -1;
+
+    function close() {
+        list.hidden = true;
+        list.innerHTML = '';
+        active = -1;
+    }
+
+    function highlight(index) {
+        const items = list.querySelectorAll('li');
+        items.forEach((item, i) => item.classList.toggle('active', i === index));
+        active = index;
+    }
+
+    function show(suggestions) {
+        list.innerHTML = '';
+        suggestions.forEach(function(suggestion) {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            link.href = suggestion.url;
+            const type = document.createElement('span');
+            type.className = 'suggestion-type';
+            type.textContent = suggestion.type_label;
+            link.appendChild(type);
+            link.appendChild(document.createTextNode(suggestion.label));
+            item.appendChild(link);
+            list.appendChild(item);
+        });
+        list.hidden = suggestions.length === 0;
+        active = -1;
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (!query) {
+            close();
+            return;
+        }
+        timer = setTimeout(function() {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(form.dataset.suggestUrl + '?q=' + encodeURIComponent(query), { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => {
+                    if (input.value.trim() === data.query) {
+                        show(data.suggestions);
+                    }
+                })
+                .catch(() => {});
+        }, 150);
+    });
+
+    input.addEventListener('keydown', function(e) {
+        const items = list.querySelectorAll('li');
+        if (list.hidden || !items.length) {
+            return;
+        }
+        if (e.key === 'ArrowDown') {
+            e.preventDefault();
+            highlight((active + 1) % items.length);
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            highlight((active - 1 + items.length) % items.length);
+        } else if (e.key === 'Enter' && active >= 0) {
+            e.preventDefault();
+            window.location.href = items[active].querySelector('a').href;
+        } else if (e.key === 'Escape') {
+            close();
+        }
+    });
+
+    document.addEventListener('click', function(e) {
+        if (!form.contains(e.target)) {
+            close();
+        }
+    });
+}
+
 /**
  * 显示消息提示
  */